@@ -25,6 +25,64 @@ export interface VoiceWidgetProps {
 
 type ConnectionStatus = 'disconnected' | 'connecting' | 'connected' | 'error';
 
+/** Sample format of `audio_chunk` payloads (little-endian) */
+type AudioFormat = 'pcm16' | 'f32';
+
+/** After silence, playback starts this late so unevenly arriving chunks play without gaps */
+const JITTER_BUFFER_MS = 80;
+
+/** Microphone frames posted by the capture worklet: 20 ms at 16kHz */
+const CAPTURE_FRAME_SAMPLES = 320;
+
+const CAPTURE_WORKLET = `
+class CaptureProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    this.frame = new Float32Array(options.processorOptions.frameSamples);
+    this.offset = 0;
+  }
+  process(inputs) {
+    const input = inputs[0][0];
+    if (!input) return true;
+    let i = 0;
+    while (i < input.length) {
+      const n = Math.min(input.length - i, this.frame.length - this.offset);
+      this.frame.set(input.subarray(i, i + n), this.offset);
+      this.offset += n;
+      i += n;
+      if (this.offset === this.frame.length) {
+        this.port.postMessage(this.frame, [this.frame.buffer]);
+        this.frame = new Float32Array(this.frame.length);
+        this.offset = 0;
+      }
+    }
+    return true;
+  }
+}
+registerProcessor('capture-processor', CaptureProcessor);
+`;
+
+function float32ToInt16(samples: Float32Array): Int16Array {
+  const int16 = new Int16Array(samples.length);
+  for (let i = 0; i < samples.length; i++) {
+    const s = Math.max(-1, Math.min(1, samples[i]));
+    int16[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+  }
+  return int16;
+}
+
+function decodePcm(bytes: Uint8Array, format: AudioFormat): Float32Array {
+  if (format === 'f32') {
+    return new Float32Array(bytes.buffer);
+  }
+  const int16 = new Int16Array(bytes.buffer);
+  const float32 = new Float32Array(int16.length);
+  for (let i = 0; i < int16.length; i++) {
+    float32[i] = int16[i] / 32768;
+  }
+  return float32;
+}
+
 export function VoiceWidget({
   serverUrl,
   apiKey,
@@ -44,7 +102,16 @@ export function VoiceWidget({
   const wsRef = useRef<WebSocket | null>(null);
   const audioContextRef = useRef<AudioContext | null>(null);
   const mediaStreamRef = useRef<MediaStream | null>(null);
-  const processorRef = useRef<ScriptProcessorNode | null>(null);
+  const sourceRef = useRef<MediaStreamAudioSourceNode | null>(null);
+  const captureNodeRef = useRef<AudioWorkletNode | null>(null);
+  const captureModuleRef = useRef<Promise<void> | null>(null);
+  const playbackContextRef = useRef<AudioContext | null>(null);
+  const nextStartTimeRef = useRef(0);
+  const scheduledSourcesRef = useRef(new Set<AudioBufferSourceNode>());
+  const responseDoneRef = useRef(false);
+  const startListeningRef = useRef<() => void>();
+  const continuousModeRef = useRef(continuousMode);
+  continuousModeRef.current = continuousMode;
 
   // Connect to WebSocket
   const connect = useCallback(() => {
@@ -60,6 +127,8 @@ export function VoiceWidget({
     
     ws.onopen = () => {
       setStatus('connected');
+      // Uplink as 16-bit PCM in binary frames
+      ws.send(JSON.stringify({ type: 'config', input_format: 'pcm16', input_sample_rate: 16000 }));
     };
     
     ws.onclose = (event) => {
@@ -97,31 +166,78 @@ export function VoiceWidget({
         break;
       case 'transcript':
         onTranscript?.(msg.text);
+        responseDoneRef.current = false;
+        stopPlayback();
         break;
       case 'response_text':
         onResponse?.(msg.text);
         break;
+      case 'response_complete':
+        onResponse?.(msg.text);
+        finishResponse();
+        break;
+      case 'audio_chunk':
+        playAudio(msg.data, msg.sample_rate, msg.format ?? 'pcm16');
+        break;
       case 'audio_response':
-        playAudio(msg.data, msg.sample_rate);
-        if (continuousMode) {
-          // Auto-start listening after response
-          setTimeout(() => startListening(), 500);
-        }
+        playAudio(msg.data, msg.sample_rate, 'f32');
+        finishResponse();
         break;
     }
-  }, [onTranscript, onResponse, continuousMode]);
+  }, [onTranscript, onResponse]);
 
-  // Play audio response
-  const playAudio = useCallback((base64Data: string, sampleRate: number) => {
-    setIsSpeaking(true);
-    
-    const audioCtx = new AudioContext({ sampleRate });
+  // One playback context for the widget's lifetime, at the device rate
+  const getPlaybackContext = useCallback(() => {
+    let audioCtx = playbackContextRef.current;
+    if (!audioCtx || audioCtx.state === 'closed') {
+      audioCtx = new AudioContext({ latencyHint: 'interactive' });
+      playbackContextRef.current = audioCtx;
+      nextStartTimeRef.current = 0;
+    }
+    if (audioCtx.state === 'suspended') {
+      audioCtx.resume();
+    }
+    return audioCtx;
+  }, []);
+
+  // The reply is done once the server says so and the last chunk has played
+  const checkPlaybackDone = useCallback(() => {
+    if (responseDoneRef.current && scheduledSourcesRef.current.size === 0) {
+      responseDoneRef.current = false;
+      setIsSpeaking(false);
+      if (continuousModeRef.current) {
+        // Auto-start listening after response
+        setTimeout(() => startListeningRef.current?.(), 500);
+      }
+    }
+  }, []);
+
+  const finishResponse = useCallback(() => {
+    responseDoneRef.current = true;
+    checkPlaybackDone();
+  }, [checkPlaybackDone]);
+
+  const stopPlayback = useCallback(() => {
+    scheduledSourcesRef.current.forEach((source) => {
+      source.onended = null;
+      source.stop();
+    });
+    scheduledSourcesRef.current.clear();
+    nextStartTimeRef.current = 0;
+    setIsSpeaking(false);
+  }, []);
+
+  // Play audio response: chunks are scheduled back to back behind a jitter buffer
+  const playAudio = useCallback((base64Data: string, sampleRate: number, format: AudioFormat) => {
+    const audioCtx = getPlaybackContext();
     const binary = atob(base64Data);
     const bytes = new Uint8Array(binary.length);
     for (let i = 0; i < binary.length; i++) {
       bytes[i] = binary.charCodeAt(i);
     }
-    const audioData = new Float32Array(bytes.buffer);
+    const audioData = decodePcm(bytes, format);
+    if (!audioData.length) return;
+    setIsSpeaking(true);
     
     const buffer = audioCtx.createBuffer(1, audioData.length, sampleRate);
     buffer.getChannelData(0).set(audioData);
@@ -129,8 +245,35 @@ export function VoiceWidget({
     const source = audioCtx.createBufferSource();
     source.buffer = buffer;
     source.connect(audioCtx.destination);
-    source.onended = () => setIsSpeaking(false);
-    source.start();
+    
+    // First chunk, or we ran dry: refill the jitter buffer before starting
+    if (nextStartTimeRef.current < audioCtx.currentTime) {
+      nextStartTimeRef.current = audioCtx.currentTime + JITTER_BUFFER_MS / 1000;
+    }
+    source.start(nextStartTimeRef.current);
+    nextStartTimeRef.current += buffer.duration;
+    
+    scheduledSourcesRef.current.add(source);
+    source.onended = () => {
+      scheduledSourcesRef.current.delete(source);
+      checkPlaybackDone();
+    };
+  }, [getPlaybackContext, checkPlaybackDone]);
+
+  // Capture context is kept (suspended between turns) so the worklet loads once
+  const getCaptureContext = useCallback(async () => {
+    let audioCtx = audioContextRef.current;
+    if (!audioCtx || audioCtx.state === 'closed') {
+      audioCtx = new AudioContext({ sampleRate: 16000, latencyHint: 'interactive' });
+      audioContextRef.current = audioCtx;
+      const url = URL.createObjectURL(new Blob([CAPTURE_WORKLET], { type: 'application/javascript' }));
+      captureModuleRef.current = audioCtx.audioWorklet.addModule(url).finally(() => URL.revokeObjectURL(url));
+    }
+    await captureModuleRef.current;
+    if (audioCtx.state === 'suspended') {
+      await audioCtx.resume();
+    }
+    return audioCtx;
   }, []);
 
   // Start listening
@@ -140,46 +283,56 @@ export function VoiceWidget({
       return;
     }
     
+    // Unlock playback while we have a user gesture, and barge in on any reply
+    getPlaybackContext();
+    stopPlayback();
+    
     try {
       const stream = await navigator.mediaDevices.getUserMedia({
         audio: { sampleRate: 16000, channelCount: 1 }
       });
       
       mediaStreamRef.current = stream;
-      audioContextRef.current = new AudioContext({ sampleRate: 16000 });
+      const audioCtx = await getCaptureContext();
       
-      const source = audioContextRef.current.createMediaStreamSource(stream);
-      const processor = audioContextRef.current.createScriptProcessor(4096, 1, 1);
+      // Frames arrive from the audio thread every 20 ms
+      const source = audioCtx.createMediaStreamSource(stream);
+      const captureNode = new AudioWorkletNode(audioCtx, 'capture-processor', {
+        numberOfInputs: 1,
+        numberOfOutputs: 0,
+        processorOptions: { frameSamples: CAPTURE_FRAME_SAMPLES },
+      });
       
-      processor.onaudioprocess = (e) => {
+      captureNode.port.onmessage = (e: MessageEvent<Float32Array>) => {
         if (wsRef.current?.readyState === WebSocket.OPEN) {
-          const audioData = e.inputBuffer.getChannelData(0);
-          const base64 = btoa(String.fromCharCode(...new Uint8Array(audioData.buffer)));
-          wsRef.current.send(JSON.stringify({ type: 'audio', data: base64 }));
+          wsRef.current.send(float32ToInt16(e.data).buffer);
         }
       };
       
-      source.connect(processor);
-      processor.connect(audioContextRef.current.destination);
-      processorRef.current = processor;
+      source.connect(captureNode);
+      sourceRef.current = source;
+      captureNodeRef.current = captureNode;
       
       wsRef.current.send(JSON.stringify({ type: 'start_listening' }));
       
     } catch (err) {
       onError?.('Microphone access denied');
     }
-  }, [connect, onError]);
+  }, [connect, onError, getPlaybackContext, stopPlayback, getCaptureContext]);
+  startListeningRef.current = startListening;
 
   // Stop listening
   const stopListening = useCallback(() => {
-    if (processorRef.current) {
-      processorRef.current.disconnect();
-      processorRef.current = null;
+    if (captureNodeRef.current) {
+      captureNodeRef.current.port.onmessage = null;
+      captureNodeRef.current.disconnect();
+      captureNodeRef.current = null;
     }
-    if (audioContextRef.current) {
-      audioContextRef.current.close();
-      audioContextRef.current = null;
+    if (sourceRef.current) {
+      sourceRef.current.disconnect();
+      sourceRef.current = null;
     }
+    audioContextRef.current?.suspend();
     if (mediaStreamRef.current) {
       mediaStreamRef.current.getTracks().forEach(t => t.stop());
       mediaStreamRef.current = null;
@@ -193,6 +346,8 @@ export function VoiceWidget({
     connect();
     return () => {
       wsRef.current?.close();
+      audioContextRef.current?.close();
+      playbackContextRef.current?.close();
     };
   }, [connect]);
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark STT profiles for speed and accuracy.
+
+Usage:
+    python scripts/benchmark_stt.py clip1.wav clip2.mp3 [--model base] [--profiles latency,accuracy]
+    python scripts/benchmark_stt.py --synthesize [--model base]
+
+Each clip (WAV, or any format PyAV decodes) may have a clip.txt next to it
+with the reference transcript; clips with a reference contribute to the
+word error rate (WER).
+--synthesize generates clips from a few fixed phrases with the configured
+TTS backend instead (needs a real TTS backend, not mock).
+
+Reports, per profile: real-time factor (processing time / audio duration,
+lower is faster), mean latency per clip and WER.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.server.audio import decode_audio, resample
+from src.server.stt import STT_PROFILES, WhisperSTT
+
+PHRASES = [
+    "Yes.",
+    "Stop the music.",
+    "What's the weather like in Berlin tomorrow afternoon?",
+    "Remind me to call the dentist on Thursday at half past nine in the morning.",
+]
+
+Clip = Tuple[str, np.ndarray, Optional[str]]
+
+
+def load_clips(paths: List[str]) -> List[Clip]:
+    clips = []
+    for path in paths:
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path) as f:
+                reference = f.read().strip()
+        clips.append((os.path.basename(path), decode_audio(path), reference))
+    return clips
+
+
+def synthesize_clips() -> List[Clip]:
+    from src.server.tts import ChatterboxTTS
+
+    tts = ChatterboxTTS()
+    if tts._backend == "mock":
+        print("❌ --synthesize needs a real TTS backend (mock produces silence)")
+        sys.exit(1)
+    clips = []
+    for i, phrase in enumerate(PHRASES):
+        audio = asyncio.run(tts.synthesize(phrase))
+        clips.append((f"phrase{i + 1}", resample(audio, tts.sample_rate, 16000), phrase))
+    return clips
+
+
+def _words(text: str) -> List[str]:
+    return "".join(c.lower() if c.isalnum() or c.isspace() else " " for c in text).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1] / max(len(ref), 1)
+
+
+def benchmark(profile: str, clips: List[Clip], model: str, device: str) -> dict:
+    stt = WhisperSTT(model_name=model, device=device, profile=profile)
+    if stt._backend == "mock":
+        print("❌ No Whisper backend installed (pip install faster-whisper)")
+        sys.exit(1)
+    stt.warmup()
+
+    audio_seconds = processing_seconds = 0.0
+    errors, references = 0.0, 0
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        text = stt._transcribe_sync(audio)
+        elapsed = time.perf_counter() - start
+        audio_seconds += len(audio) / 16000
+        processing_seconds += elapsed
+        if reference is not None:
+            errors += word_error_rate(reference, text)
+            references += 1
+        print(f"  [{profile}] {name}: {elapsed * 1000:.0f} ms  {text!r}")
+
+    return {
+        "profile": profile,
+        "rtf": processing_seconds / audio_seconds,
+        "mean_latency_ms": processing_seconds / len(clips) * 1000,
+        "wer": errors / references if references else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("clips", nargs="*", help="Audio files")
+    parser.add_argument("--synthesize", action="store_true", help="Generate clips with the TTS backend")
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--profiles", default=",".join(STT_PROFILES), help="Comma-separated profiles")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if not args.clips and not args.synthesize:
+        parser.error("pass audio clips or --synthesize")
+    clips = synthesize_clips() if args.synthesize else load_clips(args.clips)
+
+    results = [
+        benchmark(profile, clips, args.model, args.device)
+        for profile in args.profiles.split(",") if profile
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print()
+        print(f"Whisper {args.model}, {len(clips)} clips")
+        print(f"{'profile':<10} {'RTF':>6} {'latency':>10} {'WER':>6}")
+        for r in results:
+            wer = "n/a" if r["wer"] is None else f"{r['wer'] * 100:.1f}%"
+            print(f"{r['profile']:<10} {r['rtf']:6.3f} {r['mean_latency_ms']:8.0f}ms {wer:>6}")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Build or verify an offline model bundle.
+
+Usage:
+    python scripts/bundle_models.py build [--whisper tiny,base] [--tts chatterbox] [--version V] [--pin BUNDLE]
+    python scripts/bundle_models.py verify models/bundles/<version>
+
+By default the bundle holds the models the server is configured with
+(OPENCLAW_STT_MODEL, OPENCLAW_STT_MODELS, OPENCLAW_TTS_MODEL). --pin
+rebuilds from the same upstream revisions as an existing bundle.
+
+The bundle lands in models/bundles/<version>/ (version defaults to today's
+date). Start the server offline with:
+
+    OPENCLAW_MODEL_BUNDLE=models/bundles/<version> python -m src.server.main
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.server.bundle import ModelBundle, TTS_REPOS, build_bundle
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), "..", "models", "bundles")
+
+
+def configured_models():
+    """(Whisper models, TTS backends) the server settings use."""
+    from src.server.main import settings
+
+    whisper = [settings.stt_model] + [m.strip() for m in settings.stt_models.split(",") if m.strip()]
+    tts = [settings.tts_model] if settings.tts_model in TTS_REPOS else []
+    return ",".join(dict.fromkeys(whisper)), ",".join(tts)
+
+
+def build(args):
+    version = args.version or date.today().strftime("%Y.%m.%d")
+    bundle_dir = os.path.abspath(os.path.join(args.root, version))
+    if args.whisper is None or args.tts is None:
+        whisper, tts = configured_models()
+        args.whisper = whisper if args.whisper is None else args.whisper
+        args.tts = tts if args.tts is None else args.tts
+    whisper_models = [m for m in args.whisper.split(",") if m]
+    tts_backends = [b for b in args.tts.split(",") if b]
+    revisions = {}
+    if args.pin:
+        try:
+            revisions = ModelBundle(args.pin).revisions()
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    for backend in tts_backends:
+        if backend not in TTS_REPOS:
+            print(f"❌ Unknown TTS backend: {backend} (options: {', '.join(TTS_REPOS)})")
+            sys.exit(1)
+
+    print(f"Building model bundle {version} in {bundle_dir}")
+    print(f"   Whisper: {', '.join(whisper_models) or '-'}  TTS: {', '.join(tts_backends) or '-'}")
+    print("This may take a while...")
+    try:
+        manifest = build_bundle(
+            bundle_dir,
+            version,
+            whisper_models=whisper_models,
+            vad=not args.no_vad,
+            tts_backends=tts_backends,
+            revisions=revisions,
+        )
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    files = sum(len(c["files"]) for c in manifest["components"].values())
+    print(f"✅ Bundle ready: {len(manifest['components'])} components, {files} files")
+    print(f"   OPENCLAW_MODEL_BUNDLE={bundle_dir}")
+
+
+def verify(args):
+    try:
+        bundle = ModelBundle(args.bundle)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"Verifying bundle {bundle.version} ({len(bundle.components)} components)...")
+    problems = bundle.verify(checksums=True)
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        sys.exit(1)
+    print("✅ All checksums match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Download every model into a new bundle")
+    p.add_argument("--whisper", default=None, help="Comma-separated Whisper sizes (default: configured models)")
+    p.add_argument("--tts", default=None, help="Comma-separated local TTS backends, chatterbox or xtts (default: configured)")
+    p.add_argument("--no-vad", action="store_true", help="Skip the Silero VAD model")
+    p.add_argument("--version", default=None, help="Bundle version (default: today's date)")
+    p.add_argument("--root", default=DEFAULT_ROOT, help="Directory holding bundles")
+    p.add_argument("--pin", default=None, help="Use the upstream revisions recorded in this bundle")
+    p.set_defaults(func=build)
+
+    p = sub.add_parser("verify", help="Check every file against the manifest checksums")
+    p.add_argument("bundle", help="Bundle directory")
+    p.set_defaults(func=verify)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """
-Download Whisper models for offline use.
+Download Whisper models (and the Silero VAD ONNX model) for offline use.
 
 Usage:
     python scripts/download_models.py [model_name]
+    python scripts/download_models.py vad [output_path]
     
 Models:
     tiny    - 39M params, ~1GB VRAM (fastest)
@@ -16,6 +17,12 @@ Models:
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.server.bundle import SILERO_VAD_VERSION, fetch_silero_vad
+
+DEFAULT_VAD_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "silero_vad.onnx")
+
 
 def download_model(model_name: str = "base"):
     """Download a Whisper model."""
@@ -48,6 +55,32 @@ def download_model(model_name: str = "base"):
         sys.exit(1)
 
 
+def download_vad(output_path: str = DEFAULT_VAD_PATH, version: str = SILERO_VAD_VERSION):
+    """Download the Silero VAD ONNX model (no torch needed to run it)."""
+    output_path = os.path.abspath(output_path)
+    print(f"Downloading Silero VAD {version} (ONNX)...")
+    
+    try:
+        fetch_silero_vad(output_path, version)
+        size = os.path.getsize(output_path)
+        print(f"✅ Silero VAD saved to {output_path} ({size // 1024} KB)")
+        
+        # Test the model
+        try:
+            import numpy as np
+            from src.server.vad import VoiceActivityDetector
+            vad = VoiceActivityDetector(engine="silero-onnx", model_path=output_path)
+            if vad._backend == "silero-onnx":
+                vad.is_speech(np.zeros(16000, dtype=np.float32))
+                print(f"✅ Model tested successfully!")
+        except ImportError:
+            pass
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
 def list_models():
     """List available models."""
     models = {
@@ -65,6 +98,8 @@ def list_models():
         print(f"  {name:20} - {desc}")
     print()
     print("Recommended: large-v3-turbo (GPU) or base (CPU)")
+    print()
+    print(f"  {'vad':20} - Silero VAD ONNX model (needs onnxruntime, not torch)")
 
 
 if __name__ == "__main__":
@@ -81,4 +116,7 @@ if __name__ == "__main__":
             list_models()
             sys.exit(0)
     
-    download_model(model)
+    if model == "vad":
+        download_vad(*sys.argv[2:3])
+    else:
+        download_model(model)
@@ -0,0 +1,396 @@
+"""
+Audio decoding, encoding and sample-rate conversion helpers.
+
+WAV (16-bit PCM) is decoded with the standard library. Everything else
+(mp3, ogg, m4a, webm...) needs PyAV, which faster-whisper already depends on.
+"""
+
+import queue
+import struct
+import threading
+import wave
+from typing import BinaryIO, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+STT_SAMPLE_RATE = 16000
+
+# Output formats: wav (16-bit PCM in a streaming WAV container),
+# pcm16 (raw signed 16-bit little-endian), f32 (raw float32 little-endian)
+AUDIO_FORMATS = {
+    "wav": "audio/wav",
+    "pcm16": "audio/L16",
+    "f32": "application/octet-stream",
+}
+
+# Formats a WebSocket client can negotiate for audio_chunk messages
+STREAM_FORMATS = ("pcm16", "f32", "opus")
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+# Uplink formats: raw float32 or int16 PCM, or Opus in a MediaRecorder container
+INPUT_FORMATS = ("f32", "pcm16", "webm", "ogg")
+
+# Rates Opus encodes natively, and its frame durations (ms)
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_MS = (10, 20, 40, 60)
+
+
+def resample(audio: np.ndarray, rate: int, target: int) -> np.ndarray:
+    """Linear-interpolation resample of float32 mono audio."""
+    if rate == target or len(audio) == 0:
+        return audio
+    n = int(round(len(audio) * target / rate))
+    positions = np.linspace(0, len(audio) - 1, n)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def _decode_wav(source: BinaryIO, target_rate: int) -> np.ndarray:
+    with wave.open(source, "rb") as f:
+        width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        data = f.readframes(f.getnframes())
+    if width != 2:
+        raise ValueError("Only 16-bit PCM WAV is supported without PyAV")
+    audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return resample(audio, rate, target_rate)
+
+
+def decode_audio(source: Union[str, BinaryIO], target_rate: int = STT_SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an audio file (path or seekable binary file) to mono float32.
+
+    Raises ValueError when the format cannot be decoded.
+    """
+    opened = open(source, "rb") if isinstance(source, str) else None
+    f = opened or source
+    try:
+        try:
+            return _decode_wav(f, target_rate)
+        except (wave.Error, EOFError, ValueError):
+            f.seek(0)
+
+        try:
+            from faster_whisper.audio import decode_audio as av_decode
+        except ImportError:
+            raise ValueError("Unsupported audio format (install faster-whisper to decode non-WAV audio)")
+        try:
+            return av_decode(f, sampling_rate=target_rate)
+        except Exception as e:
+            raise ValueError(f"Could not decode audio: {e}")
+    finally:
+        if opened:
+            opened.close()
+
+
+class Resampler:
+    """
+    Streaming linear resampler: feed chunks, get continuous output.
+
+    Carries the last sample and the fractional read position across
+    chunks so chunk boundaries do not click.
+    """
+
+    def __init__(self, rate: int, target: int):
+        self.rate = rate
+        self.target = target
+        self._step = rate / target
+        self._pos = 0.0
+        self._tail: Optional[np.ndarray] = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = chunk.astype(np.float32, copy=False)
+        if self.rate == self.target or len(chunk) == 0:
+            return chunk
+        x = chunk if self._tail is None else np.concatenate([self._tail, chunk])
+        positions = np.arange(self._pos, len(x) - 1, self._step)
+        out = np.interp(positions, np.arange(len(x)), x).astype(np.float32)
+        next_pos = positions[-1] + self._step if len(positions) else self._pos
+        self._pos = next_pos - (len(x) - 1)
+        self._tail = x[-1:]
+        return out
+
+
+def encode_audio(audio: np.ndarray, fmt: str) -> bytes:
+    """Encode float32 samples as pcm16 (also the WAV payload) or f32 bytes."""
+    if fmt == "f32":
+        return audio.astype("<f4", copy=False).tobytes()
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def wav_header(sample_rate: int, channels: int = 1, data_size: Optional[int] = None) -> bytes:
+    """
+    16-bit PCM WAV header.
+
+    Without data_size the sizes are set to the maximum, which players
+    treat as "read until the stream ends".
+    """
+    size = 0xFFFFFFFF - 36 if data_size is None else data_size
+    block_align = channels * 2
+    return b"".join([
+        b"RIFF", struct.pack("<I", min(36 + size, 0xFFFFFFFF)), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                             sample_rate * block_align, block_align, 16),
+        b"data", struct.pack("<I", size),
+    ])
+
+
+class OpusEncoder:
+    """
+    Streaming Opus encoder (libopus via PyAV).
+
+    Emits one packet per full frame as soon as the frame is complete, so
+    it adds at most one frame of latency. flush() pads the last partial
+    frame with silence at the end of an utterance.
+    """
+
+    def __init__(self, sample_rate: int = 24000, bitrate: int = 24000, frame_ms: int = 20):
+        import av
+
+        if sample_rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus sample rate must be one of {OPUS_SAMPLE_RATES}")
+        if frame_ms not in OPUS_FRAME_MS:
+            raise ValueError(f"Opus frame duration must be one of {OPUS_FRAME_MS} ms")
+        self._av = av
+        self.codec = av.CodecContext.create("libopus", "w")
+        self.codec.sample_rate = sample_rate
+        self.codec.layout = "mono"
+        self.codec.format = "s16"
+        self.codec.bit_rate = bitrate
+        self.codec.options = {"frame_duration": str(frame_ms), "application": "voip"}
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pts = 0
+
+    def _encode_frame(self, pcm: np.ndarray) -> List[bytes]:
+        frame = self._av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        frame.pts = self._pts
+        self._pts += len(pcm)
+        return [bytes(packet) for packet in self.codec.encode(frame)]
+
+    def encode(self, audio: np.ndarray) -> List[bytes]:
+        """Encode float32 samples; returns the packets of every completed frame."""
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        self._pending = np.concatenate([self._pending, pcm])
+        packets = []
+        while len(self._pending) >= self.frame_size:
+            packets += self._encode_frame(self._pending[:self.frame_size])
+            self._pending = self._pending[self.frame_size:]
+        return packets
+
+    def flush(self) -> List[bytes]:
+        """Encode the buffered partial frame, padded with silence."""
+        if not len(self._pending):
+            return []
+        pcm = np.pad(self._pending, (0, self.frame_size - len(self._pending)))
+        self._pending = np.zeros(0, dtype=np.int16)
+        return self._encode_frame(pcm)
+
+
+def frame_packets(packets: List[bytes]) -> bytes:
+    """Length-prefix Opus packets (u16 little-endian) into one payload."""
+    return b"".join(struct.pack("<H", len(p)) + p for p in packets)
+
+
+def unframe_packets(data: bytes) -> List[bytes]:
+    packets, i = [], 0
+    while i + 2 <= len(data):
+        (n,) = struct.unpack_from("<H", data, i)
+        packets.append(data[i + 2:i + 2 + n])
+        i += 2 + n
+    return packets
+
+
+class AudioOutput:
+    """
+    Per-session output stage: TTS audio at its native rate in, the
+    client's negotiated format and sample rate out.
+    """
+
+    def __init__(
+        self,
+        native_rate: int,
+        fmt: str = "pcm16",
+        sample_rate: Optional[int] = None,
+        opus_bitrate: int = 24000,
+        opus_frame_ms: int = 20,
+    ):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported output format: {fmt} (options: {', '.join(STREAM_FORMATS)})")
+        if sample_rate is not None and not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+        self.format = fmt
+        self.native_rate = native_rate
+        self.sample_rate = sample_rate or native_rate
+        self._opus = None
+        if fmt == "opus":
+            if self.sample_rate not in OPUS_SAMPLE_RATES:
+                # Encode at the nearest Opus rate at or above the request
+                self.sample_rate = next((r for r in OPUS_SAMPLE_RATES if r >= self.sample_rate), 48000)
+            try:
+                self._opus = OpusEncoder(self.sample_rate, opus_bitrate, opus_frame_ms)
+            except ImportError:
+                raise ValueError("Opus output needs PyAV (pip install av)")
+        self._resampler = Resampler(native_rate, self.sample_rate)
+        self.bytes_out = 0
+
+    def encode(self, chunk: np.ndarray) -> bytes:
+        audio = self._resampler.process(chunk)
+        if self._opus is not None:
+            data = frame_packets(self._opus.encode(audio))
+        else:
+            data = encode_audio(audio, self.format)
+        self.bytes_out += len(data)
+        return data
+
+    def flush(self) -> bytes:
+        """End of an utterance: emit anything an encoder still buffers."""
+        if self._opus is None:
+            return b""
+        data = frame_packets(self._opus.flush())
+        self.bytes_out += len(data)
+        return data
+
+
+class _ByteStream:
+    """Blocking file-like object fed from another thread (PyAV reads from it)."""
+
+    def __init__(self):
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._buffer = b""
+        self._eof = False
+
+    def feed(self, data: bytes):
+        self._chunks.put(data)
+
+    def close(self):
+        self._chunks.put(None)
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._buffer and not self._eof:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        size = len(self._buffer) if size < 0 else size
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class ContainerDecoder:
+    """
+    Streaming decoder for a growing WebM/Ogg byte stream (MediaRecorder).
+
+    A background thread demuxes and decodes as bytes arrive and resamples
+    to mono float32 at target_rate; feed() never blocks.
+    """
+
+    def __init__(self, container: str, target_rate: int = STT_SAMPLE_RATE):
+        import av
+
+        self._av = av
+        self.container = container
+        self.target_rate = target_rate
+        self._input = _ByteStream()
+        self._output: "queue.Queue[np.ndarray]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"decode-{container}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        av = self._av
+        try:
+            # Tiny probe so decoding starts with the first cluster/page
+            source = av.open(
+                self._input, mode="r", format=self.container,
+                options={"probesize": "32", "analyzeduration": "0"},
+            )
+            resampler = av.AudioResampler(format="flt", layout="mono", rate=self.target_rate)
+            with source:
+                for frame in source.decode(audio=0):
+                    for out in resampler.resample(frame):
+                        self._output.put(out.to_ndarray().reshape(-1))
+                for out in resampler.resample(None):
+                    self._output.put(out.to_ndarray().reshape(-1))
+        except Exception as e:
+            logger.warning(f"Uplink {self.container} decode stopped: {e}")
+
+    def feed(self, data: bytes):
+        self._input.feed(data)
+
+    def feed_eof(self):
+        self._input.close()
+
+    def read(self) -> np.ndarray:
+        """Everything decoded since the last read (possibly empty)."""
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._output.get_nowait())
+            except queue.Empty:
+                break
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+    def close(self, timeout: float = 5.0) -> np.ndarray:
+        """End the stream, wait for the decoder and return the remainder."""
+        self.feed_eof()
+        self._thread.join(timeout)
+        return self.read()
+
+
+class AudioInput:
+    """
+    Per-session input stage: negotiated uplink format in, 16 kHz mono
+    float32 out for VAD and STT.
+    """
+
+    def __init__(self, fmt: str = "f32", sample_rate: int = STT_SAMPLE_RATE):
+        if fmt not in INPUT_FORMATS:
+            raise ValueError(f"Unsupported input format: {fmt} (options: {', '.join(INPUT_FORMATS)})")
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+        if fmt in ("webm", "ogg"):
+            try:
+                import av  # noqa: F401
+            except ImportError:
+                raise ValueError(f"{fmt} input needs PyAV (pip install av)")
+        self.format = fmt
+        self.sample_rate = sample_rate
+        self._resampler = Resampler(sample_rate, STT_SAMPLE_RATE)
+        self._decoder: Optional[ContainerDecoder] = None
+        self.bytes_in = 0
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """Decode one uplink message; returns the audio available so far."""
+        self.bytes_in += len(data)
+        if self.format == "f32":
+            return self._resampler.process(np.frombuffer(data, dtype="<f4"))
+        if self.format == "pcm16":
+            pcm = np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2")
+            return self._resampler.process(pcm.astype(np.float32) / 32768.0)
+        if self._decoder is None:
+            self._decoder = ContainerDecoder(self.format)
+        self._decoder.feed(data)
+        return self._decoder.read()
+
+    def finish(self) -> np.ndarray:
+        """
+        End of an utterance: flush the container decoder and return the rest.
+
+        MediaRecorder starts a new container per recording, so the next
+        feed() starts a new decoder.
+        """
+        if self._decoder is None:
+            return np.zeros(0, dtype=np.float32)
+        decoder, self._decoder = self._decoder, None
+        return decoder.close()
+
+    def reset(self):
+        """Drop an unfinished container stream without waiting for it."""
+        if self._decoder is not None:
+            self._decoder.feed_eof()
+            self._decoder = None
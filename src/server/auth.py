@@ -10,7 +10,8 @@ Token system like Telegram Bot API:
 import secrets
 import hashlib
 import time
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from loguru import logger
@@ -31,7 +32,6 @@ class APIKey:
     # Usage tracking
     minutes_used: float = 0.0
     last_request_at: Optional[datetime] = None
-    request_count_this_minute: int = 0
     
     # Features
     features: Dict[str, bool] = field(default_factory=lambda: {
@@ -45,17 +45,43 @@ class APIKey:
     tier: str = "free"  # free, pro, enterprise
 
 
+# Fields re-read from the store when a cached key is refreshed (the rest
+# are only tracked by this process)
+STORED_FIELDS = ("name", "rate_limit_per_minute", "monthly_minutes", "minutes_used", "features", "active", "tier")
+
+# Cached lookups, including misses for unknown keys
+CACHE_MAX_ENTRIES = 10000
+
+
 class TokenManager:
     """
     Manage API tokens for voice connections.
     
-    In production, this would be backed by a database.
-    For MVP, we use in-memory storage + env vars.
+    Keys live in a KeyStore (in memory by default, or SQLite; see
+    keystore.py). Validation is served from an in-process cache, and an
+    entry is re-read from the store once it is `cache_ttl` seconds old, so
+    revocations and usage from other workers show up within that time.
+    Keys from the environment are process-local and never expire.
     """
     
-    def __init__(self):
-        self._keys: Dict[str, APIKey] = {}
-        self._key_to_id: Dict[str, str] = {}  # hash -> key_id lookup
+    def __init__(self, store=None, cache_ttl: float = 5.0):
+        from .keystore import MemoryKeyStore
+        
+        self.store = store or MemoryKeyStore()
+        self.cache_ttl = cache_ttl
+        self._local: Dict[str, APIKey] = {}  # hash -> env-configured key
+        self._cache: "OrderedDict[str, Tuple[float, Optional[APIKey]]]" = OrderedDict()
+    
+    def configure(self, store, cache_ttl: float = 5.0):
+        """Switch to another key store (at startup, before serving)."""
+        self.store.close()
+        self.store = store
+        self.cache_ttl = cache_ttl
+        self._cache.clear()
+    
+    def register(self, api_key: APIKey):
+        """Add a process-local key (e.g. the master key from the environment)."""
+        self._local[api_key.key_hash] = api_key
     
     def generate_key(
         self,
@@ -87,8 +113,8 @@ class TokenManager:
             tier=tier,
         )
         
-        self._keys[key_id] = api_key
-        self._key_to_id[key_hash] = key_id
+        self.store.put(api_key)
+        self._remember(key_hash, api_key)
         
         logger.info(f"Generated API key: {key_id} ({name}, tier={tier})")
         
@@ -104,40 +130,52 @@ class TokenManager:
             return None
         
         key_hash = self._hash_key(plaintext_key)
-        key_id = self._key_to_id.get(key_hash)
-        
-        if not key_id:
-            return None
-        
-        api_key = self._keys.get(key_id)
+        api_key = self._local.get(key_hash) or self._lookup(key_hash)
         
         if not api_key or not api_key.active:
             return None
         
         return api_key
     
-    def check_rate_limit(self, api_key: APIKey) -> bool:
+    def _lookup(self, key_hash: str) -> Optional[APIKey]:
+        """Cached store lookup; the store is only read once an entry expires."""
+        now = time.monotonic()
+        entry = self._cache.get(key_hash)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        
+        stored = self.store.get_by_hash(key_hash)
+        cached = entry[1] if entry is not None else None
+        if stored is not None and cached is not None and stored is not cached:
+            # Keep the same object, so this process's counters carry over
+            for name in STORED_FIELDS:
+                setattr(cached, name, getattr(stored, name))
+            stored = cached
+        self._remember(key_hash, stored)
+        return stored
+    
+    def _remember(self, key_hash: str, api_key: Optional[APIKey]):
+        self._cache[key_hash] = (time.monotonic() + self.cache_ttl, api_key)
+        self._cache.move_to_end(key_hash)
+        while len(self._cache) > CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+    
+    def check_rate_limit(self, api_key: APIKey, cost: float = 1.0) -> bool:
         """
         Check if request is within rate limits.
         
+        Token bucket: a burst of up to `rate_limit_per_minute` requests, refilled
+        continuously at that rate. The bucket lives in the key store, so with
+        SQLite every worker shares it (leased in batches, so most checks
+        never touch the database).
+        
         Returns True if allowed, False if rate limited.
         """
-        now = datetime.now(tz=None)
-        
-        # Reset counter if new minute
-        if api_key.last_request_at:
-            elapsed = (now - api_key.last_request_at).total_seconds()
-            if elapsed >= 60:
-                api_key.request_count_this_minute = 0
-        
-        # Check rate limit
-        if api_key.request_count_this_minute >= api_key.rate_limit_per_minute:
+        rate = api_key.rate_limit_per_minute
+        if not self.store.take_tokens(api_key.key_id, rate, rate / 60, cost):
             return False
         
-        # Update counters
-        api_key.request_count_this_minute += 1
-        api_key.last_request_at = now
-        
+        api_key.last_request_at = datetime.now(tz=None)
         return True
     
     def check_monthly_quota(self, api_key: APIKey, minutes: float = 0) -> bool:
@@ -154,6 +192,8 @@ class TokenManager:
     def record_usage(self, api_key: APIKey, minutes: float):
         """Record minutes used for billing."""
         api_key.minutes_used += minutes
+        if api_key.key_hash not in self._local:
+            self.store.add_usage(api_key.key_id, minutes)
         logger.debug(f"Key {api_key.key_id}: used {minutes:.2f} min, total {api_key.minutes_used:.2f}")
     
     def get_usage(self, api_key: APIKey) -> Dict[str, Any]:
@@ -169,12 +209,15 @@ class TokenManager:
         }
     
     def revoke_key(self, key_id: str) -> bool:
-        """Revoke an API key."""
-        if key_id in self._keys:
-            self._keys[key_id].active = False
+        """Revoke an API key (other workers see it within `cache_ttl`)."""
+        revoked = self.store.revoke(key_id)
+        for api_key in [k for _, k in self._cache.values() if k] + list(self._local.values()):
+            if api_key.key_id == key_id:
+                api_key.active = False
+                revoked = True
+        if revoked:
             logger.info(f"Revoked API key: {key_id}")
-            return True
-        return False
+        return revoked
     
     def _hash_key(self, plaintext_key: str) -> str:
         """Hash an API key for storage."""
@@ -215,8 +258,7 @@ def load_keys_from_env():
             "voice_cloning": True,
             "priority_queue": True,
         }
-        token_manager._keys["master"] = api_key
-        token_manager._key_to_id[key_hash] = "master"
+        token_manager.register(api_key)
         logger.info("Loaded master API key from environment")
 
 
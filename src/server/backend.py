@@ -7,6 +7,19 @@ from typing import Optional, List, Dict, AsyncGenerator
 
 from loguru import logger
 
+from .budget import SpeechBudget
+from .cache import ResponseCache
+from .connections import ConnectionPool
+from .context import ContextWindow
+from .endpoints import CircuitBreaker, Endpoint, EndpointPool
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a voice conversation between a user and an "
+    "assistant. Update the summary with the new messages. Keep names, facts, "
+    "preferences, decisions and open questions; drop small talk. Reply with the "
+    "summary only, in at most {words} words."
+)
+
 
 class AIBackend:
     """AI backend for processing user messages."""
@@ -18,7 +31,27 @@ class AIBackend:
         model: str = "gpt-4o-mini",
         api_key: Optional[str] = None,
         system_prompt: Optional[str] = None,
+        context_tokens: int = 2000,
+        summary_tokens: int = 200,
+        response_cache: Optional[ResponseCache] = None,
+        endpoints: Optional[List[Dict]] = None,
+        hedge_delay: float = 2.0,
+        hedge_percentile: float = 0.95,
+        breaker_failures: int = 3,
+        breaker_reset: float = 30.0,
+        max_connections: int = 20,
+        keepalive_connections: int = 10,
+        warm_connections: int = 2,
+        keepalive_interval: float = 30.0,
+        speech_budget: Optional[SpeechBudget] = None,
     ):
+        """
+        `url`/`model`/`api_key` are the primary endpoint. `endpoints` adds
+        fallbacks ({"url", "model", "api_key", "name"}) that requests hedge
+        or fail over to; see endpoints.py. All of them share one warm
+        connection pool; see connections.py. `speech_budget` caps and
+        early-stops responses by spoken length; see budget.py.
+        """
         self.backend_type = backend_type
         self.url = url
         self.model = model
@@ -28,19 +61,57 @@ class AIBackend:
             "Aim for 1-2 sentences unless more detail is needed."
         )
         self.conversation_history: List[Dict] = []
+        self.response_cache = response_cache
+        self.speech_budget = speech_budget or SpeechBudget(max_seconds=0)
+        self.pool: Optional[EndpointPool] = None
+        self.connections: Optional[ConnectionPool] = None
         self._client = None
-        self._setup_client()
+        self._setup_client(
+            endpoints or [], hedge_delay, hedge_percentile, breaker_failures, breaker_reset,
+            {
+                "max_connections": max_connections,
+                "keepalive_connections": keepalive_connections,
+                "warm_connections": warm_connections,
+                "keepalive_interval": keepalive_interval,
+            },
+        )
+        # History beyond the token budget is folded into a running summary
+        self.context = ContextWindow(
+            max_tokens=context_tokens,
+            summary_tokens=summary_tokens,
+            summarize=self._summarize if self._client else None,
+        )
     
-    def _setup_client(self):
-        """Set up the API client."""
+    def _setup_client(
+        self, extra_endpoints, hedge_delay, hedge_percentile, breaker_failures, breaker_reset, connection_options,
+    ):
+        """Set up the API clients."""
         if self.backend_type == "openai":
             try:
-                from openai import AsyncOpenAI
-                self._client = AsyncOpenAI(
-                    api_key=self.api_key,
-                    base_url=self.url if self.url != "https://api.openai.com/v1" else None,
-                )
-                logger.info(f"✅ OpenAI client ready (model: {self.model})")
+                configs = [{"url": self.url, "model": self.model, "api_key": self.api_key}]
+                configs.extend(extra_endpoints)
+                self.connections = ConnectionPool(**connection_options)
+                endpoints = [
+                    Endpoint(
+                        url=config["url"],
+                        model=config.get("model", self.model),
+                        api_key=config.get("api_key", self.api_key),
+                        name=config.get("name"),
+                        # With fallbacks, fail over instead of retrying one endpoint
+                        max_retries=0 if len(configs) > 1 else 2,
+                        breaker=CircuitBreaker(breaker_failures, breaker_reset),
+                        http_client=self.connections.client,
+                    )
+                    for config in configs
+                ]
+                for endpoint, config in zip(endpoints, configs):
+                    self.connections.add_endpoint(str(endpoint.client.base_url), config.get("api_key", self.api_key))
+                self.pool = EndpointPool(endpoints, hedge_delay, hedge_percentile)
+                self._client = endpoints[0].client
+                if len(endpoints) > 1:
+                    logger.info(f"✅ OpenAI clients ready ({', '.join(e.name for e in endpoints)})")
+                else:
+                    logger.info(f"✅ OpenAI client ready (model: {self.model})")
             except ImportError:
                 logger.error("openai package not installed")
         elif self.backend_type == "openclaw":
@@ -65,49 +136,65 @@ class AIBackend:
             # Fallback echo response
             return f"I heard you say: {user_message}"
     
-    async def chat_stream(self, user_message: str) -> AsyncGenerator[str, None]:
+    async def chat_stream(
+        self, user_message: str, use_cache: bool = True, record: bool = True,
+    ) -> AsyncGenerator[str, None]:
         """
         Stream a response, yielding chunks as they arrive.
         
         Args:
             user_message: The user's transcribed speech
+            use_cache: Replay a cached response for a repeated utterance
+                (only if the backend has a response cache)
+            record: Add the turn to the conversation history. Speculative
+                requests pass False, raise on errors instead of apologizing,
+                and call record_turn(measure_prompt=True) if they are used.
             
         Yields:
             Text chunks as they're generated
         """
         if self.backend_type == "openai" and self._client:
-            async for chunk in self._chat_openai_stream(user_message):
+            async for chunk in self._chat_openai_stream(user_message, use_cache, record):
                 yield chunk
         else:
             yield f"I heard you say: {user_message}"
     
     async def _chat_openai(self, user_message: str) -> str:
         """Chat via OpenAI API."""
+        cache_key = self._cache_key(user_message)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            response = "".join(cached)
+            self.record_turn(user_message, response)
+            return response
+        
         # Add user message to history
         self.conversation_history.append({
             "role": "user",
             "content": user_message,
         })
         
-        # Build messages
-        messages = [{"role": "system", "content": self.system_prompt}]
-        messages.extend(self.conversation_history[-10:])  # Last 10 turns
+        messages = self.context.build(self.system_prompt, self.conversation_history)
         
         try:
-            response = await self._client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,  # Allow longer for voice
+            assistant_message = await self.pool.complete(
+                messages,
+                max_tokens=self.speech_budget.max_tokens,
                 temperature=0.7,
             )
-            
-            assistant_message = response.choices[0].message.content
+            cut = self.speech_budget.cut(assistant_message)
+            if cut is not None:
+                assistant_message = assistant_message[:cut]
+            self.speech_budget.record(assistant_message, stopped=cut is not None)
             
             # Add to history
             self.conversation_history.append({
                 "role": "assistant",
                 "content": assistant_message,
             })
+            self.context.maybe_compact(self.system_prompt, self.conversation_history)
+            if cache_key:
+                self.response_cache.put(cache_key, [assistant_message])
             
             return assistant_message
             
@@ -115,45 +202,105 @@ class AIBackend:
             logger.error(f"OpenAI API error: {e}")
             return "Sorry, I had trouble processing that. Could you try again?"
     
-    async def _chat_openai_stream(self, user_message: str) -> AsyncGenerator[str, None]:
+    def _cache_key(self, user_message: str, use_cache: bool = True):
+        if not use_cache or not self.response_cache:
+            return None
+        return self.response_cache.key(user_message, self.system_prompt, self.conversation_history)
+    
+    def record_turn(self, user_message: str, response: str, measure_prompt: bool = False):
+        """
+        Add a completed exchange to the history (e.g. a committed speculation).
+        
+        measure_prompt: The response came from an unrecorded request, whose
+            prompt only counts towards the context metrics now
+        """
+        user_turn = {"role": "user", "content": user_message}
+        if measure_prompt:
+            self.context.build(self.system_prompt, self.conversation_history + [user_turn])
+        self.conversation_history.append(user_turn)
+        self.conversation_history.append({"role": "assistant", "content": response})
+        self.context.maybe_compact(self.system_prompt, self.conversation_history)
+    
+    async def _chat_openai_stream(
+        self, user_message: str, use_cache: bool = True, record: bool = True,
+    ) -> AsyncGenerator[str, None]:
         """Stream chat via OpenAI API."""
-        # Add user message to history
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message,
-        })
+        cache_key = self._cache_key(user_message, use_cache)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.debug(f"Response cache hit: {user_message[:50]}")
+            for text in cached:
+                yield text
+            if record:
+                self.record_turn(user_message, "".join(cached))
+            return
         
-        # Build messages
-        messages = [{"role": "system", "content": self.system_prompt}]
-        messages.extend(self.conversation_history[-10:])
+        user_turn = {"role": "user", "content": user_message}
+        if record:
+            # Add user message to history
+            self.conversation_history.append(user_turn)
+            messages = self.context.build(self.system_prompt, self.conversation_history)
+        else:
+            messages = self.context.build(
+                self.system_prompt, self.conversation_history + [user_turn], measure=False,
+            )
         
         full_response = ""
+        chunks = []
+        budget = self.speech_budget
+        stopped = False
         
         try:
-            stream = await self._client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-                stream=True,
-            )
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    text = chunk.choices[0].delta.content
+            # Hedged across the endpoint pool; fails over before the first token
+            stream = self.pool.stream(messages, max_tokens=budget.max_tokens, temperature=0.7)
+            try:
+                async for text in stream:
+                    start = len(full_response)
                     full_response += text
-                    yield text
+                    # Past the spoken-length budget: end at this sentence
+                    cut = budget.cut(full_response, start)
+                    if cut is not None:
+                        text, full_response, stopped = text[:cut - start], full_response[:cut], True
+                    if text:
+                        chunks.append(text)
+                        yield text
+                    if stopped:
+                        logger.debug(f"Speech budget reached, stopping the LLM after {len(full_response)} chars")
+                        break
+            finally:
+                await stream.aclose()  # Closes the LLM stream on an early stop
+            budget.record(full_response, stopped)
             
             # Add complete response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": full_response,
-            })
+            if record:
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": full_response,
+                })
+                self.context.maybe_compact(self.system_prompt, self.conversation_history)
+            if cache_key:
+                self.response_cache.put(cache_key, chunks)
             
         except Exception as e:
+            if not record:
+                raise
             logger.error(f"OpenAI streaming error: {e}")
             yield "Sorry, I had trouble processing that."
     
+    async def _summarize(self, summary: str, turns: List[Dict]) -> str:
+        """Fold turns into the running summary (runs after the response is sent)."""
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        new_summary = await self.pool.complete(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT.format(words=self.context.summary_tokens * 3 // 4)},
+                {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+            max_tokens=self.context.summary_tokens,
+            temperature=0,
+        )
+        return new_summary or summary
+    
     def clear_history(self):
         """Clear conversation history."""
         self.conversation_history = []
+        self.context.reset()
@@ -0,0 +1,92 @@
+"""
+Spoken-length budget for LLM responses.
+
+A voice reply nobody listens to the end of still costs generation and TTS
+time. The budget is a target speech duration: generation is capped at a
+`max_tokens` derived from it (with headroom to finish the sentence), and
+once the text streamed so far would take longer than the budget to say,
+the response ends at that sentence boundary and the LLM stream is closed.
+
+Speech duration is estimated from the text as it will be spoken
+(`clean_for_speech`, then `estimate_speech_duration`), so markdown, URLs and
+code blocks don't count against it.
+"""
+
+import re
+from typing import Dict, Optional
+
+from .context import estimate_tokens
+from .text_utils import clean_for_speech, estimate_speech_duration
+
+# Rough English tokens per word, for turning a word budget into max_tokens
+TOKENS_PER_WORD = 4 / 3
+
+# max_tokens leaves room past the budget so the last sentence can finish
+HEADROOM = 1.5
+
+# A sentence ends at . ! or ? followed by whitespace ("3.14" doesn't count)
+SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+
+class SpeechBudget:
+    """Caps and early-stops responses at a target speech duration."""
+
+    def __init__(self, max_seconds: float = 30.0, wpm: int = 150, default_max_tokens: int = 500):
+        """
+        Args:
+            max_seconds: Target speech duration per response (0 disables the budget)
+            wpm: Speaking rate used to estimate duration
+            default_max_tokens: max_tokens when the budget is disabled
+        """
+        self.max_seconds = max_seconds
+        self.wpm = wpm
+        self.default_max_tokens = default_max_tokens
+
+        # Metrics
+        self.responses = 0
+        self.early_stops = 0
+        self.tokens_generated = 0
+        self.tokens_unused = 0  # max_tokens minus what early-stopped responses used
+
+    @property
+    def max_tokens(self) -> int:
+        if not self.max_seconds:
+            return self.default_max_tokens
+        words = self.max_seconds * self.wpm / 60
+        return max(32, int(words * TOKENS_PER_WORD * HEADROOM))
+
+    def spoken_seconds(self, text: str) -> float:
+        return estimate_speech_duration(clean_for_speech(text), self.wpm)
+
+    def cut(self, text: str, start: int = 0) -> Optional[int]:
+        """
+        Where to end `text`: the first sentence boundary at or after `start`
+        at which the spoken length reaches the budget, else None.
+        """
+        if not self.max_seconds:
+            return None
+        for match in SENTENCE_END.finditer(text, max(0, start - 1)):
+            end = match.end()
+            if self.spoken_seconds(text[:end]) >= self.max_seconds:
+                return end
+        return None
+
+    def record(self, text: str, stopped: bool):
+        """Count a finished response (stopped = ended early by the budget)."""
+        tokens = estimate_tokens(text)
+        self.responses += 1
+        self.tokens_generated += tokens
+        if stopped:
+            self.early_stops += 1
+            self.tokens_unused += max(0, self.max_tokens - tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "max_seconds": self.max_seconds,
+            "max_tokens": self.max_tokens,
+            "responses": self.responses,
+            "early_stops": self.early_stops,
+            "early_stop_rate": self.early_stops / self.responses if self.responses else 0.0,
+            "tokens_generated": self.tokens_generated,
+            "tokens_unused": self.tokens_unused,
+        }
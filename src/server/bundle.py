@@ -0,0 +1,299 @@
+"""
+Offline model bundles.
+
+A bundle is one versioned directory holding every model the server needs,
+plus a manifest with a SHA-256 and size for each file:
+
+    models/bundles/2026.10.19/
+        manifest.json
+        whisper/tiny/...         (CTranslate2 faster-whisper models)
+        whisper/large-v3-turbo/...
+        vad/silero_vad.onnx
+        tts/chatterbox/...
+
+Every download is checked against the hashes its upstream publishes (the
+HuggingFace commit's file hashes, PyPI's wheel digest) before it is
+checksummed into the manifest, and the manifest records where each
+component came from, so a bundle can be rebuilt from the same revisions.
+
+Build and verify with scripts/bundle_models.py. Point OPENCLAW_MODEL_BUNDLE
+at the directory to start the server fully offline.
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+MANIFEST = "manifest.json"
+
+# Silero VAD release whose wheel ships the ONNX model
+SILERO_VAD_VERSION = "5.1.2"
+
+# HuggingFace repos for the local TTS backends
+TTS_REPOS = {
+    "chatterbox": "ResembleAI/chatterbox",
+    "xtts": "coqui/XTTS-v2",
+}
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def git_blob_sha1(path: Path) -> str:
+    """The git object id of a file (what the Hub reports for non-LFS files)."""
+    digest = hashlib.sha1(b"blob %d\0" % path.stat().st_size)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def silero_vad_source(version: str = SILERO_VAD_VERSION) -> Dict[str, Any]:
+    """The silero-vad wheel on PyPI: URL and published SHA-256."""
+    index_url = "https://pypi.org/pypi/silero-vad/json"
+    with urllib.request.urlopen(index_url) as r:
+        releases = json.load(r)["releases"]
+    wheel = next(f for f in releases[version] if f["filename"].endswith(".whl"))
+    return {
+        "package": "silero-vad",
+        "version": version,
+        "url": urllib.parse.urljoin(index_url, wheel["url"]),
+        "sha256": wheel["digests"]["sha256"],
+    }
+
+
+def fetch_silero_vad(output_path: str, version: str = SILERO_VAD_VERSION) -> Dict[str, Any]:
+    """
+    Download the Silero VAD ONNX model from its versioned PyPI wheel,
+    checked against PyPI's digest. Returns the source (see silero_vad_source).
+    """
+    source = silero_vad_source(version)
+    with urllib.request.urlopen(source["url"]) as r:
+        data = r.read()
+    if hashlib.sha256(data).hexdigest() != source["sha256"]:
+        raise ValueError(f"silero-vad {version} wheel does not match its PyPI SHA-256")
+    model = zipfile.ZipFile(io.BytesIO(data)).read("silero_vad/data/silero_vad.onnx")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(model)
+    return source
+
+
+def verify_hf_download(repo_id: str, revision: str, output_dir: str, siblings) -> int:
+    """
+    Check downloaded files against the hashes the Hub lists for a commit.
+    Raises ValueError on a mismatch; returns the number of files checked.
+    """
+    checked = 0
+    for sibling in siblings:
+        path = Path(output_dir) / sibling.rfilename
+        if not path.is_file():
+            continue  # Not requested (allow_patterns)
+        if sibling.lfs:
+            ok = sha256_file(path) == sibling.lfs["sha256"]
+        else:
+            ok = git_blob_sha1(path) == sibling.blob_id
+        if not ok:
+            raise ValueError(f"{sibling.rfilename} does not match {repo_id}@{revision[:12]}")
+        checked += 1
+    if not checked:
+        raise ValueError(f"Nothing from {repo_id}@{revision[:12]} was downloaded to {output_dir}")
+    return checked
+
+
+def fetch_hf(repo_id: str, output_dir: str, revision: Optional[str] = None, download=None) -> Dict[str, Any]:
+    """
+    Download a HuggingFace repo at a fixed commit and verify it.
+
+    `revision` (branch, tag or commit; default: main) is resolved to a commit
+    first, so the files and the hashes they are checked against match.
+    `download(repo_id, output_dir, commit)` replaces snapshot_download.
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    info = HfApi().model_info(repo_id, revision=revision, files_metadata=True)
+    if download:
+        download(repo_id, output_dir, info.sha)
+    else:
+        snapshot_download(repo_id=repo_id, revision=info.sha, local_dir=output_dir)
+    verify_hf_download(repo_id, info.sha, output_dir, info.siblings)
+    return {"repo": repo_id, "revision": info.sha}
+
+
+def whisper_repo(model_name: str) -> str:
+    """The HuggingFace repo faster-whisper downloads a model size from."""
+    if "/" in model_name:
+        return model_name
+    from faster_whisper.utils import _MODELS  # The table download_model() uses
+    return _MODELS[model_name]
+
+
+def fetch_whisper(model_name: str, output_dir: str, revision: Optional[str] = None) -> Dict[str, Any]:
+    """Download a faster-whisper (CTranslate2) model into output_dir. Returns its source."""
+    from faster_whisper import download_model
+
+    return fetch_hf(
+        whisper_repo(model_name), output_dir, revision,
+        download=lambda repo, out, commit: download_model(repo, output_dir=out, revision=commit),
+    )
+
+
+def fetch_tts(backend: str, output_dir: str, revision: Optional[str] = None) -> Dict[str, Any]:
+    """Download a local TTS backend's weights into output_dir. Returns its source."""
+    return fetch_hf(TTS_REPOS[backend], output_dir, revision)
+
+
+class ModelBundle:
+    """A versioned, checksummed directory of models."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        manifest_path = self.path / MANIFEST
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No {MANIFEST} in model bundle {self.path}")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest.get("version")
+        self.components: Dict[str, Dict] = self.manifest.get("components", {})
+
+    def component_path(self, name: str) -> Optional[str]:
+        component = self.components.get(name)
+        if not component:
+            return None
+        path = self.path / component["path"]
+        return str(path / component["file"]) if "file" in component else str(path)
+
+    def whisper_path(self, model_name: str) -> Optional[str]:
+        return self.component_path(f"whisper/{model_name}")
+
+    def vad_path(self) -> Optional[str]:
+        return self.component_path("vad")
+
+    def tts_path(self, backend: str) -> Optional[str]:
+        return self.component_path(f"tts/{backend}")
+
+    def revisions(self) -> Dict[str, str]:
+        """Upstream commit of each HuggingFace component, to rebuild the same bundle."""
+        return {
+            name: component["source"]["revision"]
+            for name, component in self.components.items()
+            if "revision" in component.get("source", {})
+        }
+
+    def verify(self, checksums: bool = True) -> List[str]:
+        """
+        Check every file in the manifest. Returns a list of problems (empty = OK).
+
+        With checksums=False only existence and size are checked, which is
+        what the server does at startup to stay fast.
+        """
+        problems = []
+        for name, component in self.components.items():
+            for rel, expected in component.get("files", {}).items():
+                path = self.path / component["path"] / rel
+                if not path.exists():
+                    problems.append(f"{name}: missing {rel}")
+                elif path.stat().st_size != expected["size"]:
+                    problems.append(f"{name}: size mismatch for {rel}")
+                elif checksums and sha256_file(path) != expected["sha256"]:
+                    problems.append(f"{name}: checksum mismatch for {rel}")
+        return problems
+
+    def go_offline(self):
+        """Stop HuggingFace libraries from making network calls."""
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+
+def write_manifest(
+    bundle_dir: str,
+    version: str,
+    components: Dict[str, str],
+    sources: Optional[Dict[str, Dict]] = None,
+) -> Dict:
+    """
+    Checksum every file of each component and write manifest.json.
+
+    `components` maps a component name (e.g. "whisper/base") to its
+    directory or file, relative to bundle_dir; `sources` records where each
+    one was downloaded from.
+    """
+    sources = sources or {}
+    root = Path(bundle_dir)
+    manifest = {"version": version, "created_at": int(time.time()), "components": {}}
+
+    for name, rel_path in components.items():
+        target = root / rel_path
+        if target.is_file():
+            base, files = target.parent, [target]
+            entry = {"path": str(Path(rel_path).parent), "file": target.name}
+        else:
+            base = target
+            files = sorted(p for p in target.rglob("*") if p.is_file() and ".cache" not in p.parts)
+            entry = {"path": str(Path(rel_path))}
+        entry["files"] = {
+            str(f.relative_to(base)): {"sha256": sha256_file(f), "size": f.stat().st_size}
+            for f in files
+        }
+        if name in sources:
+            entry["source"] = sources[name]
+        manifest["components"][name] = entry
+
+    with open(root / MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_bundle(
+    bundle_dir: str,
+    version: str,
+    whisper_models: Iterable[str] = ("base",),
+    vad: bool = True,
+    tts_backends: Iterable[str] = (),
+    revisions: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """
+    Download every requested model into bundle_dir and write its manifest.
+
+    `revisions` pins components to upstream commits (e.g. another bundle's
+    ModelBundle.revisions()); the rest use the latest.
+    """
+    root = Path(bundle_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    revisions = revisions or {}
+    components: Dict[str, str] = {}
+    sources: Dict[str, Dict] = {}
+
+    for model_name in whisper_models:
+        name = f"whisper/{model_name}"
+        logger.info(f"Fetching Whisper {model_name}...")
+        sources[name] = fetch_whisper(model_name, str(root / name), revisions.get(name))
+        components[name] = name
+
+    if vad:
+        logger.info("Fetching Silero VAD (ONNX)...")
+        sources["vad"] = fetch_silero_vad(str(root / "vad" / "silero_vad.onnx"))
+        components["vad"] = "vad/silero_vad.onnx"
+
+    for backend in tts_backends:
+        name = f"tts/{backend}"
+        logger.info(f"Fetching TTS {backend}...")
+        sources[name] = fetch_tts(backend, str(root / name), revisions.get(name))
+        components[name] = name
+
+    return write_manifest(bundle_dir, version, components, sources)
@@ -0,0 +1,101 @@
+"""
+Response cache for repeated utterances.
+
+Short utterances ("thanks", "stop", "what time is it") make up much of the
+traffic, and each one is a full LLM round trip. With the cache on, a
+completed response is stored as the list of chunks it streamed in, keyed by:
+
+- the transcript, normalized (case, punctuation and spacing ignored)
+- a hash of the system prompt
+- a fingerprint of the last few messages, so "yes" after two different
+  questions are different entries
+
+A hit replays the chunks through the normal streaming path, so sentence
+splitting, TTS and the client see exactly what a live response produces.
+Entries expire after a TTL and the least recently used are evicted first.
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """LRU + TTL cache of streamed LLM responses."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300.0,
+        context_messages: int = 2,
+        max_chars: int = 100,
+    ):
+        """
+        Args:
+            max_entries: Responses kept (0 disables the cache)
+            ttl: Seconds a response stays valid
+            context_messages: Previous messages that must match for a hit
+            max_chars: Longer utterances are never cached
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.context_messages = context_messages
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, utterance: str, system_prompt: str, history: List[Dict]) -> Optional[CacheKey]:
+        """Cache key for an utterance, or None if it shouldn't be cached."""
+        normalized = normalize_utterance(utterance)
+        if not self.max_entries or not normalized or len(normalized) > self.max_chars:
+            return None
+        recent = history[-self.context_messages:] if self.context_messages else []
+        context = "\n".join(f"{m['role']}:{normalize_utterance(m['content'] or '')}" for m in recent)
+        return (normalized, _digest(system_prompt), _digest(context))
+
+    def get(self, key: Optional[CacheKey]) -> Optional[List[str]]:
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Optional[CacheKey], chunks: List[str]):
+        if key is None or not chunks:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, list(chunks))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,143 @@
+"""
+Warm, shared HTTP connections to the LLM endpoints.
+
+Every endpoint's OpenAI client uses one shared httpx AsyncClient, so
+connections are pooled per host and reused across turns and sessions. At
+startup a few connections per endpoint are opened ahead of the first user
+turn. While the server is idle, a cheap `GET /models` keeps them open, so
+TCP and TLS handshakes stay off the critical path.
+
+The pool counts how many responses came over a new connection and how many
+reused one (via httpcore's `network_stream` response extension).
+"""
+
+import asyncio
+import sys
+import time
+import weakref
+from typing import Dict, Iterable, Optional
+
+from loguru import logger
+
+
+def httpx_module():
+    """The httpx package the OpenAI SDK is built on (newer SDKs use the httpx2 fork)."""
+    try:
+        from openai import DefaultAsyncHttpxClient
+    except ImportError:  # openai < 1.17
+        import httpx
+        return httpx
+    base = next(c for c in DefaultAsyncHttpxClient.__mro__ if c.__name__ == "AsyncClient")
+    return sys.modules[base.__module__.split(".")[0]]
+
+
+class ConnectionPool:
+    """A shared, pre-warmed keep-alive HTTP client for the LLM endpoints."""
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        keepalive_connections: int = 10,
+        warm_connections: int = 2,
+        keepalive_interval: float = 30.0,
+    ):
+        """
+        Args:
+            max_connections: Open connections across all endpoints
+            keepalive_connections: Idle connections the pool keeps open
+            warm_connections: Connections opened per endpoint ahead of use
+            keepalive_interval: Seconds of idleness before a keep-alive ping (0 = off)
+        """
+        httpx = httpx_module()
+        self.warm_connections = warm_connections
+        self.keepalive_interval = keepalive_interval
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=keepalive_connections,
+                # Outlive the ping interval so pinged connections stay pooled
+                keepalive_expiry=max(60.0, keepalive_interval * 2),
+            ),
+            follow_redirects=True,
+            event_hooks={"response": [self._on_response]},
+        )
+        self._endpoints: Dict[str, Optional[str]] = {}  # base URL -> API key
+        self._streams: "weakref.WeakSet" = weakref.WeakSet()
+        self._task: Optional[asyncio.Task] = None
+        self.last_activity = time.monotonic()
+
+        # Metrics
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+    def add_endpoint(self, url: str, api_key: Optional[str] = None):
+        self._endpoints[url.rstrip("/")] = api_key
+
+    async def _on_response(self, response):
+        self.last_activity = time.monotonic()
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        if stream in self._streams:
+            self.reused_connections += 1
+        else:
+            self._streams.add(stream)
+            self.new_connections += 1
+
+    async def _ping(self, url: str, api_key: Optional[str]):
+        """A cheap request whose only job is to open or keep a connection."""
+        self.pings += 1
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        try:
+            response = await self.client.get(f"{url}/models", headers=headers, timeout=10.0)
+            await response.aclose()
+        except Exception as e:
+            self.ping_failures += 1
+            logger.debug(f"Keep-alive ping to {url} failed: {e}")
+
+    async def warm(self, endpoints: Optional[Iterable[str]] = None):
+        """Open `warm_connections` connections to each endpoint concurrently."""
+        urls = list(endpoints) if endpoints is not None else list(self._endpoints)
+        await asyncio.gather(*(
+            self._ping(url, self._endpoints.get(url))
+            for url in urls
+            for _ in range(self.warm_connections)
+        ))
+
+    def start(self):
+        """Pre-warm now, then keep connections alive while idle."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        started = time.monotonic()
+        await self.warm()
+        logger.info(f"🔌 LLM connections warm ({len(self._endpoints)} endpoints, {time.monotonic() - started:.2f}s)")
+        if self.keepalive_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            # Real traffic keeps the connections open on its own
+            if time.monotonic() - self.last_activity >= self.keepalive_interval:
+                await self.warm()
+
+    async def close(self):
+        self.stop()
+        await self.client.aclose()
+
+    def stats(self) -> Dict:
+        total = self.new_connections + self.reused_connections
+        return {
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_rate": self.reused_connections / total if total else 0.0,
+            "pings": self.pings,
+            "ping_failures": self.ping_failures,
+        }
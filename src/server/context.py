@@ -0,0 +1,184 @@
+"""
+Token-budgeted conversation context.
+
+Instead of a fixed number of turns, the prompt gets as much recent history
+as fits in a token budget. Turns that no longer fit are compacted into a
+running summary in the background, after the response has been sent, so
+summarization never adds latency to a turn:
+
+    [system prompt] [summary of older turns] [newest turns that fit]
+
+Token counts come from a local estimate (about 4 characters per token),
+which is fast and close enough for budgeting.
+"""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Role/separator tokens the chat format adds to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the conversation so far:\n"
+
+# (previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count: ~4 characters per token, at least one per word."""
+    if not text:
+        return 0
+    return max(len(text) // 4 + 1, len(text.split()))
+
+
+def message_tokens(message: Dict) -> int:
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """Fits conversation history into a token budget, with a rolling summary."""
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        summary_tokens: int = 200,
+        summarize: Optional[Summarizer] = None,
+        min_recent_messages: int = 2,
+    ):
+        """
+        Args:
+            max_tokens: Prompt budget (system prompt + summary + history)
+            summary_tokens: Longest running summary to ask for
+            summarize: Coroutine producing the new summary; without one,
+                compacted turns are simply dropped
+            min_recent_messages: Newest messages never compacted
+        """
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.min_recent_messages = min_recent_messages
+        self.summary = ""
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.turns = 0
+        self.summaries = 0
+        self.prompt_tokens_total = 0
+        self.full_tokens_total = 0  # What sending every turn verbatim would have cost
+        self.recent_prompt_tokens: deque = deque(maxlen=50)
+        self._compacted_tokens = 0
+
+    def _summary_message(self) -> Optional[Dict]:
+        if not self.summary:
+            return None
+        return {"role": "system", "content": SUMMARY_PREFIX + self.summary}
+
+    def build(self, system_prompt: str, history: List[Dict], measure: bool = True) -> List[Dict]:
+        """
+        Messages for the next request: system prompt, summary, then the
+        newest turns that fit. The latest message is always included.
+        
+        measure=False leaves the metrics alone (speculative requests,
+        counted only if they are used).
+        """
+        messages = [{"role": "system", "content": system_prompt}]
+        summary = self._summary_message()
+        if summary:
+            messages.append(summary)
+        used = sum(message_tokens(m) for m in messages)
+
+        recent: List[Dict] = []
+        for message in reversed(history):
+            tokens = message_tokens(message)
+            if recent and used + tokens > self.max_tokens:
+                break
+            recent.append(message)
+            used += tokens
+        messages.extend(reversed(recent))
+
+        logger.debug(f"Prompt: {used} tokens ({len(recent)}/{len(history)} messages)")
+        if not measure:
+            return messages
+
+        # Metrics: the prompt we send vs. system prompt + every turn so far
+        full = (
+            message_tokens(messages[0]) + self._compacted_tokens
+            + sum(message_tokens(m) for m in history)
+        )
+        self.turns += 1
+        self.prompt_tokens_total += used
+        self.full_tokens_total += full
+        self.recent_prompt_tokens.append(used)
+        return messages
+
+    def _to_compact(self, system_prompt: str, history: List[Dict]) -> int:
+        """How many of the oldest messages to fold into the summary (0 = none)."""
+        # The history's share of the same total build() fills, with room for
+        # the summary to grow to summary_tokens, so build() never has to drop
+        # a turn that isn't in the summary yet
+        summary = self._summary_message()
+        summary_reserve = max(
+            message_tokens(summary) if summary else 0,
+            self.summary_tokens + estimate_tokens(SUMMARY_PREFIX) + MESSAGE_OVERHEAD_TOKENS,
+        )
+        budget = self.max_tokens - message_tokens({"content": system_prompt}) - summary_reserve
+        tokens = [message_tokens(m) for m in history]
+        if sum(tokens) <= budget:
+            return 0
+        # Compact down to half the budget so this doesn't run every turn
+        count, remaining = 0, sum(tokens)
+        while remaining > budget // 2 and len(history) - count > self.min_recent_messages:
+            remaining -= tokens[count]
+            count += 1
+        return count
+
+    def maybe_compact(self, system_prompt: str, history: List[Dict]):
+        """Start background compaction if the history outgrew the budget."""
+        if self._task and not self._task.done():
+            return
+        if self._to_compact(system_prompt, history):
+            self._task = asyncio.create_task(self.compact(system_prompt, history))
+
+    async def compact(self, system_prompt: str, history: List[Dict]):
+        """Fold the oldest messages of `history` into the summary, in place."""
+        count = self._to_compact(system_prompt, history)
+        if not count:
+            return
+        turns = history[:count]
+        summary = self.summary
+        if self.summarize:
+            try:
+                summary = (await self.summarize(self.summary, turns)).strip()
+                self.summaries += 1
+            except Exception as e:
+                logger.warning(f"Context summarization failed, dropping {count} old messages: {e}")
+
+        # The history may have been cleared while we were summarizing
+        if len(history) < count or any(a is not b for a, b in zip(history, turns)):
+            return
+        del history[:count]
+        self.summary = summary
+        self._compacted_tokens += sum(message_tokens(m) for m in turns)
+
+    def reset(self):
+        """Forget the summary (the caller clears its history)."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self.summary = ""
+        self._compacted_tokens = 0
+
+    def stats(self) -> Dict:
+        return {
+            "max_tokens": self.max_tokens,
+            "turns": self.turns,
+            "last_prompt_tokens": self.recent_prompt_tokens[-1] if self.recent_prompt_tokens else 0,
+            "mean_prompt_tokens": self.prompt_tokens_total / self.turns if self.turns else 0.0,
+            "recent_prompt_tokens": list(self.recent_prompt_tokens),
+            "prompt_tokens_total": self.prompt_tokens_total,
+            "saved_tokens_total": self.full_tokens_total - self.prompt_tokens_total,
+            "summary_tokens": estimate_tokens(self.summary),
+            "summaries": self.summaries,
+        }
@@ -0,0 +1,80 @@
+"""
+Lightweight device and compute-type probes.
+
+faster-whisper runs on CTranslate2 and never needs torch, so device
+selection asks CTranslate2 directly. torch is only consulted when it is
+already imported or when the model being loaded needs it anyway.
+"""
+
+import platform
+import sys
+from typing import Tuple
+
+from loguru import logger
+
+# Preferred compute types, best first
+CUDA_COMPUTE_TYPES = ("float16", "int8_float16", "float32")
+CPU_COMPUTE_TYPES = ("int8", "int8_float32", "float32")
+
+
+def cuda_device_count() -> int:
+    """Number of CUDA devices, without importing torch if avoidable."""
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count()
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"CTranslate2 CUDA probe failed: {e}")
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        return torch.cuda.device_count() if torch.cuda.is_available() else 0
+    return 0
+
+
+def _supported_compute_types(device: str) -> set:
+    try:
+        import ctranslate2
+        return set(ctranslate2.get_supported_compute_types(device))
+    except Exception:
+        return set()
+
+
+def pick_compute_type(device: str) -> str:
+    """Best compute type CTranslate2 supports on this device."""
+    preferred = CUDA_COMPUTE_TYPES if device == "cuda" else CPU_COMPUTE_TYPES
+    supported = _supported_compute_types(device)
+    for compute_type in preferred:
+        if not supported or compute_type in supported:
+            return compute_type
+    return "default"
+
+
+def whisper_device(device: str = "auto") -> Tuple[str, str]:
+    """
+    Resolve (device, compute_type) for faster-whisper.
+
+    CTranslate2 has no MPS backend, so "mps" and Apple Silicon run on CPU.
+    """
+    if device == "auto":
+        device = "cuda" if cuda_device_count() > 0 else "cpu"
+    elif device == "mps":
+        device = "cpu"
+    return device, pick_compute_type(device)
+
+
+def torch_device(device: str = "auto") -> str:
+    """Resolve a torch device for models that need torch anyway (Chatterbox)."""
+    if device != "auto":
+        return device
+    if cuda_device_count() > 0:
+        return "cuda"
+    if sys.platform == "darwin" and platform.machine() == "arm64":
+        try:
+            import torch
+            if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+                return "mps"
+        except ImportError:
+            pass
+    return "cpu"
@@ -0,0 +1,336 @@
+"""
+A pool of OpenAI-compatible LLM endpoints with hedging and failover.
+
+Endpoints are tried in priority order (e.g. an OpenClaw gateway, then direct
+OpenAI):
+
+- Hedging: if the first token hasn't arrived within the endpoint's usual
+  time-to-first-token (a percentile of recent requests), the same request
+  also goes to the next endpoint. Whichever stream starts first is used and
+  the other is cancelled. The slow endpoint's wait still counts as a
+  (lower bound) time-to-first-token sample, so losing doesn't make its
+  percentile look faster than it is.
+- Failover: a request that fails before its first token moves on to the
+  next endpoint straight away.
+- Circuit breaker: an endpoint that fails repeatedly is skipped until a
+  cool-down has passed, then one request is let through to test it; the
+  rest keep skipping it until that request succeeds or fails.
+
+Once a stream has produced text it is committed: a failure mid-response is
+raised rather than restarted elsewhere, since the user has already heard it.
+"""
+
+import asyncio
+import inspect
+import time
+from collections import deque
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# Never hedge sooner than this, however fast an endpoint usually is
+HEDGE_MIN_DELAY = 0.1
+
+# Time-to-first-token samples needed before the percentile is trusted
+HEDGE_MIN_SAMPLES = 10
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after N consecutive failures -> half-open after a cool-down.
+
+    Half-open lets a single trial request through. A trial that never
+    reports back (e.g. a cancelled hedge) expires after another cool-down.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_at: Optional[float] = None  # When the half-open trial was let through
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def available(self) -> bool:
+        """Whether allow() would let a request through (without claiming the trial)."""
+        state = self.state
+        if state == "half-open":
+            return self.trial_at is None or time.monotonic() - self.trial_at >= self.reset_timeout
+        return state == "closed"
+
+    def allow(self) -> bool:
+        """Let a request through? In half-open this claims the one trial."""
+        if not self.available:
+            return False
+        if self.state == "half-open":
+            self.trial_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+
+    def record_failure(self):
+        self.trial_at = None
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            # Also re-opens after a failed half-open trial
+            self.opened_at = time.monotonic()
+
+
+class Endpoint:
+    """One OpenAI-compatible API (base URL + model + key)."""
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        name: Optional[str] = None,
+        max_retries: int = 2,
+        breaker: Optional[CircuitBreaker] = None,
+        http_client=None,
+    ):
+        from openai import AsyncOpenAI
+
+        self.url = url
+        self.model = model
+        self.name = name or url
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=url if url != "https://api.openai.com/v1" else None,
+            max_retries=max_retries,
+            http_client=http_client,  # Shared, pre-warmed pool (connections.py)
+        )
+        self.breaker = breaker or CircuitBreaker()
+        self.ttft: deque = deque(maxlen=200)  # Seconds to first token
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+
+    def record_failure(self, error: BaseException):
+        self.failures += 1
+        self.breaker.record_failure()
+        logger.warning(f"LLM endpoint {self.name} failed ({self.breaker.state}): {error}")
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        if not self.ttft:
+            return None
+        samples = sorted(self.ttft)
+        return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "state": self.breaker.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "wins": self.wins,
+            "ttft_p50": self.ttft_percentile(0.5),
+            "ttft_p95": self.ttft_percentile(0.95),
+        }
+
+
+def _delta(chunk) -> str:
+    return (chunk.choices[0].delta.content or "") if chunk.choices else ""
+
+
+async def _close(stream):
+    """Close a streaming response (AsyncStream.close, or an async generator)."""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+
+class EndpointPool:
+    """Routes chat completions over several endpoints."""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        hedge_delay: float = 2.0,
+        hedge_percentile: float = 0.95,
+    ):
+        """
+        Args:
+            endpoints: In priority order
+            hedge_delay: Seconds before hedging while an endpoint has too few
+                samples for a percentile (0 disables hedging)
+            hedge_percentile: Hedge once a request is slower than this
+                fraction of the endpoint's recent time-to-first-token
+        """
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge_delay_default = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedges = 0
+        self.failovers = 0
+
+    def _candidates(self) -> List[Endpoint]:
+        available = [e for e in self.endpoints if e.breaker.available]
+        # Everything open: trying beats failing outright
+        return available or list(self.endpoints)
+
+    @staticmethod
+    def _claim(candidates: List[Endpoint]) -> Endpoint:
+        """
+        Pop the next endpoint to try. Breakers are asked only now, so a
+        half-open trial isn't used up by a request that never gets to it.
+        """
+        for i, endpoint in enumerate(candidates):
+            if endpoint.breaker.allow():
+                return candidates.pop(i)
+        return candidates.pop(0)
+
+    def hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        """Seconds to wait for endpoint's first token before hedging (None = never)."""
+        if not self.hedge_delay_default:
+            return None
+        if len(endpoint.ttft) < HEDGE_MIN_SAMPLES:
+            return self.hedge_delay_default
+        return max(HEDGE_MIN_DELAY, endpoint.ttft_percentile(self.hedge_percentile))
+
+    async def _open(self, endpoint: Endpoint, messages: List[Dict], kwargs: Dict) -> Tuple[object, object, str]:
+        """Start a stream and wait for its first text. Returns (stream, iterator, text)."""
+        start = time.monotonic()
+        stream = await endpoint.client.chat.completions.create(
+            model=endpoint.model, messages=messages, stream=True, **kwargs,
+        )
+        try:
+            iterator = stream.__aiter__()
+            first = ""
+            while not first:
+                try:
+                    first = _delta(await iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        except BaseException:
+            await _close(stream)
+            raise
+        endpoint.ttft.append(time.monotonic() - start)
+        return stream, iterator, first
+
+    async def stream(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        """Stream a chat completion from the first endpoint to start responding."""
+        candidates = self._candidates()
+        pending: Dict[asyncio.Task, Endpoint] = {}
+        started: Dict[asyncio.Task, float] = {}
+        hedged: List[asyncio.Task] = []  # Too slow: another endpoint was tried
+        deadline: Optional[float] = None
+
+        def launch() -> Endpoint:
+            nonlocal deadline
+            endpoint = self._claim(candidates)
+            endpoint.requests += 1
+            task = asyncio.create_task(self._open(endpoint, messages, kwargs))
+            started[task] = time.monotonic()
+            pending[task] = endpoint
+            delay = self.hedge_delay(endpoint)
+            deadline = time.monotonic() + delay if delay is not None else None
+            return endpoint
+
+        winner: Optional[Tuple[Endpoint, object, object, str]] = None
+        error: Optional[BaseException] = None
+        try:
+            launch()
+            while pending and winner is None:
+                timeout = None
+                if candidates and deadline is not None:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    slow_task, slow = list(pending.items())[-1]
+                    hedged.append(slow_task)
+                    self.hedges += 1
+                    hedge = launch()
+                    logger.debug(f"No first token from {slow.name} yet, hedging to {hedge.name}")
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        endpoint.record_failure(error)
+                    elif winner is None:
+                        winner = (endpoint, *task.result())
+                    else:
+                        await _close(task.result()[0])  # Tie: keep the first
+
+                if winner is None and candidates and len(pending) == 0:
+                    self.failovers += 1
+                    launch()
+        finally:
+            # Cancel the losers
+            for task, endpoint in pending.items():
+                task.cancel()
+                if winner is not None and task in hedged:
+                    # Slower than this at least: keeps hedge_delay from drifting low
+                    endpoint.ttft.append(time.monotonic() - started[task])
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            raise error or RuntimeError("No LLM endpoint available")
+
+        endpoint, stream, iterator, first = winner
+        endpoint.wins += 1
+        try:
+            if first:
+                yield first
+            async for chunk in iterator:
+                text = _delta(chunk)
+                if text:
+                    yield text
+        except GeneratorExit:
+            # The consumer stopped early (e.g. the speech budget), not a failure
+            endpoint.breaker.record_success()
+            raise
+        except Exception as e:
+            endpoint.record_failure(e)
+            raise
+        finally:
+            await _close(stream)
+        endpoint.breaker.record_success()
+
+    async def complete(self, messages: List[Dict], **kwargs) -> str:
+        """Non-streaming chat completion, failing over in priority order."""
+        error: Optional[BaseException] = None
+        candidates = self._candidates()
+        for i in range(len(candidates)):
+            endpoint = self._claim(candidates)
+            if i:
+                self.failovers += 1
+            endpoint.requests += 1
+            try:
+                response = await endpoint.client.chat.completions.create(
+                    model=endpoint.model, messages=messages, **kwargs,
+                )
+            except Exception as e:
+                endpoint.record_failure(e)
+                error = e
+                continue
+            endpoint.breaker.record_success()
+            endpoint.wins += 1
+            return response.choices[0].message.content or ""
+        raise error or RuntimeError("No LLM endpoint available")
+
+    def stats(self) -> Dict:
+        return {
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
@@ -0,0 +1,249 @@
+"""
+API key storage backends.
+
+TokenManager keeps validated keys in an in-process cache, and a KeyStore is
+where they actually live:
+
+- MemoryKeyStore: a dict per process (the default; keys are gone on restart)
+- SQLiteKeyStore: an embedded SQLite file in WAL mode, shared by every
+  worker on the host, so keys survive restarts and a revocation in one
+  worker reaches the others when their cache entries expire
+
+Stores only ever see key hashes, never plaintext keys.
+
+Stores also hold the rate limit token buckets. A key's bucket holds up to
+`capacity` tokens and refills continuously at `per_second`; each request
+takes one.
+
+In SQLite the bucket is one shared row, and each worker leases tokens
+from it in batches (`lease_fraction` of the capacity) in a short write
+transaction, then admits requests from its lease in memory. Tokens are
+only ever spent once they have been taken from the shared row, so all
+workers together never exceed the limit. A lease that can't be had within
+`lease_timeout` (another writer holds the database) refuses the request
+rather than stalling the event loop. Leased tokens don't refill, so a
+worker going quiet holds back at most one lease per key until refill
+covers it.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from .auth import APIKey
+
+
+def refill(tokens: float, updated: float, now: float, capacity: float, per_second: float) -> float:
+    """Tokens in a bucket at `now`, given its level at `updated`."""
+    return min(capacity, tokens + max(0.0, now - updated) * per_second)
+
+
+class KeyStore:
+    """Interface for API key storage."""
+
+    def put(self, api_key: APIKey):
+        raise NotImplementedError
+
+    def get_by_hash(self, key_hash: str) -> Optional[APIKey]:
+        raise NotImplementedError
+
+    def revoke(self, key_id: str) -> bool:
+        raise NotImplementedError
+
+    def add_usage(self, key_id: str, minutes: float):
+        raise NotImplementedError
+
+    def take_tokens(self, key_id: str, capacity: float, per_second: float, cost: float = 1.0) -> bool:
+        """Take `cost` tokens from the key's bucket; False if it has too few."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryKeyStore(KeyStore):
+    """Keys in process memory."""
+
+    def __init__(self):
+        self._keys: Dict[str, APIKey] = {}
+        self._key_to_id: Dict[str, str] = {}  # hash -> key_id lookup
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key_id -> (tokens, updated)
+
+    def put(self, api_key: APIKey):
+        self._keys[api_key.key_id] = api_key
+        self._key_to_id[api_key.key_hash] = api_key.key_id
+
+    def get_by_hash(self, key_hash: str) -> Optional[APIKey]:
+        key_id = self._key_to_id.get(key_hash)
+        return self._keys.get(key_id) if key_id else None
+
+    def revoke(self, key_id: str) -> bool:
+        if key_id in self._keys:
+            self._keys[key_id].active = False
+            return True
+        return False
+
+    def add_usage(self, key_id: str, minutes: float):
+        pass  # The cached APIKey is this store's object, already updated
+
+    def take_tokens(self, key_id: str, capacity: float, per_second: float, cost: float = 1.0) -> bool:
+        now = time.time()
+        tokens, updated = self._buckets.get(key_id, (capacity, now))
+        tokens = refill(tokens, updated, now, capacity, per_second)
+        allowed = tokens >= cost
+        self._buckets[key_id] = (tokens - cost if allowed else tokens, now)
+        return allowed
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_keys (
+    key_id TEXT PRIMARY KEY,
+    key_hash TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    rate_limit_per_minute INTEGER NOT NULL,
+    monthly_minutes INTEGER,
+    minutes_used REAL NOT NULL DEFAULT 0,
+    features TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    tier TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class SQLiteKeyStore(KeyStore):
+    """Keys in a SQLite file (WAL mode, safe to share between workers)."""
+
+    def __init__(self, path: str, lease_fraction: float = 0.1, lease_timeout: float = 0.05):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lease_fraction = lease_fraction
+        self._lock = threading.Lock()
+        # Used from the event loop and executor threads, serialized by the lock
+        self._db = self._connect()
+        self._db.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        # Rate limit tokens leased from the shared buckets: key_id -> tokens
+        self._leases: Dict[str, float] = {}
+        self._rates: Dict[str, Tuple[float, float]] = {}  # key_id -> (capacity, per_second)
+        self._lease_lock = threading.Lock()
+        # Separate connection, so a busy database fails fast on the request path
+        self._lease_db = self._connect(timeout=lease_timeout)
+        logger.info(f"🔑 API key store: {path}")
+
+    def _connect(self, timeout: float = 5.0) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=timeout)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def put(self, api_key: APIKey):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO api_keys VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    api_key.key_id,
+                    api_key.key_hash,
+                    api_key.name,
+                    api_key.created_at.isoformat(),
+                    api_key.rate_limit_per_minute,
+                    api_key.monthly_minutes,
+                    api_key.minutes_used,
+                    json.dumps(api_key.features),
+                    int(api_key.active),
+                    api_key.tier,
+                ),
+            )
+
+    def get_by_hash(self, key_hash: str) -> Optional[APIKey]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM api_keys WHERE key_hash = ?", (key_hash,)).fetchone()
+        if row is None:
+            return None
+        return APIKey(
+            key_id=row["key_id"],
+            key_hash=row["key_hash"],
+            name=row["name"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            rate_limit_per_minute=row["rate_limit_per_minute"],
+            monthly_minutes=row["monthly_minutes"],
+            minutes_used=row["minutes_used"],
+            features=json.loads(row["features"]),
+            active=bool(row["active"]),
+            tier=row["tier"],
+        )
+
+    def revoke(self, key_id: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute("UPDATE api_keys SET active = 0 WHERE key_id = ?", (key_id,))
+        return cursor.rowcount > 0
+
+    def add_usage(self, key_id: str, minutes: float):
+        # Incremented in SQL, so concurrent workers don't overwrite each other
+        with self._lock:
+            self._db.execute(
+                "UPDATE api_keys SET minutes_used = minutes_used + ? WHERE key_id = ?", (minutes, key_id),
+            )
+
+    def take_tokens(self, key_id: str, capacity: float, per_second: float, cost: float = 1.0) -> bool:
+        with self._lease_lock:
+            held = self._leases.get(key_id, 0.0)
+            if held < cost:
+                # Out of leased tokens: take another batch from the shared bucket
+                try:
+                    held += self._lease(key_id, capacity, per_second, max(cost - held, capacity * self.lease_fraction))
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"Rate limit lease for {key_id} failed, refusing: {e}")
+            allowed = held >= cost
+            self._leases[key_id] = held - cost if allowed else held
+            self._rates[key_id] = (capacity, per_second)
+        return allowed
+
+    def _lease(self, key_id: str, capacity: float, per_second: float, want: float) -> float:
+        """Move up to `want` tokens from the shared bucket to this process."""
+        return -self._adjust(key_id, capacity, per_second, -want)
+
+    def _adjust(self, key_id: str, capacity: float, per_second: float, delta: float) -> float:
+        """Add `delta` tokens to the shared bucket (negative: take, as far as there are any)."""
+        db = self._lease_db
+        # BEGIN IMMEDIATE takes the write lock up front, so the read and
+        # the update are atomic across processes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = db.execute("SELECT tokens, updated FROM rate_buckets WHERE key_id = ?", (key_id,)).fetchone()
+            tokens = refill(row["tokens"], row["updated"], now, capacity, per_second) if row else capacity
+            delta = max(delta, -tokens)
+            db.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (key_id, min(capacity, tokens + delta), now))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return delta
+
+    def close(self):
+        # Hand unspent leases back for the other workers
+        with self._lease_lock:
+            for key_id, held in self._leases.items():
+                if held > 0:
+                    try:
+                        self._adjust(key_id, *self._rates[key_id], held)
+                    except sqlite3.OperationalError as e:
+                        logger.warning(f"Could not return leased rate limit tokens: {e}")
+            self._leases.clear()
+            self._lease_db.close()
+        with self._lock:
+            self._db.close()
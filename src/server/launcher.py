@@ -0,0 +1,176 @@
+"""
+Production launcher: preload models once, then fork workers.
+
+    python -m src.server.launcher --workers 4
+
+The master process loads WhisperSTT, ChatterboxTTS and the VAD model, binds
+the listening socket and forks uvicorn workers (uvloop + httptools when
+available). Model weights stay shared copy-on-write between workers instead
+of being loaded N times.
+
+Intended for CPU inference: CUDA contexts do not survive fork(), so GPU
+deployments should use model workers (OPENCLAW_STT_WORKERS) instead.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+from loguru import logger
+
+from . import main as server
+from .profiling import format_mb, memory_breakdown, rss_bytes
+
+
+def _pick(module: str, fallback: str = "auto") -> str:
+    try:
+        __import__(module)
+        return module
+    except ImportError:
+        return fallback
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Bind the shared listening socket in the master."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, launch_started: float):
+    """Child process: serve the preloaded app on the inherited socket."""
+    import uvicorn
+
+    async def report_ready():
+        logger.info(
+            f"Worker {os.getpid()} ready {time.monotonic() - launch_started:.1f}s after launch "
+            f"(rss={format_mb(rss_bytes())})"
+        )
+
+    server.app.router.on_startup.append(report_ready)
+
+    config = uvicorn.Config(
+        server.app,
+        loop=_pick("uvloop"),
+        http=_pick("httptools"),
+        lifespan="on",
+        log_level="info",
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork_worker(sock: socket.socket, launch_started: float) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Default signal handling in the child; uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            _run_worker(sock, launch_started)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def report_memory(workers: Dict[int, float]):
+    """Log per-worker memory, including how much is shared with the master."""
+    total_pss = 0
+    for pid in sorted(workers):
+        mem = memory_breakdown(pid)
+        total_pss += mem["pss"] or 0
+        logger.info(
+            f"Worker {pid}: rss={format_mb(mem['rss'])} pss={format_mb(mem['pss'])} "
+            f"shared={format_mb(mem['shared'])} private={format_mb(mem['private'])}"
+        )
+    master = memory_breakdown()
+    total_pss += master["pss"] or 0
+    logger.info(
+        f"Master {os.getpid()}: rss={format_mb(master['rss'])} pss={format_mb(master['pss'])}; "
+        f"total pss={format_mb(total_pss or None)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preload models and fork server workers")
+    parser.add_argument("--workers", type=int, default=server.settings.workers)
+    parser.add_argument("--host", default=server.settings.host)
+    parser.add_argument("--port", type=int, default=server.settings.port)
+    parser.add_argument(
+        "--report-after", type=float, default=30.0,
+        help="Seconds after fork to log per-worker memory (0 = never)",
+    )
+    args = parser.parse_args()
+
+    launch_started = time.monotonic()
+    logger.info(f"Preloading models in master (pid={os.getpid()})...")
+    server.load_models()
+    load_seconds = time.monotonic() - launch_started
+    logger.info(f"Models loaded in {load_seconds:.1f}s (master rss={format_mb(rss_bytes())})")
+
+    if server.settings.stt_device == "cuda" or getattr(server.stt, "device", None) == "cuda":
+        logger.warning("STT runs on CUDA; forked workers cannot share a CUDA context")
+
+    # Move everything allocated so far out of the GC's reach so collections
+    # in the workers don't touch (and un-share) the preloaded objects
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} worker(s)")
+
+    workers: Dict[int, float] = {}
+    for _ in range(args.workers):
+        workers[_fork_worker(sock, launch_started)] = time.monotonic()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    report_at = time.monotonic() + args.report_after if args.report_after > 0 else None
+
+    while workers:
+        if report_at and time.monotonic() >= report_at:
+            report_memory(workers)
+            report_at = None
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+
+        workers.pop(pid, None)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited (status={status}), restarting")
+            workers[_fork_worker(sock, launch_started)] = time.monotonic()
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Concurrent, lazy and readiness-tracked component loading.
+
+Each component (STT, TTS, VAD, backend) is built by a factory that runs in
+its own thread, so cold start costs roughly the slowest load instead of the
+sum of all of them. Lazy components load on first use instead of at startup.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from loguru import logger
+
+
+@dataclass
+class Component:
+    """A loadable server component and its load state."""
+    name: str
+    factory: Callable[[], Any]
+    lazy: bool = False
+    on_ready: Optional[Callable[[Any], None]] = None
+
+    state: str = "pending"  # pending, loading, ready, failed
+    instance: Any = None
+    error: Optional[str] = None
+    load_seconds: Optional[float] = None
+    future: Future = field(default_factory=Future)
+
+
+class ModelLoader:
+    """Load components in background threads and report their readiness."""
+
+    def __init__(self):
+        self._components: Dict[str, Component] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        lazy: bool = False,
+        on_ready: Optional[Callable[[Any], None]] = None,
+    ):
+        """Register (or replace) a component. Nothing is loaded yet."""
+        with self._lock:
+            self._components[name] = Component(name, factory, lazy=lazy, on_ready=on_ready)
+
+    def start(self):
+        """Start loading every eager component concurrently."""
+        for component in list(self._components.values()):
+            if not component.lazy:
+                self.ensure(component.name)
+
+    def ensure(self, name: str) -> Future:
+        """Start loading a component if nobody has yet. Returns its future."""
+        with self._lock:
+            component = self._components[name]
+            if component.state == "pending":
+                component.state = "loading"
+                threading.Thread(
+                    target=self._load, args=(component,), name=f"load-{name}", daemon=True,
+                ).start()
+        return component.future
+
+    def _load(self, component: Component):
+        component.future.set_running_or_notify_cancel()  # Waiters can't cancel a load
+        started = time.monotonic()
+        try:
+            instance = component.factory()
+            if component.on_ready:
+                component.on_ready(instance)
+        except Exception as e:
+            component.load_seconds = time.monotonic() - started
+            component.error = str(e)
+            component.state = "failed"
+            logger.error(f"❌ Failed to load {component.name}: {e}")
+            component.future.set_exception(e)
+            return
+
+        component.load_seconds = time.monotonic() - started
+        component.instance = instance
+        component.state = "ready"
+        logger.info(f"✅ {component.name} loaded in {component.load_seconds:.1f}s")
+        component.future.set_result(instance)
+
+    def wait_sync(self, names: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> bool:
+        """Block until the given components (default: all eager ones) finish loading."""
+        names = list(names) if names is not None else self._eager_names()
+        futures = [self.ensure(name) for name in names]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in futures:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                return False
+        return True
+
+    async def wait(self, names: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the given components are ready, loading lazy ones on demand.
+
+        Returns False on timeout or if any of them failed to load.
+        """
+        futures = [asyncio.wrap_future(self.ensure(name)) for name in names]
+        if not futures:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.gather(*futures)), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except Exception:
+            return False
+
+    def get(self, name: str) -> Any:
+        component = self._components.get(name)
+        return component.instance if component else None
+
+    def is_ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        """True when the given components (default: all eager ones) are ready."""
+        names = list(names) if names is not None else self._eager_names()
+        return all(
+            name in self._components and self._components[name].state == "ready"
+            for name in names
+        )
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Load state of every component, for the /ready endpoint."""
+        return {
+            name: {
+                "state": c.state,
+                "lazy": c.lazy,
+                "load_seconds": round(c.load_seconds, 3) if c.load_seconds is not None else None,
+                "error": c.error,
+            }
+            for name, c in self._components.items()
+        }
+
+    def _eager_names(self):
+        return [name for name, c in self._components.items() if not c.lazy]
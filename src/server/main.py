@@ -13,22 +13,40 @@ import asyncio
 import base64
 import json
 import os
+import tempfile
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
 
 import numpy as np
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from loguru import logger
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
+from starlette.formparsers import MultiPartException, MultiPartParser
 
-from .stt import WhisperSTT
+from .stt import WhisperSTT, resolve_profile
 from .tts import ChatterboxTTS
 from .backend import AIBackend
+from .budget import SpeechBudget
+from .cache import ResponseCache
+from .speculation import Speculation, Speculator, speculation_stats
 from .vad import VoiceActivityDetector
+from .workers import ModelWorkerPool, RemoteSTT, RemoteTTS
+from .loader import ModelLoader
+from .warmup import KeepWarm, warmed
+from .profiling import format_mb, startup_profile
+from .bundle import ModelBundle
+from .audio import (
+    AUDIO_FORMATS, AudioInput, AudioOutput, Resampler, decode_audio, encode_audio, wav_header,
+)
 from .auth import token_manager, load_keys_from_env, APIKey
+from .keystore import SQLiteKeyStore
 from .text_utils import clean_for_speech
+from .transport import SessionSender, transport_stats
 
 
 class Settings(BaseSettings):
@@ -37,24 +55,83 @@ class Settings(BaseSettings):
     # Server
     host: str = "0.0.0.0"
     port: int = 8765
+    workers: int = 1  # Forked workers when run via src.server.launcher
     
     # Auth
     require_auth: bool = False  # Set True for production
     master_key: Optional[str] = None  # Admin key for full access
+    api_key_db: Optional[str] = None  # SQLite file for API keys, shared by workers (None = in memory)
+    api_key_cache_ttl: float = 5.0  # Seconds before a cached key is re-read (revocation delay)
     
     # STT
     stt_model: str = "base"  # tiny, base, small, medium, large-v3-turbo
     stt_device: str = "auto"  # auto, cpu, cuda, mps
+    stt_models: str = ""  # Extra sizes to route to, e.g. "tiny" (smallest = fast path)
+    stt_short_utterance_seconds: float = 2.0  # Shorter utterances use the fast model
+    stt_busy_queue_depth: int = 2  # Pending transcriptions before degrading to fast model
+    stt_memory_budget_mb: int = 0  # Evict idle extra models beyond this (0 = unlimited)
+    stt_profile: str = "accuracy"  # latency, balanced, accuracy (scripts/benchmark_stt.py)
+    stt_beam_size: Optional[int] = None  # Profile overrides
+    stt_cpu_threads: Optional[int] = None
+    stt_num_workers: Optional[int] = None
+    stt_compute_type: Optional[str] = None
     
     # TTS
     tts_model: str = "chatterbox"
     tts_voice: Optional[str] = None  # Path to voice sample for cloning
+    tts_auto_install: bool = False  # pip install the ElevenLabs SDK if missing
+    tts_phrase_cache_size: int = 256  # Short phrases kept synthesized (0 = off)
+    tts_max_chars: int = 20000  # Per /api/tts request
+    
+    # Startup
+    model_bundle: Optional[str] = None  # Offline bundle dir (scripts/bundle_models.py)
+    lazy_load: str = ""  # Components to load on first use, e.g. "tts,vad"
+    session_ready_timeout: float = 30.0  # Seconds a new session waits for models
+    warmup: bool = True  # Run dummy inputs through each model before ready
+    keep_warm_interval: float = 0.0  # Re-warm after this many idle seconds (0 = off)
+    
+    # Model workers (0 = load models inside each server process)
+    stt_workers: int = 0
+    tts_workers: int = 0
+    model_worker_dir: Optional[str] = None  # Unix socket directory
+    model_worker_authkey: Optional[str] = None  # None = random key kept in model_worker_dir
+    
+    # VAD
+    vad_engine: str = "auto"  # auto, silero-onnx, silero-torch, energy
+    vad_model_path: Optional[str] = None  # Defaults to models/silero_vad.onnx
     
     # AI Backend
     backend_type: str = "openai"  # openai, openclaw, custom
     backend_url: str = "https://api.openai.com/v1"
     backend_model: str = "gpt-4o-mini"
     openai_api_key: Optional[str] = None
+    backend_endpoints: str = ""  # JSON list of fallback {"url", "model", "api_key", "name"}
+    backend_hedge_delay: float = 2.0  # Seconds to first token before hedging (0 = off)
+    backend_hedge_percentile: float = 0.95  # ...or this percentile of recent ones
+    backend_breaker_failures: int = 3  # Consecutive failures before skipping an endpoint
+    backend_breaker_reset: float = 30.0  # Seconds before retrying a skipped endpoint
+    backend_max_connections: int = 20  # Shared HTTP pool across all LLM endpoints
+    backend_keepalive_connections: int = 10  # Idle connections the pool keeps
+    backend_warm_connections: int = 2  # Opened per endpoint at startup
+    backend_keepalive_interval: float = 30.0  # Ping idle endpoints this often (0 = off)
+    context_max_tokens: int = 2000  # Prompt budget; older turns are summarized
+    context_summary_tokens: int = 200  # Longest running summary
+    speech_max_seconds: float = 30.0  # Spoken-length budget per response (0 = off)
+    speech_wpm: int = 150  # Speaking rate for the budget
+    response_cache_size: int = 0  # Cached responses to repeated utterances (0 = off)
+    response_cache_ttl: float = 300.0  # Seconds a cached response stays valid
+    response_cache_routes: str = "/ws,/voice/ws"  # WebSocket routes that use the cache
+    speculative_llm: bool = False  # Start the LLM on a stable partial transcript
+    speculative_interval: float = 0.5  # Seconds of audio between partial transcripts
+    speculative_stable_seconds: float = 0.5  # Partial unchanged this long -> speculate
+    speculative_max_seconds: float = 8.0  # No partial transcripts past this much audio
+    
+    # WebSocket sends
+    ws_coalesce_ms: float = 40.0  # Batch response_chunk tokens this long (0 = off)
+    ws_coalesce_bytes: int = 512  # ...or until this much text is buffered
+    ws_max_buffered_kb: int = 1024  # Unsent data per session before the overflow policy
+    ws_overflow: str = "pause"  # drop (stale audio), pause (synthesis), disconnect
+    ws_stall_timeout: float = 10.0  # Paused sends give up on a client after this long
     
     # OpenClaw Gateway (auto-detected from OPENCLAW_GATEWAY_URL + TOKEN)
     openclaw_gateway_url: Optional[str] = None
@@ -62,6 +139,12 @@ class Settings(BaseSettings):
     
     # Audio
     sample_rate: int = 16000
+    opus_bitrate: int = 24000  # Downlink bits/s when a client negotiates opus
+    opus_frame_ms: int = 20  # 10, 20, 40 or 60; also the most latency Opus adds
+    
+    # Batch transcription (/api/transcribe)
+    transcribe_max_upload_mb: int = 500  # Per request; uploads are spooled to disk
+    transcribe_batch_size: int = 8  # Segments decoded together per clip
     
     class Config:
         env_prefix = "OPENCLAW_"
@@ -76,36 +159,159 @@ stt: Optional[WhisperSTT] = None
 tts: Optional[ChatterboxTTS] = None
 backend: Optional[AIBackend] = None
 vad: Optional[VoiceActivityDetector] = None
+loader = ModelLoader()
+keep_warm = KeepWarm(loader, ("stt", "tts", "vad"), settings.keep_warm_interval)
 
+# Components a voice session cannot run without
+SESSION_COMPONENTS = ("stt", "tts", "vad", "backend")
 
-@app.on_event("startup")
-async def startup():
-    """Initialize models on server start."""
-    global stt, tts, backend, vad
-    
-    logger.info("Initializing OpenClaw Voice server...")
-    
-    # Load API keys
-    load_keys_from_env()
-    if settings.require_auth:
-        logger.info("🔐 Authentication ENABLED")
-    else:
-        logger.warning("⚠️ Authentication DISABLED (dev mode)")
+# Session messages that cost a rate limit token: one per turn (start_listening)
+# plus reconfiguration. stop_listening is never refused, or a throttled
+# session would keep listening and buffering audio.
+METERED_MESSAGES = ("start_listening", "config")
+
+
+@lru_cache(maxsize=1)
+def model_bundle() -> Optional[ModelBundle]:
+    """The configured offline model bundle, checked once (sizes, not checksums)."""
+    if not settings.model_bundle:
+        return None
+    bundle = ModelBundle(settings.model_bundle)
+    problems = bundle.verify(checksums=False)
+    if problems:
+        raise RuntimeError(f"Model bundle {bundle.path} is incomplete: {'; '.join(problems)}")
+    bundle.go_offline()
+    logger.info(f"📦 Using model bundle {bundle.version} (offline)")
+    return bundle
+
+
+def model_kwargs(kind: str) -> dict:
+    """Constructor arguments for the STT or TTS model, in-process or in a worker."""
+    bundle = model_bundle()
+    if kind == "stt":
+        models = [m.strip() for m in settings.stt_models.split(",") if m.strip()]
+        kwargs = {
+            "model_name": settings.stt_model,
+            "device": settings.stt_device,
+            "models": models,
+            "short_utterance_seconds": settings.stt_short_utterance_seconds,
+            "busy_queue_depth": settings.stt_busy_queue_depth,
+            "memory_budget_mb": settings.stt_memory_budget_mb,
+            "profile": resolve_profile(
+                settings.stt_profile,
+                beam_size=settings.stt_beam_size,
+                cpu_threads=settings.stt_cpu_threads,
+                num_workers=settings.stt_num_workers,
+                compute_type=settings.stt_compute_type,
+            ),
+        }
+        if bundle:
+            paths = {name: bundle.whisper_path(name) for name in [settings.stt_model] + models}
+            kwargs["model_paths"] = {name: path for name, path in paths.items() if path}
+        return kwargs
     
-    # Initialize STT
-    logger.info(f"Loading STT model: {settings.stt_model}")
-    stt = WhisperSTT(
-        model_name=settings.stt_model,
-        device=settings.stt_device,
+    kwargs = {
+        "voice_sample": settings.tts_voice,
+        "auto_install": settings.tts_auto_install,
+        "phrase_cache_size": settings.tts_phrase_cache_size,
+    }
+    if bundle:
+        kwargs["model_dirs"] = {
+            name.split("/", 1)[1]: bundle.component_path(name)
+            for name in bundle.components if name.startswith("tts/")
+        }
+    return kwargs
+
+
+def _worker_pool(kind: str, count: int) -> ModelWorkerPool:
+    authkey = settings.model_worker_authkey.encode() if settings.model_worker_authkey else None
+    return ModelWorkerPool.connect_or_spawn(
+        kind,
+        count,
+        worker_dir=settings.model_worker_dir,
+        model_kwargs=model_kwargs(kind),
+        authkey=authkey,
+        warmup=settings.warmup,
     )
-    
-    # Initialize TTS
+
+
+def create_stt():
+    """Build the STT component (local model or model worker proxy)."""
+    if settings.stt_workers > 0:
+        logger.info(f"Using {settings.stt_workers} STT worker process(es)")
+        return RemoteSTT(_worker_pool("stt", settings.stt_workers))
+    logger.info(f"Loading STT model: {settings.stt_model} ({settings.stt_profile} profile)")
+    return WhisperSTT(**model_kwargs("stt"))
+
+
+def create_tts():
+    """Build the TTS component (local model or model worker proxy)."""
+    if settings.tts_workers > 0:
+        logger.info(f"Using {settings.tts_workers} TTS worker process(es)")
+        return RemoteTTS(_worker_pool("tts", settings.tts_workers))
     logger.info(f"Loading TTS model: {settings.tts_model}")
-    tts = ChatterboxTTS(
-        voice_sample=settings.tts_voice,
+    return ChatterboxTTS(**model_kwargs("tts"))
+
+
+def create_vad():
+    """Build the VAD component."""
+    logger.info(f"Loading VAD model ({settings.vad_engine})")
+    bundle = model_bundle()
+    engine = settings.vad_engine
+    if bundle and engine == "silero-torch":
+        # torch.hub downloads at load time, which a bundle is there to avoid
+        logger.warning("silero-torch VAD can't load from a model bundle, using the bundled ONNX model or energy VAD")
+        engine = "silero-onnx"
+    return VoiceActivityDetector(
+        engine=engine,
+        model_path=settings.vad_model_path or (bundle.vad_path() if bundle else None),
     )
+
+
+def _publish(name: str):
+    """Expose a loaded component through the module global of the same name."""
+    def on_ready(instance):
+        globals()[name] = instance
+    return on_ready
+
+
+def register_models():
+    """Register the model components with the loader (nothing loads yet)."""
+    lazy = {name.strip() for name in settings.lazy_load.split(",") if name.strip()}
+    for name, factory in (("stt", create_stt), ("tts", create_tts), ("vad", create_vad)):
+        if settings.warmup:
+            factory = warmed(name, factory)
+        loader.register(name, factory, lazy=name in lazy, on_ready=_publish(name))
+
+
+def load_models():
+    """
+    Load STT, TTS and VAD concurrently and wait for all of them.
+    
+    Used by `src.server.launcher` to preload in the master before forking.
+    """
+    register_models()
+    loader.wait_sync(["stt", "tts", "vad"])
+
+
+def create_backend() -> AIBackend:
+    """Create the AI backend (per process, never shared across a fork)."""
+    response_cache = None
+    if settings.response_cache_size:
+        response_cache = ResponseCache(settings.response_cache_size, settings.response_cache_ttl)
+    backend_options = {
+        "endpoints": json.loads(settings.backend_endpoints) if settings.backend_endpoints else None,
+        "hedge_delay": settings.backend_hedge_delay,
+        "hedge_percentile": settings.backend_hedge_percentile,
+        "breaker_failures": settings.backend_breaker_failures,
+        "breaker_reset": settings.backend_breaker_reset,
+        "max_connections": settings.backend_max_connections,
+        "keepalive_connections": settings.backend_keepalive_connections,
+        "warm_connections": settings.backend_warm_connections,
+        "keepalive_interval": settings.backend_keepalive_interval,
+        "speech_budget": SpeechBudget(settings.speech_max_seconds, settings.speech_wpm),
+    }
     
-    # Initialize AI backend
     # Auto-detect OpenClaw gateway
     gateway_url = settings.openclaw_gateway_url or os.getenv("OPENCLAW_GATEWAY_URL")
     gateway_token = settings.openclaw_gateway_token or os.getenv("OPENCLAW_GATEWAY_TOKEN")
@@ -113,11 +319,15 @@ async def startup():
     if gateway_url and gateway_token:
         # Use OpenClaw gateway (connects to Aria!)
         logger.info(f"🦞 Connecting to OpenClaw gateway: {gateway_url}")
-        backend = AIBackend(
+        return AIBackend(
             backend_type="openai",  # Gateway speaks OpenAI API
             url=f"{gateway_url}/v1",
             model="openclaw:voice",  # Maps to 'voice' agent in config
             api_key=gateway_token,
+            context_tokens=settings.context_max_tokens,
+            summary_tokens=settings.context_summary_tokens,
+            response_cache=response_cache,
+            **backend_options,
             system_prompt=(
                 "You are Jane, Marco's AI assistant. Before responding, internalize this context:\n\n"
                 "## Who You Are\n"
@@ -143,18 +353,59 @@ async def startup():
     else:
         # Fallback to direct OpenAI
         logger.info(f"Connecting to backend: {settings.backend_type}")
-        backend = AIBackend(
+        return AIBackend(
             backend_type=settings.backend_type,
             url=settings.backend_url,
             model=settings.backend_model,
             api_key=settings.openai_api_key or os.getenv("OPENAI_API_KEY"),
+            context_tokens=settings.context_max_tokens,
+            summary_tokens=settings.context_summary_tokens,
+            response_cache=response_cache,
+            **backend_options,
         )
+
+
+@app.on_event("startup")
+async def startup():
+    """Initialize models on server start."""
+    logger.info("Initializing OpenClaw Voice server...")
     
-    # Initialize VAD
-    logger.info("Loading VAD model")
-    vad = VoiceActivityDetector()
+    # Load API keys
+    if settings.api_key_db:
+        token_manager.configure(SQLiteKeyStore(settings.api_key_db), settings.api_key_cache_ttl)
+    load_keys_from_env()
+    if settings.require_auth:
+        logger.info("🔐 Authentication ENABLED")
+    else:
+        logger.warning("⚠️ Authentication DISABLED (dev mode)")
     
-    logger.info("✅ OpenClaw Voice server ready!")
+    # Models may already be loaded by the preload-and-fork launcher;
+    # otherwise load them in the background and gate sessions on /ready
+    if stt is None:
+        register_models()
+    loader.register("backend", create_backend, on_ready=_publish("backend"))
+    loader.start()
+    keep_warm.start()
+    asyncio.create_task(_log_when_ready())
+    asyncio.create_task(_warm_connections())
+
+
+async def _warm_connections():
+    """Open LLM connections before the first turn needs them, then keep them alive."""
+    if await loader.wait(["backend"]) and backend.connections:
+        backend.connections.start()
+
+
+async def _log_when_ready():
+    """Log readiness plus what startup cost (RSS, heavy imports like torch)."""
+    if not loader.is_ready():
+        logger.info("Loading components in the background (see /ready)")
+    await loader.wait([name for name, c in loader.status().items() if not c["lazy"]])
+    profile = startup_profile()
+    logger.info(
+        f"✅ OpenClaw Voice server ready! (rss={format_mb(profile['rss_bytes'])}, "
+        f"heavy imports: {', '.join(profile['heavy_modules']) or 'none'})"
+    )
 
 
 @app.get("/")
@@ -165,19 +416,36 @@ async def index():
     return FileResponse("src/client/index.html")
 
 
-@app.post("/api/keys")
-async def create_api_key(
-    name: str,
-    tier: str = "free",
-    master_key: Optional[str] = None,
-):
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once every eager component is loaded, else 503."""
+    is_ready = loader.is_ready()
+    return JSONResponse(
+        {"ready": is_ready, "components": loader.status(), "profile": startup_profile()},
+        status_code=200 if is_ready else 503,
+    )
+
+
+@app.get("/api/metrics")
+async def metrics():
     """
-    Create a new API key (requires master key).
+    Prompt token counts per turn and what the context budget saves.
     
-    curl -X POST "http://localhost:8765/api/keys?name=myapp&tier=pro" \
-         -H "x-master-key: YOUR_MASTER_KEY"
+    curl http://localhost:8765/api/metrics
     """
-    # Verify master key
+    return {
+        "context": backend.context.stats() if backend else None,
+        "response_cache": backend.response_cache.stats() if backend and backend.response_cache else None,
+        "endpoints": backend.pool.stats() if backend and backend.pool else None,
+        "speculation": speculation_stats.stats(),
+        "connections": backend.connections.stats() if backend and backend.connections else None,
+        "speech_budget": backend.speech_budget.stats() if backend else None,
+        "transport": transport_stats.stats(),
+    }
+
+
+def _check_master_key(master_key: Optional[str]) -> Optional[Dict]:
+    """Error response unless the master key (or an enterprise key) is given."""
     if settings.require_auth:
         if not master_key and not settings.master_key:
             return {"error": "Master key required"}
@@ -188,6 +456,24 @@ async def create_api_key(
             key = token_manager.validate_key(provided_key)
             if not key or key.tier != "enterprise":
                 return {"error": "Invalid master key"}
+    return None
+
+
+@app.post("/api/keys")
+async def create_api_key(
+    name: str,
+    tier: str = "free",
+    master_key: Optional[str] = None,
+):
+    """
+    Create a new API key (requires master key).
+    
+    curl -X POST "http://localhost:8765/api/keys?name=myapp&tier=pro" \
+         -H "x-master-key: YOUR_MASTER_KEY"
+    """
+    error = _check_master_key(master_key)
+    if error:
+        return error
     
     from .auth import PRICING_TIERS
     
@@ -213,6 +499,22 @@ async def create_api_key(
     }
 
 
+@app.delete("/api/keys/{key_id}")
+async def revoke_api_key(key_id: str, master_key: Optional[str] = None):
+    """
+    Revoke an API key (requires master key). Other workers stop accepting
+    it within OPENCLAW_API_KEY_CACHE_TTL seconds.
+    
+    curl -X DELETE "http://localhost:8765/api/keys/KEY_ID?master_key=YOUR_MASTER_KEY"
+    """
+    error = _check_master_key(master_key)
+    if error:
+        return error
+    if not token_manager.revoke_key(key_id):
+        return {"error": "Unknown key"}
+    return {"key_id": key_id, "revoked": True}
+
+
 @app.get("/api/usage")
 async def get_usage(api_key: str):
     """
@@ -227,6 +529,286 @@ async def get_usage(api_key: str):
     return token_manager.get_usage(key)
 
 
+def authenticate_http(request: Request) -> Tuple[Optional[APIKey], Optional[JSONResponse]]:
+    """
+    API key auth for HTTP endpoints, mirroring the WebSocket checks.
+    
+    Returns (api_key, None) when allowed, else (None, error response).
+    """
+    api_key_str = request.query_params.get("api_key") or request.headers.get("x-api-key")
+    
+    if not settings.require_auth:
+        return (token_manager.validate_key(api_key_str) if api_key_str else None), None
+    
+    if not api_key_str:
+        return None, JSONResponse({"error": "API key required"}, status_code=401)
+    api_key = token_manager.validate_key(api_key_str)
+    if not api_key:
+        return None, JSONResponse({"error": "Invalid API key"}, status_code=401)
+    if not token_manager.check_rate_limit(api_key):
+        return None, JSONResponse({"error": "Rate limit exceeded"}, status_code=429)
+    if not token_manager.check_monthly_quota(api_key):
+        return None, JSONResponse({"error": "Monthly quota exceeded"}, status_code=429)
+    return api_key, None
+
+
+class UploadTooLarge(MultiPartException):
+    """
+    Raised mid-stream when an upload goes over the limit.
+    
+    A MultiPartException, so MultiPartParser closes the parts it has
+    already spooled before the error reaches us.
+    """
+
+
+async def _receive_clips(request: Request) -> List[Tuple[str, object]]:
+    """
+    Uploaded clips as (filename, seekable file) without holding them in memory.
+    
+    multipart/form-data: every file field, spooled to disk by the parser.
+    Anything else: the raw request body is one clip, streamed to a temp file.
+    
+    The size limit applies to the bytes actually received, so a chunked
+    upload without a Content-Length can't get around it.
+    """
+    limit = settings.transcribe_max_upload_mb * 1024 * 1024
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise ValueError(f"Upload exceeds {settings.transcribe_max_upload_mb}MB")
+    
+    async def body():
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise UploadTooLarge(f"Upload exceeds {settings.transcribe_max_upload_mb}MB")
+            yield chunk
+    
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        try:
+            form = await MultiPartParser(request.headers, body()).parse()
+        except UploadTooLarge as e:
+            raise ValueError(e.message)
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        request.state.form = form
+        return [
+            (value.filename or f"clip{i}", value.file)
+            for i, (_, value) in enumerate(form.multi_items())
+            if hasattr(value, "file")
+        ]
+    
+    spooled = tempfile.TemporaryFile()
+    try:
+        async for chunk in body():
+            spooled.write(chunk)
+    except UploadTooLarge as e:
+        spooled.close()
+        raise ValueError(e.message)
+    size = spooled.tell()
+    spooled.seek(0)
+    return [(request.query_params.get("filename", "audio"), spooled)] if size else []
+
+
+async def _transcribe_clips(request: Request, clips, api_key: Optional[APIKey]):
+    """Decode and transcribe one clip at a time, yielding an NDJSON line per clip."""
+    loop = asyncio.get_event_loop()
+    try:
+        for index, (filename, file) in enumerate(clips):
+            result = {"index": index, "filename": filename}
+            try:
+                audio = await loop.run_in_executor(None, decode_audio, file)
+            except ValueError as e:
+                yield json.dumps({**result, "error": str(e)}) + "\n"
+                continue
+            finally:
+                file.close()
+            
+            duration = len(audio) / settings.sample_rate
+            if api_key and not token_manager.check_monthly_quota(api_key, duration / 60):
+                yield json.dumps({**result, "error": "Monthly quota exceeded"}) + "\n"
+                break
+            
+            start = time.monotonic()
+            text = await stt.transcribe_batched(audio, batch_size=settings.transcribe_batch_size)
+            if api_key:
+                token_manager.record_usage(api_key, duration / 60)
+            
+            yield json.dumps({
+                **result,
+                "text": text,
+                "duration": round(duration, 2),
+                "processing_seconds": round(time.monotonic() - start, 3),
+            }) + "\n"
+    finally:
+        for _, file in clips:
+            file.close()
+        form = getattr(request.state, "form", None)
+        if form is not None:
+            await form.close()
+
+
+@app.post("/api/transcribe")
+async def transcribe_files(request: Request):
+    """
+    Transcribe uploaded audio files, streaming NDJSON as each clip finishes.
+    
+    curl -F "files=@a.wav" -F "files=@b.mp3" "http://localhost:8765/api/transcribe?api_key=ocv_xxx"
+    curl --data-binary @voicemail.wav -H "Content-Type: audio/wav" \
+         "http://localhost:8765/api/transcribe?filename=voicemail.wav"
+    
+    Each line: {"index", "filename", "text", "duration", "processing_seconds"}
+    or {"index", "filename", "error"}.
+    """
+    api_key, error = authenticate_http(request)
+    if error:
+        return error
+    
+    if not await loader.wait(["stt"], timeout=settings.session_ready_timeout):
+        return JSONResponse({"error": "Server is warming up"}, status_code=503)
+    
+    try:
+        clips = await _receive_clips(request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    if not clips:
+        return JSONResponse({"error": "No audio uploaded"}, status_code=400)
+    
+    return StreamingResponse(
+        _transcribe_clips(request, clips, api_key),
+        media_type="application/x-ndjson",
+    )
+
+
+class TTSRequest(BaseModel):
+    """Body of POST /api/tts."""
+    
+    text: Optional[str] = None
+    texts: Optional[List[str]] = None  # Batch: spoken in order, one stream
+    format: str = "wav"  # wav, pcm16, f32
+    sample_rate: Optional[int] = None  # Defaults to the backend's native rate
+    pause_ms: int = 300  # Silence between batch texts
+
+
+async def _stream_speech(texts: List[str], body: TTSRequest, api_key: Optional[APIKey]):
+    """Synthesize texts in order and yield encoded audio as it is produced."""
+    native_rate = tts.sample_rate
+    rate = body.sample_rate or native_rate
+    resampler = Resampler(native_rate, rate)
+    pause = np.zeros(int(rate * body.pause_ms / 1000), dtype=np.float32)
+    samples = 0
+    
+    if body.format == "wav":
+        yield wav_header(rate)
+    for i, text in enumerate(texts):
+        if i and len(pause):
+            samples += len(pause)
+            yield encode_audio(pause, body.format)
+        async for chunk in tts.stream_audio(text):
+            chunk = resampler.process(chunk)
+            samples += len(chunk)
+            yield encode_audio(chunk, body.format)
+    
+    if api_key:
+        token_manager.record_usage(api_key, samples / rate / 60)
+
+
+@app.post("/api/tts")
+async def text_to_speech(body: TTSRequest, request: Request):
+    """
+    Synthesize one text or a batch of texts as a chunked audio stream.
+    
+    curl -X POST http://localhost:8765/api/tts -H "Content-Type: application/json" \
+         -d '{"texts": ["Your order shipped.", "Thanks!"], "format": "wav"}' -o out.wav
+    
+    Raw formats (pcm16, f32) are mono little-endian; the sample rate is in
+    the X-Sample-Rate header.
+    """
+    api_key, error = authenticate_http(request)
+    if error:
+        return error
+    
+    texts = [clean_for_speech(t) for t in ([body.text] if body.text else []) + (body.texts or [])]
+    texts = [t for t in texts if t]
+    if not texts:
+        return JSONResponse({"error": "Provide text or texts"}, status_code=400)
+    if sum(len(t) for t in texts) > settings.tts_max_chars:
+        return JSONResponse({"error": f"Text exceeds {settings.tts_max_chars} characters"}, status_code=413)
+    if body.format not in AUDIO_FORMATS:
+        return JSONResponse({"error": f"Invalid format. Options: {list(AUDIO_FORMATS)}"}, status_code=400)
+    if body.sample_rate is not None and not 8000 <= body.sample_rate <= 48000:
+        return JSONResponse({"error": "sample_rate must be between 8000 and 48000"}, status_code=400)
+    
+    if not await loader.wait(["tts"], timeout=settings.session_ready_timeout):
+        return JSONResponse({"error": "Server is warming up"}, status_code=503)
+    
+    rate = body.sample_rate or tts.sample_rate
+    media_type = AUDIO_FORMATS[body.format]
+    if body.format == "pcm16":
+        media_type += f";rate={rate}"
+    return StreamingResponse(
+        _stream_speech(texts, body, api_key),
+        media_type=media_type,
+        headers={"X-Sample-Rate": str(rate), "X-Audio-Format": body.format},
+    )
+
+
+def _audio_output(params) -> AudioOutput:
+    """Build a session's output stage from `output_format` / `output_sample_rate`."""
+    rate = params.get("output_sample_rate")
+    return AudioOutput(
+        tts.sample_rate,
+        fmt=params.get("output_format") or "pcm16",
+        sample_rate=int(rate) if rate else None,
+        opus_bitrate=settings.opus_bitrate,
+        opus_frame_ms=settings.opus_frame_ms,
+    )
+
+
+def _audio_input(params) -> AudioInput:
+    """Build a session's input stage from `input_format` / `input_sample_rate`."""
+    rate = params.get("input_sample_rate")
+    return AudioInput(
+        fmt=params.get("input_format") or "f32",
+        sample_rate=int(rate) if rate else settings.sample_rate,
+    )
+
+
+async def _send_audio(sender: SessionSender, data: bytes, output: AudioOutput):
+    if data:
+        await sender.send({
+            "type": "audio_chunk",
+            "data": base64.b64encode(data).decode(),
+            "format": output.format,
+            "sample_rate": output.sample_rate,
+        })
+
+
+async def _send_speech(sender: SessionSender, text: str, output: AudioOutput):
+    """Synthesize text and send it as audio_chunk messages in the session's format."""
+    async for audio in tts.stream_audio(text):
+        await _send_audio(sender, output.encode(audio), output)
+    await _send_audio(sender, output.flush(), output)
+
+
+async def _response_stream(
+    transcript: str, speculation: Optional[Speculation], use_cache: bool,
+) -> AsyncGenerator[str, None]:
+    """The committed speculative response if there is one, else a fresh request."""
+    if speculation is not None:
+        response = ""
+        async for chunk in speculation.stream():
+            response += chunk
+            yield chunk
+        if speculation.error is None:
+            backend.record_turn(transcript, response, measure_prompt=True)
+            return
+        if response:
+            return
+        # Failed before saying anything: ask again
+    async for chunk in backend.chat_stream(transcript, use_cache=use_cache):
+        yield chunk
+
+
 @app.websocket("/ws")
 @app.websocket("/voice/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -258,26 +840,87 @@ async def websocket_endpoint(websocket: WebSocket):
             api_key = token_manager.validate_key(api_key_str)
         logger.info("Client connected (auth disabled)")
     
+    # Only admit sessions once the models they need are warm
+    if not await loader.wait(SESSION_COMPONENTS, timeout=settings.session_ready_timeout):
+        await websocket.close(code=1013, reason="Server is warming up")
+        return
+    
     await websocket.accept()
+    # Ordered, bounded sends from a writer task; response_chunk tokens are
+    # batched into fewer frames
+    sender = SessionSender(
+        websocket,
+        coalesce_ms=settings.ws_coalesce_ms,
+        coalesce_bytes=settings.ws_coalesce_bytes,
+        max_buffered_bytes=settings.ws_max_buffered_kb * 1024,
+        overflow=settings.ws_overflow,
+        stall_timeout=settings.ws_stall_timeout,
+    )
+    
+    # Output audio format: pcm16 at the TTS backend's native rate unless negotiated
+    try:
+        output = _audio_output(websocket.query_params)
+    except ValueError as e:
+        await sender.send({"type": "error", "message": str(e)})
+        output = AudioOutput(tts.sample_rate)
+    
+    # Input audio format: float32 at 16kHz unless negotiated
+    try:
+        audio_input = _audio_input(websocket.query_params)
+    except ValueError as e:
+        await sender.send({"type": "error", "message": str(e)})
+        audio_input = AudioInput()
     
     audio_buffer = []
     is_listening = False
     session_start = None
+    use_cache = websocket.url.path in settings.response_cache_routes.split(",")
+    speculator = None
+    if settings.speculative_llm:
+        speculator = Speculator(
+            stt.transcribe,
+            lambda text: backend.chat_stream(text, use_cache=use_cache, record=False),
+            interval=settings.speculative_interval,
+            stable_seconds=settings.speculative_stable_seconds,
+            max_seconds=settings.speculative_max_seconds,
+        )
     
     try:
         while True:
-            data = await websocket.receive_text()
-            msg = json.loads(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                # Binary frames are raw uplink audio (no base64 overhead)
+                msg = {"type": "audio", "bytes": message["bytes"]}
+            else:
+                msg = json.loads(message["text"])
+            keep_warm.touch()
+            
+            # Turns count against the key's rate limit too (audio frames are
+            # metered by the monthly minutes instead)
+            if (settings.require_auth and api_key and msg["type"] in METERED_MESSAGES
+                    and not token_manager.check_rate_limit(api_key)):
+                await sender.send({"type": "error", "message": "Rate limit exceeded", "code": "rate_limited"})
+                continue
             
             if msg["type"] == "start_listening":
                 is_listening = True
                 audio_buffer = []
-                await websocket.send_json({"type": "listening_started"})
+                audio_input.reset()  # Drop anything left from the last recording
+                if speculator:
+                    speculator.reset()
+                await sender.send({"type": "listening_started"})
                 logger.debug("Started listening")
                 
             elif msg["type"] == "stop_listening":
                 is_listening = False
                 
+                # Flush the container decoder (if any) off the event loop
+                tail = await asyncio.get_event_loop().run_in_executor(None, audio_input.finish)
+                if len(tail):
+                    audio_buffer.append(tail)
+                
                 if audio_buffer:
                     # Combine audio chunks
                     audio_data = np.concatenate(audio_buffer)
@@ -286,12 +929,13 @@ async def websocket_endpoint(websocket: WebSocket):
                     logger.debug("Transcribing audio...")
                     transcript = await stt.transcribe(audio_data)
                     
-                    await websocket.send_json({
+                    await sender.send({
                         "type": "transcript",
                         "text": transcript,
                         "final": True,
                     })
                     logger.info(f"Transcript: {transcript}")
+                    speculation = speculator.take(transcript) if speculator else None
                     
                     if transcript.strip():
                         # Stream AI response with progressive TTS
@@ -302,15 +946,12 @@ async def websocket_endpoint(websocket: WebSocket):
                         audio_chunks = []
                         
                         # Stream response and synthesize sentences as they complete
-                        async for chunk in backend.chat_stream(transcript):
+                        async for chunk in _response_stream(transcript, speculation, use_cache):
                             full_response += chunk
                             sentence_buffer += chunk
                             
-                            # Send text chunk for progressive display
-                            await websocket.send_json({
-                                "type": "response_chunk",
-                                "text": chunk,
-                            })
+                            # Send text chunk for progressive display (coalesced)
+                            await sender.send_chunk(chunk)
                             
                             # Check for sentence boundaries
                             while any(sep in sentence_buffer for sep in ['. ', '! ', '? ', '.\n', '!\n', '?\n']):
@@ -330,13 +971,7 @@ async def websocket_endpoint(websocket: WebSocket):
                                         speech_text = clean_for_speech(sentence)
                                         if speech_text:
                                             logger.debug(f"Synthesizing: {speech_text[:50]}...")
-                                            async for audio_chunk in tts.synthesize_stream(speech_text):
-                                                audio_b64 = base64.b64encode(audio_chunk).decode()
-                                                await websocket.send_json({
-                                                    "type": "audio_chunk",
-                                                    "data": audio_b64,
-                                                    "sample_rate": 24000,
-                                                })
+                                            await _send_speech(sender, speech_text, output)
                                 else:
                                     break
                         
@@ -344,47 +979,67 @@ async def websocket_endpoint(websocket: WebSocket):
                         if sentence_buffer.strip():
                             speech_text = clean_for_speech(sentence_buffer.strip())
                             if speech_text:
-                                async for audio_chunk in tts.synthesize_stream(speech_text):
-                                    audio_b64 = base64.b64encode(audio_chunk).decode()
-                                    await websocket.send_json({
-                                        "type": "audio_chunk",
-                                        "data": audio_b64,
-                                        "sample_rate": 24000,
-                                    })
+                                await _send_speech(sender, speech_text, output)
                         
                         # Signal end of response
-                        await websocket.send_json({
+                        await sender.send({
                             "type": "response_complete",
                             "text": full_response,
                         })
                         logger.info(f"Response complete: {full_response[:100]}...")
                 
                 audio_buffer = []
-                await websocket.send_json({"type": "listening_stopped"})
+                await sender.send({"type": "listening_stopped"})
                 logger.debug("Stopped listening")
                 
             elif msg["type"] == "audio" and is_listening:
-                # Decode base64 audio
-                audio_bytes = base64.b64decode(msg["data"])
-                audio_np = np.frombuffer(audio_bytes, dtype=np.float32)
-                audio_buffer.append(audio_np)
+                # Decode base64 (or binary frame) audio in the negotiated format
+                audio_bytes = msg["bytes"] if "bytes" in msg else base64.b64decode(msg["data"])
+                audio_np = audio_input.feed(audio_bytes)
+                if len(audio_np):
+                    audio_buffer.append(audio_np)
+                    if speculator:
+                        speculator.update(audio_buffer, len(audio_np))
                 
                 # VAD check - notify client if speech detected
                 if vad and len(audio_np) > 0:
                     has_speech = vad.is_speech(audio_np)
-                    await websocket.send_json({
+                    await sender.send({
                         "type": "vad_status",
                         "speech_detected": has_speech,
                     })
                 
+            elif msg["type"] == "config":
+                try:
+                    if "output_format" in msg or "output_sample_rate" in msg:
+                        output = _audio_output(msg)
+                    if "input_format" in msg or "input_sample_rate" in msg:
+                        audio_input.reset()
+                        audio_input = _audio_input(msg)
+                except ValueError as e:
+                    await sender.send({"type": "error", "message": str(e)})
+                    continue
+                await sender.send({
+                    "type": "config",
+                    "output_format": output.format,
+                    "output_sample_rate": output.sample_rate,
+                    "input_format": audio_input.format,
+                    "input_sample_rate": audio_input.sample_rate,
+                })
+                
             elif msg["type"] == "ping":
-                await websocket.send_json({"type": "pong"})
+                await sender.send({"type": "pong"})
                 
     except WebSocketDisconnect:
         logger.info("Client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        await websocket.close()
+        await sender.abort()  # Not a second close after a slow-client disconnect
+    finally:
+        sender.close()
+        audio_input.reset()
+        if speculator:
+            speculator.reset()
 
 
 # Serve static files for client
@@ -0,0 +1,140 @@
+"""
+Process memory and startup profiling helpers.
+
+Reads /proc on Linux; other platforms fall back to getrusage for the
+current process and report None for everything else.
+
+Import-time profile of a full model load:
+
+    python -m src.server.profiling
+"""
+
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Modules that dominate startup time and RSS when they get imported
+HEAVY_MODULES = (
+    "torch", "torchaudio", "transformers", "ctranslate2", "faster_whisper",
+    "whisper", "onnxruntime", "chatterbox", "TTS", "elevenlabs", "openai",
+)
+
+
+def _read_proc_kb(path: str, fields: tuple) -> Dict[str, int]:
+    """Parse `Field:   1234 kB` lines from a /proc file into bytes."""
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    values[name] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return values
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process (defaults to the current one)."""
+    pid = pid or os.getpid()
+    values = _read_proc_kb(f"/proc/{pid}/status", ("VmRSS",))
+    if "VmRSS" in values:
+        return values["VmRSS"]
+    if pid == os.getpid():
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is bytes on macOS, kilobytes on Linux
+            return peak if sys.platform == "darwin" else peak * 1024
+        except (ImportError, OSError):
+            pass
+    return None
+
+
+def memory_breakdown(pid: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """
+    RSS, PSS and shared/private bytes of a process.
+
+    PSS divides shared pages between the processes mapping them, so the sum
+    of worker PSS is the real footprint of a preload-and-fork deployment.
+    """
+    pid = pid or os.getpid()
+    fields = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+    values = _read_proc_kb(f"/proc/{pid}/smaps_rollup", fields)
+    if not values:
+        return {"rss": rss_bytes(pid), "pss": None, "shared": None, "private": None}
+    return {
+        "rss": values.get("Rss"),
+        "pss": values.get("Pss"),
+        "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def format_mb(value: Optional[int]) -> str:
+    """Bytes as a short MB string ("n/a" when unknown)."""
+    return "n/a" if value is None else f"{value / (1024 * 1024):.0f}MB"
+
+
+def heavy_modules_loaded() -> List[str]:
+    """Which of the known heavy modules this process has imported."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def startup_profile() -> Dict[str, object]:
+    """Snapshot of what startup cost this process: RSS and heavy imports."""
+    return {
+        "rss_bytes": rss_bytes(),
+        "heavy_modules": heavy_modules_loaded(),
+        "torch_loaded": "torch" in sys.modules,
+    }
+
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, float, int]]:
+    """Parse `python -X importtime` output into (module, cumulative_s, depth)."""
+    rows = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+    return rows
+
+
+def profile_imports(code: str, top: int = 15) -> List[Tuple[str, float]]:
+    """
+    Run `code` in a fresh interpreter with -X importtime.
+
+    Returns the slowest packages (cumulative time of each package root,
+    wherever in the import tree it was first pulled in).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    rows = [(m, t) for m, t, _ in parse_importtime(result.stderr) if "." not in m]
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    code = (
+        "import time, json; t = time.monotonic(); "
+        "from src.server import main; main.load_models(); "
+        "from src.server.profiling import startup_profile; "
+        "p = startup_profile(); p['load_seconds'] = time.monotonic() - t; "
+        "print(json.dumps(p))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    summary = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else "{}"
+
+    print("Slowest packages to import (cumulative):")
+    for module, seconds in profile_imports(code):
+        print(f"  {seconds * 1000:8.1f} ms  {module}")
+    print()
+    print(f"Startup profile: {summary}")
@@ -0,0 +1,193 @@
+"""
+Speculative LLM requests on stable partial transcripts.
+
+Normally the LLM request waits for the final transcript, so STT time and
+the LLM's time-to-first-token add up. In speculative mode, while the user
+is still talking (or the client is still waiting for silence to end the
+turn), the audio so far is transcribed every `interval` seconds. Once the
+partial transcript has stayed the same over `stable_seconds` of further
+audio, the response is requested for it in the background. Partials keep
+running, and a speculation is dropped as soon as one no longer matches it.
+Each partial re-transcribes the whole utterance on the shared STT model, so
+they stop once the turn is longer than `max_seconds`: the work per turn stays
+bounded, and a long turn rarely settles early enough to be worth it.
+
+At the end of the turn:
+- if the final transcript matches (ignoring case and punctuation), the
+  speculative stream is used, often with its first sentence already there
+- otherwise it is cancelled and the request is made as usual
+
+`speculation_stats` counts hits and wasted tokens, to tune the interval
+and stability settings.
+"""
+
+import asyncio
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from .cache import normalize_utterance
+from .context import estimate_tokens
+
+
+class SpeculationStats:
+    """Process-wide speculation counters (reported at /api/metrics)."""
+
+    def __init__(self):
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+        self.wasted_tokens = 0  # Response tokens generated for discarded speculations
+        self.lead_seconds_total = 0.0  # How much earlier committed requests started
+
+    def stats(self) -> Dict:
+        decided = self.committed + self.discarded
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "discarded": self.discarded,
+            "hit_rate": self.committed / decided if decided else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+            "mean_lead_seconds": self.lead_seconds_total / self.committed if self.committed else 0.0,
+        }
+
+
+speculation_stats = SpeculationStats()
+
+
+class Speculation:
+    """A response stream started early, buffered until it is used or cancelled."""
+
+    def __init__(self, text: str, stream: AsyncGenerator[str, None]):
+        self.text = text
+        self.started_at = time.monotonic()
+        self.chunks: List[str] = []
+        self.error: Optional[Exception] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump(stream))
+
+    async def _pump(self, stream: AsyncGenerator[str, None]):
+        try:
+            async for chunk in stream:
+                self.chunks.append(chunk)
+                self._queue.put_nowait(chunk)
+        except Exception as e:
+            logger.warning(f"Speculative request failed: {e}")
+            self.error = e
+        finally:
+            self._queue.put_nowait(None)
+
+    def matches(self, transcript: str) -> bool:
+        return self.error is None and normalize_utterance(self.text) == normalize_utterance(transcript)
+
+    async def stream(self) -> AsyncGenerator[str, None]:
+        """
+        Buffered chunks first, then the rest as it arrives. If the request
+        fails part way, the stream just ends and `error` is set.
+        """
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                break
+            yield chunk
+
+    def cancel(self) -> int:
+        """Stop the request. Returns the tokens it had generated."""
+        self._task.cancel()
+        return estimate_tokens("".join(self.chunks))
+
+
+class Speculator:
+    """Per-session partial transcription and speculative response."""
+
+    def __init__(
+        self,
+        transcribe: Callable[[np.ndarray], Awaitable[str]],
+        start_stream: Callable[[str], AsyncGenerator[str, None]],
+        interval: float = 0.5,
+        stable_seconds: float = 0.5,
+        max_seconds: float = 8.0,
+        sample_rate: int = 16000,
+    ):
+        """
+        Args:
+            transcribe: STT coroutine for partial transcripts
+            start_stream: Starts the response stream for a transcript
+                (must not commit the turn to the conversation history)
+            interval: Seconds of new audio between partial transcripts
+            stable_seconds: Audio over which a partial must stay unchanged
+            max_seconds: No more partials once the turn is this long
+        """
+        self.transcribe = transcribe
+        self.start_stream = start_stream
+        self.interval = int(interval * sample_rate)
+        self.stable = int(stable_seconds * sample_rate)
+        self.max_samples = int(max_seconds * sample_rate)
+        self.speculation: Optional[Speculation] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        """Start a new turn, dropping any speculation from the last one."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._discard()
+        self._samples = 0
+        self._last_partial = 0
+        self._stable_text = ""
+        self._stable_since = 0
+
+    def _discard(self):
+        if self.speculation is not None:
+            speculation_stats.discarded += 1
+            speculation_stats.wasted_tokens += self.speculation.cancel()
+            self.speculation = None
+
+    def update(self, audio_buffer: List[np.ndarray], new_samples: int):
+        """Called as audio arrives; transcribes the buffer every `interval`."""
+        self._samples += new_samples
+        if self._task and not self._task.done():
+            return
+        if self._samples - self._last_partial < self.interval or self._samples > self.max_samples:
+            return
+        self._last_partial = self._samples
+        self._task = asyncio.create_task(self._partial(np.concatenate(audio_buffer), self._samples))
+
+    async def _partial(self, audio: np.ndarray, samples: int):
+        try:
+            text = await self.transcribe(audio)
+        except Exception as e:
+            logger.debug(f"Partial transcription failed: {e}")
+            return
+        normalized = normalize_utterance(text)
+        if not normalized:
+            return
+        if self.speculation is not None and not self.speculation.matches(text):
+            # The user kept talking: this speculation can't be used
+            self._discard()
+        if normalized != self._stable_text:
+            self._stable_text, self._stable_since = normalized, samples
+        elif samples - self._stable_since >= self.stable and self.speculation is None:
+            logger.debug(f"Speculating on partial transcript: {text}")
+            speculation_stats.started += 1
+            self.speculation = Speculation(text, self.start_stream(text))
+
+    def take(self, transcript: str) -> Optional[Speculation]:
+        """
+        End of turn: the speculation if it matches the final transcript,
+        else None (a mismatching one is cancelled and counted as waste).
+        """
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        speculation = self.speculation
+        if speculation is not None and speculation.matches(transcript):
+            self.speculation = None
+            speculation_stats.committed += 1
+            speculation_stats.lead_seconds_total += time.monotonic() - speculation.started_at
+            return speculation
+        self._discard()
+        return None
@@ -32,22 +32,25 @@ async def stream_openai_response(
     client,
     messages: list,
     model: str = "gpt-4o-mini",
+    budget=None,
 ) -> AsyncGenerator[str, None]:
     """
     Stream OpenAI response chunk by chunk.
     
-    Yields text as it arrives from the API.
+    Yields text as it arrives from the API. With a SpeechBudget, generation
+    is capped by it and the stream is closed once a sentence goes past it.
     """
     try:
         response = await client.chat.completions.create(
             model=model,
             messages=messages,
-            max_tokens=150,
+            max_tokens=budget.max_tokens if budget else 150,
             temperature=0.7,
             stream=True,
         )
         
         buffer = ""
+        spoken = ""
         async for chunk in response:
             if chunk.choices[0].delta.content:
                 text = chunk.choices[0].delta.content
@@ -60,8 +63,17 @@ async def stream_openai_response(
                         sentence = match.group(1)
                         buffer = buffer[match.end():]
                         yield sentence
+                        spoken += sentence + " "
                     else:
                         break
+            
+            if budget and budget.max_seconds and budget.spoken_seconds(spoken) >= budget.max_seconds:
+                await response.close()
+                budget.record(spoken, stopped=True)
+                return
+        
+        if budget:
+            budget.record(spoken + buffer, stopped=False)
         
         # Yield any remaining text
         if buffer.strip():
@@ -132,7 +144,8 @@ async def process_with_streaming(
         async for chunk in stream_openai_response(
             backend._client, 
             messages, 
-            backend.model
+            backend.model,
+            getattr(backend, "speech_budget", None),
         ):
             full_response += chunk + " "
             
@@ -1,13 +1,96 @@
 """
 Speech-to-Text module using Whisper.
+
+WhisperSTT can hold several model sizes at once (e.g. tiny plus
+large-v3-turbo) and route each utterance: short utterances, and everything
+while the queue is deep, go to the smallest model. Extra models are
+evicted least-recently-used to stay under a memory budget.
 """
 
 import asyncio
-from typing import Optional
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 import numpy as np
 from loguru import logger
 
+from .devices import whisper_device
+
+# Approximate resident size (MB) of each Whisper size (faster-whisper, int8)
+MODEL_MEMORY_MB = {
+    "tiny": 75,
+    "tiny.en": 75,
+    "base": 145,
+    "base.en": 145,
+    "small": 480,
+    "small.en": 480,
+    "distil-small.en": 330,
+    "medium": 1500,
+    "medium.en": 1500,
+    "distil-medium.en": 800,
+    "large-v3-turbo": 1600,
+    "turbo": 1600,
+    "distil-large-v3": 1500,
+    "large-v1": 3000,
+    "large-v2": 3000,
+    "large-v3": 3000,
+}
+UNKNOWN_MODEL_MB = 3000
+
+
+@dataclass(frozen=True)
+class STTProfile:
+    """Decode parameters plus CTranslate2 load options for a speed/quality tradeoff."""
+    
+    beam_size: int = 1
+    best_of: int = 1
+    temperature: Tuple[float, ...] = (0.0,)  # Fallback schedule, used when decoding fails
+    without_timestamps: bool = True
+    condition_on_previous_text: bool = False
+    cpu_threads: int = 0  # 0 = CTranslate2 default
+    num_workers: int = 1  # Parallel transcriptions per model
+    compute_type: Optional[str] = None  # None = best supported on the device
+    
+    def decode_options(self) -> Dict[str, Any]:
+        options = asdict(self)
+        for key in ("cpu_threads", "num_workers", "compute_type"):
+            del options[key]
+        options["temperature"] = list(self.temperature)
+        return options
+
+
+STT_PROFILES = {
+    # Greedy, no fallback: fastest, may hallucinate more on hard audio
+    "latency": STTProfile(),
+    # Greedy first; retry at higher temperatures only when decoding fails
+    "balanced": STTProfile(temperature=(0.0, 0.4, 0.8), best_of=2),
+    # Beam search with the full Whisper fallback schedule (the pre-profile decode)
+    "accuracy": STTProfile(
+        beam_size=5,
+        best_of=5,
+        temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        without_timestamps=False,
+        condition_on_previous_text=True,
+    ),
+}
+
+
+def resolve_profile(profile: Union[str, STTProfile], **overrides) -> STTProfile:
+    """Look up a named profile and apply non-None overrides."""
+    if isinstance(profile, str):
+        if profile not in STT_PROFILES:
+            raise ValueError(f"Unknown STT profile: {profile} (options: {', '.join(STT_PROFILES)})")
+        profile = STT_PROFILES[profile]
+    return replace(profile, **{k: v for k, v in overrides.items() if v is not None})
+
+
+def model_memory_mb(model_name: str) -> int:
+    """Estimated memory for a Whisper size (unknown names assume large)."""
+    return MODEL_MEMORY_MB.get(model_name, UNKNOWN_MODEL_MB)
+
 
 class WhisperSTT:
     """Whisper-based Speech-to-Text."""
@@ -17,43 +100,75 @@ class WhisperSTT:
         model_name: str = "base",
         device: str = "auto",
         language: str = "en",
+        models: Iterable[str] = (),
+        model_paths: Optional[Dict[str, str]] = None,
+        short_utterance_seconds: float = 2.0,
+        busy_queue_depth: int = 2,
+        memory_budget_mb: int = 0,
+        profile: Union[str, STTProfile] = "accuracy",
     ):
+        """
+        Args:
+            model_name: Primary model; always resident, used for long utterances
+            models: Extra sizes to route to (the smallest one is the fast path)
+            model_paths: Local directories for model sizes (offline bundles)
+            short_utterance_seconds: Utterances up to this long use the fast model
+            busy_queue_depth: Use the fast model once this many requests are pending
+            memory_budget_mb: Evict idle extra models beyond this (0 = unlimited)
+            profile: Decode profile name from STT_PROFILES, or an STTProfile
+        """
         self.model_name = model_name
         self.device = device
         self.language = language
+        self.model_paths = dict(model_paths or {})
+        self.short_utterance_seconds = short_utterance_seconds
+        self.busy_queue_depth = busy_queue_depth
+        self.memory_budget_mb = memory_budget_mb
+        self.profile = resolve_profile(profile)
+        self.model_names = [model_name] + [m for m in dict.fromkeys(models) if m != model_name]
         self.model = None
         self._backend = "mock"
+        self._compute_type = None
+        self._models: "OrderedDict[str, object]" = OrderedDict()  # LRU, oldest first
+        self._active: Dict[str, int] = {}
+        self._loading: Dict[str, threading.Event] = {}  # Models being loaded (outside the lock)
+        self._lock = threading.Lock()
+        self._pending = 0  # Transcriptions in flight, including queued ones
+        self.route_counts: Dict[str, int] = {name: 0 for name in self.model_names}
+        self.evictions = 0
+        self._over_budget = set()  # Models already warned about
+        self._batched = None
         self._load_model()
+        for name in self.model_names[1:]:
+            self._acquire(name, release=True)
+    
+    @property
+    def fast_model(self) -> str:
+        """Smallest configured model."""
+        return min(self.model_names, key=model_memory_mb)
+    
+    @property
+    def loaded_models(self):
+        return list(self._models)
     
     def _load_model(self):
-        """Load the Whisper model."""
+        """Load the primary Whisper model and pick the backend."""
+        path = self.model_paths.get(self.model_name, self.model_name)
         # Try faster-whisper first
         try:
             from faster_whisper import WhisperModel
             
-            if self.device == "auto":
-                import torch
-                if torch.cuda.is_available():
-                    self.device = "cuda"
-                    compute_type = "float16"
-                elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-                    self.device = "cpu"
-                    compute_type = "int8"
-                else:
-                    self.device = "cpu"
-                    compute_type = "int8"
-            elif self.device == "cuda":
-                compute_type = "float16"
-            else:
-                compute_type = "int8"
+            # Probe via CTranslate2 so CPU deployments never import torch
+            self.device, self._compute_type = whisper_device(self.device)
+            self._compute_type = self.profile.compute_type or self._compute_type
             
-            logger.info(f"Loading faster-whisper {self.model_name} on {self.device}")
-            self.model = WhisperModel(
-                self.model_name,
-                device=self.device if self.device != "mps" else "cpu",
-                compute_type=compute_type,
+            logger.info(
+                f"Loading faster-whisper {self.model_name} on {self.device} "
+                f"({self._compute_type}, beam {self.profile.beam_size})"
             )
+            self.model = self._faster_whisper(WhisperModel, path)
             self._backend = "faster-whisper"
+            self._models[self.model_name] = self.model
             logger.info("✅ faster-whisper loaded")
             return
         except ImportError:
@@ -70,8 +185,9 @@ class WhisperSTT:
                 self.device = "cuda" if torch.cuda.is_available() else "cpu"
             
             logger.info(f"Loading openai-whisper {self.model_name}")
-            self.model = whisper.load_model(self.model_name, device=self.device)
+            self.model = whisper.load_model(path, device=self.device)
             self._backend = "openai-whisper"
+            self._models[self.model_name] = self.model
             logger.info("✅ openai-whisper loaded")
             return
         except ImportError:
@@ -82,28 +198,212 @@ class WhisperSTT:
         # Mock mode for testing
         logger.warning("⚠️ No STT backend - using mock mode")
         self._backend = "mock"
+        self._models[self.model_name] = None
+    
+    def _load_one(self, name: str):
+        """Load an extra model size with the backend the primary model uses."""
+        path = self.model_paths.get(name, name)
+        logger.info(f"Loading {self._backend} {name} for routing")
+        if self._backend == "faster-whisper":
+            from faster_whisper import WhisperModel
+            return self._faster_whisper(WhisperModel, path)
+        if self._backend == "openai-whisper":
+            import whisper
+            return whisper.load_model(path, device=self.device)
+        return None
+    
+    def _faster_whisper(self, model_class, path: str):
+        return model_class(
+            path,
+            device=self.device,
+            compute_type=self._compute_type,
+            cpu_threads=self.profile.cpu_threads,
+            num_workers=self.profile.num_workers,
+        )
+    
+    def _resident_mb(self) -> int:
+        # Models still loading count too, so concurrent loads can't overshoot
+        return sum(model_memory_mb(name) for name in [*self._models, *self._loading])
+    
+    def _make_room(self, needed_mb: int) -> bool:
+        """Evict idle extra models (LRU first) until needed_mb fits the budget."""
+        if not self.memory_budget_mb:
+            return True
+        for name in list(self._models):
+            if self._resident_mb() + needed_mb <= self.memory_budget_mb:
+                break
+            if name == self.model_name or self._active.get(name):
+                continue
+            del self._models[name]
+            self.evictions += 1
+            logger.info(f"♻️ Evicted Whisper {name} (memory budget {self.memory_budget_mb}MB)")
+        return self._resident_mb() + needed_mb <= self.memory_budget_mb
+    
+    def _acquire(self, name: str, release: bool = False):
+        """
+        Mark `name` in use and return (name, model), loading it if needed.
+        
+        Falls back to the primary model when `name` cannot be loaded or
+        does not fit the memory budget.
+        """
+        while True:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    if not release:
+                        self._active[name] = self._active.get(name, 0) + 1
+                    return name, self._models[name]
+                loading = self._loading.get(name)
+                if loading is None:
+                    if not self._make_room(model_memory_mb(name)):
+                        if name not in self._over_budget:
+                            self._over_budget.add(name)
+                            logger.warning(f"Whisper {name} does not fit the memory budget, using {self.model_name}")
+                        name = self.model_name
+                        continue
+                    # Reserve the slot; the load itself happens without the lock
+                    loading = self._loading[name] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            
+            if not owner:
+                # Someone else is loading it: wait, then use it or the primary
+                loading.wait()
+                with self._lock:
+                    if name not in self._models:
+                        name = self.model_name
+                continue
+            
+            try:
+                model, error = self._load_one(name), None
+            except Exception as e:
+                model, error = None, e
+            with self._lock:
+                del self._loading[name]
+                if error is None:
+                    self._models[name] = model
+            loading.set()
+            if error is not None:
+                logger.warning(f"Whisper {name} failed to load: {error}")
+                name = self.model_name
+    
+    def _release(self, name: str):
+        with self._lock:
+            self._active[name] -= 1
+    
+    @contextmanager
+    def track_request(self):
+        """
+        Count a transcription as in flight from when it is queued until it
+        is done (model workers wrap each request, as their model is serial).
+        """
+        with self._lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+    
+    def route(self, duration: float, queue_depth: Optional[int] = None) -> str:
+        """
+        Pick the model size for an utterance of `duration` seconds.
+        
+        `queue_depth` defaults to the other requests in flight.
+        """
+        if len(self.model_names) == 1:
+            return self.model_name
+        queue_depth = max(0, self._pending - 1) if queue_depth is None else queue_depth
+        if duration <= self.short_utterance_seconds or queue_depth >= self.busy_queue_depth:
+            return self.fast_model
+        return self.model_name
+    
+    def warmup(self, seconds: float = 1.0):
+        """
+        Run a dummy transcription so kernels and buffers are initialized
+        before the first real request.
+        """
+        # Low-level noise rather than silence so the decoder actually runs
+        audio = (np.random.default_rng(0).standard_normal(int(16000 * seconds)) * 0.01)
+        audio = audio.astype(np.float32)
+        for name in list(self._models):
+            if self._backend == "faster-whisper":
+                segments, _ = self._models[name].transcribe(
+                    audio,
+                    language=self.language,
+                    vad_filter=False,
+                    **self.profile.decode_options(),
+                )
+                list(segments)  # Consume generator
+            else:
+                self._transcribe_sync(audio, model_name=name)
     
     async def transcribe(self, audio: np.ndarray) -> str:
         """Transcribe audio to text."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._transcribe_sync, audio)
+        with self.track_request():
+            model_name = self.route(len(audio) / 16000)
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._transcribe_sync, audio, model_name)
     
-    def _transcribe_sync(self, audio: np.ndarray) -> str:
-        """Synchronous transcription."""
-        if self._backend == "faster-whisper":
-            segments, info = self.model.transcribe(
+    async def transcribe_batched(self, audio: np.ndarray, batch_size: int = 8) -> str:
+        """
+        Transcribe a long clip (voicemail, recordings) on the primary model.
+        
+        faster-whisper splits the clip at pauses and decodes the pieces as
+        one batch; other backends fall back to a regular transcription.
+        """
+        with self.track_request():
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._transcribe_batched_sync, audio, batch_size)
+    
+    def _transcribe_batched_sync(self, audio: np.ndarray, batch_size: int = 8) -> str:
+        if self._backend != "faster-whisper":
+            return self._transcribe_sync(audio, model_name=self.model_name)
+        
+        name, model = self._acquire(self.model_name)
+        try:
+            with self._lock:
+                self.route_counts[name] = self.route_counts.get(name, 0) + 1
+                if self._batched is None:
+                    from faster_whisper import BatchedInferencePipeline
+                    self._batched = BatchedInferencePipeline(model=model)
+            options = self.profile.decode_options()
+            options.pop("condition_on_previous_text")  # Batched segments decode independently
+            segments, info = self._batched.transcribe(
                 audio,
                 language=self.language,
-                beam_size=5,
-                vad_filter=True,
+                batch_size=batch_size,
+                **options,
             )
             return " ".join(segment.text for segment in segments).strip()
-        
-        elif self._backend == "openai-whisper":
-            result = self.model.transcribe(audio, language=self.language)
-            return result["text"].strip()
-        
-        else:
-            # Mock mode - return placeholder
-            logger.debug(f"Mock STT: received {len(audio)} samples")
-            return "[Mock transcription - install whisper for real STT]"
+        finally:
+            self._release(name)
+    
+    def _transcribe_sync(self, audio: np.ndarray, model_name: Optional[str] = None) -> str:
+        """Synchronous transcription."""
+        name, model = self._acquire(model_name or self.route(len(audio) / 16000))
+        with self._lock:
+            self.route_counts[name] = self.route_counts.get(name, 0) + 1
+        try:
+            if self._backend == "faster-whisper":
+                segments, info = model.transcribe(
+                    audio,
+                    language=self.language,
+                    vad_filter=True,
+                    **self.profile.decode_options(),
+                )
+                return " ".join(segment.text for segment in segments).strip()
+            
+            elif self._backend == "openai-whisper":
+                options = self.profile.decode_options()
+                options["temperature"] = tuple(options["temperature"])
+                result = model.transcribe(audio, language=self.language, **options)
+                return result["text"].strip()
+            
+            else:
+                # Mock mode - return placeholder
+                logger.debug(f"Mock STT ({name}): received {len(audio)} samples")
+                return "[Mock transcription - install whisper for real STT]"
+        finally:
+            self._release(name)
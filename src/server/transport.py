@@ -0,0 +1,318 @@
+"""
+Coalesced WebSocket sends.
+
+While a response streams, every LLM token used to be a `response_chunk`
+message: one JSON encode and one WebSocket frame of a few bytes each, which
+dominates the socket writes of a turn. `SessionSender` instead buffers text
+deltas and sends them as one `response_chunk` once the buffer is
+`coalesce_bytes` long or `coalesce_ms` after the first delta, whichever
+comes first.
+
+Order is preserved: any other message (an audio chunk, response_complete,
+an error) first flushes the buffered text, then goes out, and all writes
+happen one at a time in the order they were issued. The coalescing timer
+and the session both enqueue, so enqueuing holds a lock: a send paused by
+the overflow policy keeps every later one behind it.
+
+Writes don't block the session: messages go into a per-session queue that
+a writer task drains, so a slow client doesn't stall its own STT/TTS
+pipeline until the queue holds `max_buffered_bytes`. What happens then is
+the overflow policy:
+
+- "drop": the oldest queued audio is dropped to make room (control and
+  text messages are always kept)
+- "pause": sends wait for the client to catch up, which pauses synthesis;
+  a client that reads nothing for `stall_timeout` seconds is disconnected
+- "disconnect": the session is closed straight away
+
+Either way a client that stops reading can only pin `max_buffered_bytes`.
+
+Messages are encoded with orjson when it is installed (several times faster
+than json for the base64 audio payloads), else with the standard library.
+"""
+
+import asyncio
+import json
+import weakref
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+from starlette.websockets import WebSocketDisconnect
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up
+    orjson = None
+
+OVERFLOW_POLICIES = ("drop", "pause", "disconnect")
+
+# Close code for a session dropped because its client stopped reading
+SLOW_CLIENT_CLOSE_CODE = 4004
+
+
+def dumps(message: Dict) -> str:
+    """Compact JSON text for a WebSocket message."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class TransportStats:
+    """Process-wide send counters (reported at /api/metrics)."""
+
+    def __init__(self):
+        self.text_deltas = 0  # response_chunk deltas handed to the sender
+        self.text_frames = 0  # response_chunk messages actually sent
+        self.frames = 0  # All messages sent
+        self.dropped_frames = 0  # Audio dropped for slow clients
+        self.slow_disconnects = 0
+
+    def stats(self) -> Dict:
+        return {
+            "text_deltas": self.text_deltas,
+            "text_frames": self.text_frames,
+            "deltas_per_frame": self.text_deltas / self.text_frames if self.text_frames else 0.0,
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "slow_disconnects": self.slow_disconnects,
+            "sessions": [sender.stats() for sender in list(_senders)],
+        }
+
+
+transport_stats = TransportStats()
+
+# Open sessions, for per-session metrics
+_senders: "weakref.WeakSet[SessionSender]" = weakref.WeakSet()
+
+
+class SessionSender:
+    """Ordered, coalescing, bounded sender for one WebSocket session."""
+
+    def __init__(
+        self,
+        websocket,
+        coalesce_ms: float = 40.0,
+        coalesce_bytes: int = 512,
+        max_buffered_bytes: int = 1 << 20,
+        overflow: str = "pause",
+        stall_timeout: float = 10.0,
+    ):
+        """
+        Args:
+            websocket: Accepted Starlette WebSocket
+            coalesce_ms: Longest a text delta waits for others (0 = send each at once)
+            coalesce_bytes: Buffered text that triggers an immediate send
+            max_buffered_bytes: Queued bytes before the overflow policy applies
+            overflow: "drop", "pause" or "disconnect"
+            stall_timeout: Seconds a paused send waits for any progress
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow} (expected one of {', '.join(OVERFLOW_POLICIES)})")
+        self.websocket = websocket
+        self.coalesce = coalesce_ms / 1000
+        self.coalesce_bytes = coalesce_bytes
+        self.max_buffered_bytes = max_buffered_bytes
+        self.overflow = overflow
+        self.stall_timeout = stall_timeout
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._timer: Optional[asyncio.Task] = None
+
+        # Encoded frames waiting for the writer: (frame, is audio)
+        self._queue: Deque[Tuple[str, bool]] = deque()
+        self._enqueue_lock = asyncio.Lock()  # FIFO, so frames queue in the order taken
+        self.buffered_bytes = 0  # Queued plus the frame being written
+        self._ready = asyncio.Event()  # The queue has frames
+        self._progress = asyncio.Event()  # A frame was written
+        self._closed: Optional[str] = None  # Why sending stopped
+        self._close_code = SLOW_CLIENT_CLOSE_CODE
+        self._writer = asyncio.create_task(self._write_loop())
+        _senders.add(self)
+
+        # Metrics
+        self.sent_frames = 0
+        self.peak_buffered_bytes = 0
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+        self.pauses = 0
+
+    async def _write_loop(self):
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            frame, _ = self._queue.popleft()
+            try:
+                await self.websocket.send_text(frame)
+            except Exception as e:
+                # Client gone: the session's next send ends it
+                self._closed = f"send failed: {e}"
+                self._close_code = 1006
+                self._queue.clear()
+                self.buffered_bytes = 0
+                self._progress.set()
+                return
+            self.buffered_bytes -= len(frame)
+            self.sent_frames += 1
+            transport_stats.frames += 1
+            self._progress.set()
+
+    async def _write(self, messages: List[Dict]):
+        # Callers take their messages synchronously and come straight here,
+        # so the lock's waiters are in the order the messages were taken
+        async with self._enqueue_lock:
+            for message in messages:
+                await self._enqueue(message)
+
+    async def _enqueue(self, message: Dict):
+        if self._closed:
+            raise WebSocketDisconnect(self._close_code, self._closed)
+        frame = dumps(message)
+        audio = message.get("type") == "audio_chunk"
+        if self.buffered_bytes and self.buffered_bytes + len(frame) > self.max_buffered_bytes:
+            if not await self._overflow(len(frame), audio):
+                return
+        self._queue.append((frame, audio))
+        self.buffered_bytes += len(frame)
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, self.buffered_bytes)
+        self._ready.set()
+
+    def _fits(self, size: int) -> bool:
+        return not self.buffered_bytes or self.buffered_bytes + size <= self.max_buffered_bytes
+
+    async def _overflow(self, size: int, audio: bool) -> bool:
+        """Make room for a frame per the policy. Returns False to drop it."""
+        if self.overflow == "drop":
+            if not self.dropped_frames:
+                logger.warning(f"🐢 Slow client, dropping queued audio ({self.buffered_bytes} bytes buffered)")
+            kept: Deque[Tuple[str, bool]] = deque()
+            for frame, is_audio in self._queue:  # Oldest first
+                if is_audio and not self._fits(size):
+                    self._drop(frame)
+                else:
+                    kept.append((frame, is_audio))
+            self._queue = kept
+            if audio and not self._fits(size):
+                self._drop_count(size)
+                return False
+            return True
+
+        if self.overflow == "pause":
+            self.pauses += 1
+            while not self._fits(size) and not self._closed:
+                self._progress.clear()
+                try:
+                    await asyncio.wait_for(self._progress.wait(), self.stall_timeout)
+                except asyncio.TimeoutError:
+                    await self._disconnect(f"no progress for {self.stall_timeout:.0f}s")
+            if self._closed:
+                raise WebSocketDisconnect(self._close_code, self._closed)
+            return True
+
+        await self._disconnect(f"{self.buffered_bytes} bytes buffered")
+        raise WebSocketDisconnect(self._close_code, self._closed)
+
+    def _drop(self, frame: str):
+        self.buffered_bytes -= len(frame)
+        self._drop_count(len(frame))
+
+    def _drop_count(self, size: int):
+        self.dropped_frames += 1
+        self.dropped_bytes += size
+        transport_stats.dropped_frames += 1
+
+    async def _disconnect(self, reason: str):
+        """Close a session whose client isn't reading."""
+        logger.warning(f"🐢 Disconnecting slow client: {reason}")
+        self._closed = reason
+        transport_stats.slow_disconnects += 1
+        self._writer.cancel()
+        self._queue.clear()
+        self.buffered_bytes = 0
+        try:
+            await self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE, reason="Client too slow")
+        except Exception:
+            pass
+
+    async def abort(self, code: int = 1000):
+        """Close the socket after a session error, unless it is already closed."""
+        if self._closed:
+            return  # Disconnected as a slow client, or the client is gone
+        self._closed = "session error"
+        self._close_code = code
+        self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _take_text(self) -> List[Dict]:
+        """The buffered text as a message (taken synchronously, so order holds)."""
+        if self._timer is not None:
+            if self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return []
+        text = "".join(self._pending)
+        self._pending, self._pending_bytes = [], 0
+        transport_stats.text_frames += 1
+        return [{"type": "response_chunk", "text": text}]
+
+    async def send_chunk(self, text: str):
+        """Queue a response_chunk delta."""
+        if not text:
+            return
+        transport_stats.text_deltas += 1
+        self._pending.append(text)
+        self._pending_bytes += len(text.encode())
+        if not self.coalesce or self._pending_bytes >= self.coalesce_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.coalesce)
+        try:
+            await self.flush()
+        except Exception as e:  # The session loop sees the closed socket itself
+            logger.debug(f"Deferred response_chunk send failed: {e}")
+
+    async def send(self, message: Dict):
+        """Send a message after any buffered text."""
+        await self._write(self._take_text() + [message])
+
+    async def flush(self):
+        messages = self._take_text()
+        if messages:
+            await self._write(messages)
+
+    async def drain(self):
+        """Wait until everything queued so far has been written."""
+        await self.flush()
+        while self.buffered_bytes and not self._closed:
+            self._progress.clear()
+            await self._progress.wait()
+
+    def close(self):
+        """Drop anything unsent (the session is over)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._writer.cancel()
+        self._pending, self._pending_bytes = [], 0
+        self._queue.clear()
+        self.buffered_bytes = 0
+        _senders.discard(self)
+
+    def stats(self) -> Dict:
+        return {
+            "overflow": self.overflow,
+            "buffered_bytes": self.buffered_bytes,
+            "peak_buffered_bytes": self.peak_buffered_bytes,
+            "sent_frames": self.sent_frames,
+            "dropped_frames": self.dropped_frames,
+            "dropped_bytes": self.dropped_bytes,
+            "pauses": self.pauses,
+        }
@@ -4,12 +4,16 @@ Text-to-Speech module using ElevenLabs, Chatterbox, or fallbacks.
 
 import asyncio
 import os
-from typing import Optional, AsyncGenerator
+from collections import OrderedDict
+from typing import Optional, AsyncGenerator, Dict, Tuple
 from pathlib import Path
 
 import numpy as np
 from loguru import logger
 
+from .audio import encode_audio
+from .devices import torch_device
+
 
 class ChatterboxTTS:
     """Text-to-Speech using ElevenLabs, Chatterbox, or fallbacks."""
@@ -19,10 +23,21 @@ class ChatterboxTTS:
         voice_sample: Optional[str] = None,
         device: str = "auto",
         voice_id: Optional[str] = None,  # ElevenLabs voice ID
+        auto_install: bool = True,  # pip install the ElevenLabs SDK if missing
+        model_dirs: Optional[Dict[str, str]] = None,  # Local weights per backend (offline)
+        phrase_cache_size: int = 256,  # Synthesized phrases kept in memory (0 = off)
+        phrase_cache_max_chars: int = 200,  # Only cache phrases up to this length
     ):
         self.voice_sample = voice_sample
         self.device = device
         self.voice_id = voice_id or "cgSgspJ2msm6clMCkdW9"  # Jessica
+        self.auto_install = auto_install
+        self.model_dirs = model_dirs or {}
+        self.phrase_cache_size = phrase_cache_size
+        self.phrase_cache_max_chars = phrase_cache_max_chars
+        self._phrase_cache: "OrderedDict[Tuple[str, str, str], np.ndarray]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.model = None
         self._backend = "mock"
         self._elevenlabs_client = None
@@ -40,17 +55,20 @@ class ChatterboxTTS:
                 logger.info("✅ ElevenLabs TTS ready")
                 return
             except ImportError:
-                logger.warning("ElevenLabs SDK not installed, trying pip install...")
-                try:
-                    import subprocess
-                    subprocess.check_call(["pip", "install", "elevenlabs", "-q"])
-                    from elevenlabs import ElevenLabs
-                    self._elevenlabs_client = ElevenLabs(api_key=elevenlabs_key)
-                    self._backend = "elevenlabs"
-                    logger.info("✅ ElevenLabs TTS ready (auto-installed)")
-                    return
-                except Exception as e:
-                    logger.warning(f"ElevenLabs auto-install failed: {e}")
+                if not self.auto_install:
+                    logger.warning("ElevenLabs SDK not installed (pip install elevenlabs)")
+                else:
+                    logger.warning("ElevenLabs SDK not installed, trying pip install...")
+                    try:
+                        import subprocess
+                        subprocess.check_call(["pip", "install", "elevenlabs", "-q"])
+                        from elevenlabs import ElevenLabs
+                        self._elevenlabs_client = ElevenLabs(api_key=elevenlabs_key)
+                        self._backend = "elevenlabs"
+                        logger.info("✅ ElevenLabs TTS ready (auto-installed)")
+                        return
+                    except Exception as e:
+                        logger.warning(f"ElevenLabs auto-install failed: {e}")
             except Exception as e:
                 logger.warning(f"ElevenLabs failed: {e}")
         
@@ -58,7 +76,10 @@ class ChatterboxTTS:
         try:
             from chatterbox.tts import ChatterboxTTS as CBModel
             logger.info("Loading Chatterbox TTS...")
-            self.model = CBModel.from_pretrained(device=self._get_device())
+            if "chatterbox" in self.model_dirs:
+                self.model = CBModel.from_local(self.model_dirs["chatterbox"], self._get_device())
+            else:
+                self.model = CBModel.from_pretrained(device=self._get_device())
             self._backend = "chatterbox"
             logger.info("✅ Chatterbox loaded")
             return
@@ -71,7 +92,14 @@ class ChatterboxTTS:
         try:
             from TTS.api import TTS
             logger.info("Loading Coqui XTTS...")
-            self.model = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
+            if "xtts" in self.model_dirs:
+                xtts_dir = self.model_dirs["xtts"]
+                self.model = TTS(
+                    model_path=xtts_dir,
+                    config_path=os.path.join(xtts_dir, "config.json"),
+                )
+            else:
+                self.model = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
             self._backend = "xtts"
             logger.info("✅ XTTS loaded")
             return
@@ -84,48 +112,116 @@ class ChatterboxTTS:
         logger.warning("⚠️ No TTS backend - using mock mode (silence)")
         self._backend = "mock"
     
+    @property
+    def sample_rate(self) -> int:
+        """Native output sample rate of the loaded backend."""
+        if self._backend == "chatterbox":
+            return getattr(self.model, "sr", 24000)
+        return 24000  # ElevenLabs pcm_24000, XTTS and mock
+    
+    def _cache_key(self, text: str) -> Optional[Tuple[str, str, str]]:
+        if not self.phrase_cache_size or len(text) > self.phrase_cache_max_chars:
+            return None
+        return (self._backend, self.voice_sample or self.voice_id, text)
+    
+    def _cache_get(self, text: str) -> Optional[np.ndarray]:
+        key = self._cache_key(text)
+        if key is None:
+            return None
+        audio = self._phrase_cache.get(key)
+        if audio is None:
+            self.cache_misses += 1
+            return None
+        self._phrase_cache.move_to_end(key)
+        self.cache_hits += 1
+        return audio
+    
+    def _cache_put(self, text: str, audio: np.ndarray):
+        key = self._cache_key(text)
+        if key is None or len(audio) == 0:
+            return
+        self._phrase_cache[key] = audio
+        self._phrase_cache.move_to_end(key)
+        while len(self._phrase_cache) > self.phrase_cache_size:
+            self._phrase_cache.popitem(last=False)
+    
     def _get_device(self) -> str:
-        if self.device != "auto":
-            return self.device
-        try:
-            import torch
-            if torch.cuda.is_available():
-                return "cuda"
-            elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-                return "mps"
-        except ImportError:
-            pass
-        return "cpu"
+        # Chatterbox imports torch anyway; CUDA is probed without it when possible
+        return torch_device(self.device)
+    
+    def warmup(self, text: str = "Hello, I'm ready."):
+        """Run a dummy synthesis so the first real sentence isn't slow."""
+        if self._backend == "elevenlabs":
+            # Cloud backend: nothing local to warm, and requests are billed
+            return
+        self._synthesize_sync(text)
     
     async def synthesize(self, text: str) -> np.ndarray:
         """Synthesize speech from text."""
+        cached = self._cache_get(text)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_event_loop()
+        audio = await loop.run_in_executor(None, self._synthesize_sync, text)
+        self._cache_put(text, audio)
+        return audio
+    
+    async def stream_audio(self, text: str) -> AsyncGenerator[np.ndarray, None]:
+        """
+        Stream synthesized audio as float32 chunks at `sample_rate`.
+        
+        ElevenLabs chunks arrive as they are generated; local backends
+        yield the whole utterance at once. Both go through the phrase cache.
+        """
+        cached = self._cache_get(text)
+        if cached is not None:
+            yield cached
+            return
+        
+        if self._backend != "elevenlabs":
+            loop = asyncio.get_event_loop()
+            audio = await loop.run_in_executor(None, self._synthesize_sync, text)
+            self._cache_put(text, audio)
+            yield audio
+            return
+        
+        chunks = []
+        remainder = b""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._synthesize_sync, text)
+        try:
+            audio_generator = self._elevenlabs_client.text_to_speech.convert(
+                voice_id=self.voice_id,
+                text=text,
+                model_id="eleven_turbo_v2_5",
+                output_format="pcm_24000",
+            )
+            # The SDK iterator blocks on the network; pull chunks off the event loop
+            while True:
+                chunk = await loop.run_in_executor(None, next, audio_generator, None)
+                if chunk is None:
+                    break
+                # Chunks can split a 16-bit sample
+                data = remainder + chunk
+                remainder = data[len(data) // 2 * 2:]
+                audio = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+                audio = audio.astype(np.float32) / 32768.0
+                chunks.append(audio)
+                yield audio
+        except Exception as e:
+            logger.error(f"ElevenLabs streaming error: {e}")
+            return
+        if chunks:
+            self._cache_put(text, np.concatenate(chunks))
     
     async def synthesize_stream(self, text: str) -> AsyncGenerator[bytes, None]:
         """
         Stream synthesized audio chunks.
         
         Yields:
-            Raw PCM audio chunks (24kHz, 16-bit)
+            Raw PCM audio chunks (16-bit, at `sample_rate`) for every backend
         """
-        if self._backend == "elevenlabs":
-            try:
-                # Use streaming API
-                audio_generator = self._elevenlabs_client.text_to_speech.convert(
-                    voice_id=self.voice_id,
-                    text=text,
-                    model_id="eleven_turbo_v2_5",
-                    output_format="pcm_24000",
-                )
-                for chunk in audio_generator:
-                    yield chunk
-            except Exception as e:
-                logger.error(f"ElevenLabs streaming error: {e}")
-        else:
-            # Non-streaming fallback
-            audio = await self.synthesize(text)
-            yield audio.tobytes()
+        async for audio in self.stream_audio(text):
+            yield encode_audio(audio, "pcm16")
     
     def _synthesize_sync(self, text: str) -> np.ndarray:
         """Synchronous synthesis."""
@@ -146,14 +242,14 @@ class ChatterboxTTS:
                 return audio_array.astype(np.float32) / 32768.0
             except Exception as e:
                 logger.error(f"ElevenLabs TTS error: {e}")
-                return np.zeros(16000, dtype=np.float32)  # 1 sec silence on error
+                return np.zeros(self.sample_rate, dtype=np.float32)  # 1 sec silence on error
         
         elif self._backend == "chatterbox":
             if self.voice_sample:
                 audio = self.model.generate(text, audio_prompt=self.voice_sample)
             else:
                 audio = self.model.generate(text)
-            return audio.cpu().numpy().astype(np.float32)
+            return audio.cpu().numpy().astype(np.float32).reshape(-1)
         
         elif self._backend == "xtts":
             if self.voice_sample:
@@ -165,5 +261,5 @@ class ChatterboxTTS:
         else:
             # Mock mode - return short silence
             logger.debug(f"Mock TTS: '{text[:50]}...'")
-            # 0.5 seconds of silence at 24kHz
-            return np.zeros(12000, dtype=np.float32)
+            # 0.5 seconds of silence
+            return np.zeros(self.sample_rate // 2, dtype=np.float32)
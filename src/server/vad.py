@@ -1,22 +1,158 @@
 """
 Voice Activity Detection module.
+
+Engines:
+- silero-onnx: Silero VAD via onnxruntime (no torch, single-threaded)
+- silero-torch: Silero VAD via torch.hub (original engine; only when asked
+  for by name, since it imports torch and may download the model)
+- energy: pure-numpy energy + spectral flatness fallback
+
+"auto" uses silero-onnx if the model file is there, else energy.
 """
 
+from pathlib import Path
 from typing import Optional
+
 import numpy as np
 from loguru import logger
 
+# Where scripts/download_models.py puts the ONNX model
+DEFAULT_ONNX_PATH = Path(__file__).resolve().parents[2] / "models" / "silero_vad.onnx"
+
+
+class SileroOnnx:
+    """Silero VAD (v4 or v5 ONNX export) run with onnxruntime."""
+
+    WINDOW = {16000: 512, 8000: 256}
+    CONTEXT = {16000: 64, 8000: 32}  # v5 expects the tail of the previous window
+
+    def __init__(self, model_path: str):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        options.log_severity_level = 3
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"],
+        )
+        inputs = {i.name for i in self.session.get_inputs()}
+        self._v5 = "state" in inputs
+
+    def speech_prob(self, audio: np.ndarray, sample_rate: int) -> float:
+        """Highest speech probability over all windows of `audio`."""
+        window = self.WINDOW[sample_rate]
+        context_size = self.CONTEXT[sample_rate] if self._v5 else 0
+        sr = np.array(sample_rate, dtype=np.int64)
+
+        # Pad to whole windows
+        if len(audio) % window:
+            audio = np.pad(audio, (0, window - len(audio) % window))
+        frames = audio.reshape(-1, window)
+
+        # Fresh state per call: the detector is shared between sessions
+        if self._v5:
+            state = np.zeros((2, 1, 128), dtype=np.float32)
+            context = np.zeros((1, context_size), dtype=np.float32)
+        else:
+            h = np.zeros((2, 1, 64), dtype=np.float32)
+            c = np.zeros((2, 1, 64), dtype=np.float32)
+
+        best = 0.0
+        for frame in frames:
+            x = frame[np.newaxis, :]
+            if self._v5:
+                x = np.concatenate([context, x], axis=1)
+                out, state = self.session.run(None, {"input": x, "state": state, "sr": sr})
+                context = x[:, -context_size:]
+            else:
+                out, h, c = self.session.run(None, {"input": x, "sr": sr, "h": h, "c": c})
+            best = max(best, float(out[0][0]))
+        return best
+
+
+def energy_speech(
+    audio: np.ndarray,
+    sample_rate: int = 16000,
+    min_db: float = -45.0,
+    max_flatness: float = 0.3,
+    min_frames: int = 2,
+) -> bool:
+    """
+    Cheap speech heuristic: loud enough frames with a non-flat spectrum.
+
+    Speech is harmonic (low spectral flatness); broadband noise is flat
+    (about 0.56 for Hann-windowed white noise). Most of the loud frames
+    must look voiced, so a few noisy frames don't tip it.
+    """
+    frame = 512 if sample_rate >= 16000 else 256
+    if len(audio) < frame:
+        # Clients stream short frames (20 ms = 320 samples): analyse one
+        # as a single, shorter frame rather than not at all
+        if len(audio) < frame // 4:
+            return False
+        frame = len(audio)
+    n = len(audio) // frame
+    frames = audio[: n * frame].reshape(n, frame).astype(np.float32)
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    loud = 20 * np.log10(rms + 1e-10) > min_db
+    if not loud.any():
+        return False
+
+    power = np.abs(np.fft.rfft(frames[loud] * np.hanning(frame), axis=1)) ** 2 + 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    voiced = int(np.count_nonzero(flatness < max_flatness))
+    return voiced >= min(min_frames, n) and voiced * 2 > int(np.count_nonzero(loud))
+
 
 class VoiceActivityDetector:
     """Voice Activity Detection."""
-    
-    def __init__(self, threshold: float = 0.5):
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        engine: str = "auto",  # auto, silero-onnx, silero-torch, energy
+        model_path: Optional[str] = None,
+    ):
         self.threshold = threshold
+        self.engine = engine
+        self.model_path = Path(model_path) if model_path else DEFAULT_ONNX_PATH
         self.model = None
+        self._backend = "none"
         self._load_model()
-    
+
     def _load_model(self):
         """Load VAD model."""
+        if self.engine in ("auto", "silero-onnx") and self._load_onnx():
+            return
+        if self.engine == "silero-torch" and self._load_torch():
+            return
+        if self.engine in ("auto", "energy", "silero-onnx"):
+            self._backend = "energy"
+            logger.info("✅ Energy VAD ready (numpy)")
+            return
+        logger.warning(f"VAD not available (engine={self.engine})")
+
+    def _load_onnx(self) -> bool:
+        if not self.model_path.exists():
+            logger.warning(
+                f"Silero ONNX model not found at {self.model_path}, using energy VAD "
+                f"(run: python scripts/download_models.py vad)"
+            )
+            return False
+        try:
+            self.model = SileroOnnx(str(self.model_path))
+            self._backend = "silero-onnx"
+            logger.info("✅ Silero VAD loaded (onnxruntime)")
+            return True
+        except ImportError:
+            logger.warning("onnxruntime not installed")
+        except Exception as e:
+            logger.warning(f"Silero ONNX failed: {e}")
+        return False
+
+    def _load_torch(self) -> bool:
         try:
             import torch
             model, utils = torch.hub.load(
@@ -26,20 +162,32 @@ class VoiceActivityDetector:
             )
             self.model = model
             self._get_speech_timestamps = utils[0]
+            self._backend = "silero-torch"
             logger.info("✅ Silero VAD loaded")
+            return True
         except Exception as e:
             logger.warning(f"VAD not available: {e}")
             self.model = None
-    
+            return False
+
+    def warmup(self):
+        """Run the model once on silence to initialize it."""
+        self.is_speech(np.zeros(512, dtype=np.float32))
+
     def is_speech(self, audio: np.ndarray, sample_rate: int = 16000) -> bool:
         """Check if audio contains speech."""
-        if self.model is None:
-            return True  # Assume speech if no VAD
         try:
-            import torch
-            audio_tensor = torch.from_numpy(audio).float()
-            speech_prob = self.model(audio_tensor, sample_rate).item()
-            return speech_prob > self.threshold
+            if self._backend == "silero-onnx" and sample_rate in SileroOnnx.WINDOW:
+                audio = audio.astype(np.float32, copy=False)
+                return self.model.speech_prob(audio, sample_rate) > self.threshold
+            if self._backend == "silero-torch":
+                import torch
+                audio_tensor = torch.from_numpy(audio).float()
+                speech_prob = self.model(audio_tensor, sample_rate).item()
+                return speech_prob > self.threshold
+            if self._backend in ("energy", "silero-onnx"):
+                return energy_speech(audio, sample_rate)
+            return True  # Assume speech if no VAD
         except Exception as e:
             logger.error(f"VAD error: {e}")
             return True
@@ -0,0 +1,85 @@
+"""
+Model warm-up and keep-warm.
+
+The first transcribe/synthesize after a load pays for lazy kernel init,
+allocations and graph setup. Warm-up runs representative dummy inputs
+through each component before it is reported ready; keep-warm repeats
+that periodically on instances that sit idle for long stretches.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from loguru import logger
+
+
+def warm_up(name: str, component: Any) -> Optional[float]:
+    """Run a component's warm-up pass. Returns seconds taken, or None if skipped."""
+    warmup = getattr(component, "warmup", None)
+    if warmup is None:
+        return None
+    started = time.monotonic()
+    try:
+        warmup()
+    except Exception as e:
+        logger.warning(f"Warm-up of {name} failed: {e}")
+        return None
+    elapsed = time.monotonic() - started
+    logger.info(f"🔥 {name} warmed up in {elapsed:.2f}s")
+    return elapsed
+
+
+def warmed(name: str, factory: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap a component factory so the instance is warmed before it's published."""
+    def build():
+        instance = factory()
+        warm_up(name, instance)
+        return instance
+    return build
+
+
+class KeepWarm:
+    """Re-run warm-ups after the server has been idle for `interval` seconds."""
+
+    def __init__(self, loader, names: Iterable[str], interval: float):
+        self.loader = loader
+        self.names = list(names)
+        self.interval = interval
+        self.last_activity = time.monotonic()
+        self.passes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self):
+        """Record session activity (real traffic keeps the models warm)."""
+        self.last_activity = time.monotonic()
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def warm_idle(self) -> bool:
+        """Warm every loaded component if we've been idle long enough."""
+        if time.monotonic() - self.last_activity < self.interval:
+            return False
+        loop = asyncio.get_event_loop()
+        for name in self.names:
+            component = self.loader.get(name)
+            if component is not None:
+                await loop.run_in_executor(None, warm_up, name, component)
+        self.passes += 1
+        self.touch()
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.warm_idle()
+            except Exception as e:
+                logger.warning(f"Keep-warm pass failed: {e}")
@@ -0,0 +1,560 @@
+"""
+Process-isolated model workers.
+
+Optional architecture where the STT and TTS models live in a small number of
+dedicated worker processes instead of inside every uvicorn worker:
+
+- Each model worker loads its model once and listens on a Unix socket
+- Front-end processes talk to workers over local IPC (multiprocessing.connection)
+- Audio travels through shared memory; only small control dicts are pickled
+  (streamed TTS chunks go inline, one message per chunk). The client names
+  every segment, so whichever side sees an exchange fail can unlink it
+
+Connections are always authenticated. The socket directory must belong to
+the current user and be closed to everyone else; unless
+OPENCLAW_MODEL_WORKER_AUTHKEY is set, the first process to use it writes a
+random key there (mode 0600) that the workers and front ends then share.
+
+Run standalone (recommended with several uvicorn workers):
+
+    python -m src.server.workers --stt 2 --tts 1
+
+or set OPENCLAW_STT_WORKERS / OPENCLAW_TTS_WORKERS and the first front-end
+process to start will spawn them.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import itertools
+import os
+import secrets
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from .warmup import warm_up
+
+
+def default_worker_dir() -> str:
+    """Per-user directory holding the worker sockets."""
+    return os.path.join(tempfile.gettempdir(), f"openclaw-voice-{os.getuid()}")
+
+
+def prepare_worker_dir(worker_dir: Optional[str] = None) -> str:
+    """
+    Create the socket directory, or check an existing one is ours alone.
+
+    The default path is predictable, so anyone could have created it first.
+    """
+    worker_dir = worker_dir or default_worker_dir()
+    os.makedirs(worker_dir, mode=0o700, exist_ok=True)
+    st = os.lstat(worker_dir)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(
+            f"Model worker directory {worker_dir} must be a directory owned by uid {os.getuid()} "
+            f"with no group/other access (found uid {st.st_uid}, mode {stat.S_IMODE(st.st_mode):o})"
+        )
+    return worker_dir
+
+
+def worker_authkey(worker_dir: Optional[str] = None) -> bytes:
+    """The shared key in the (verified) socket directory, created on first use."""
+    worker_dir = prepare_worker_dir(worker_dir)
+    path = os.path.join(worker_dir, "authkey")
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    # Write it under a temporary name, then link it into place: racing
+    # processes all end up reading whichever key got there first
+    fd, tmp = tempfile.mkstemp(dir=worker_dir)  # Mode 0600
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(tmp)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def worker_addresses(kind: str, count: int, worker_dir: Optional[str] = None) -> List[str]:
+    """Socket paths for `count` workers of the given kind ("stt" or "tts")."""
+    worker_dir = worker_dir or default_worker_dir()
+    return [os.path.join(worker_dir, f"{kind}-{i}.sock") for i in range(count)]
+
+
+# Shared memory helpers
+
+def _untrack(shm: SharedMemory):
+    """
+    Stop the resource tracker from unlinking a segment owned by another process.
+
+    Before Python 3.13 every attach registers the segment, so whichever
+    process exits first would destroy it under the other one.
+    """
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def put_shared(audio: np.ndarray, name: Optional[str] = None) -> SharedMemory:
+    """Copy an array into a fresh shared memory segment. Caller unlinks it."""
+    audio = np.ascontiguousarray(audio)
+    shm = SharedMemory(name=name, create=True, size=max(audio.nbytes, 1))
+    _untrack(shm)
+    np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)[:] = audio
+    return shm
+
+
+def take_shared(name: str, length: int, dtype: str, unlink: bool = False) -> np.ndarray:
+    """Copy an array out of a named shared memory segment."""
+    shm = SharedMemory(name=name)
+    _untrack(shm)
+    try:
+        return np.ndarray((length,), dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def release_shared(shm: SharedMemory):
+    """Close and unlink a segment created with put_shared()."""
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def unlink_shared(name: str):
+    """Unlink a named segment if it exists (a reply that will never be read)."""
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    _untrack(shm)
+    release_shared(shm)
+
+
+# Worker side
+
+def _build_model(kind: str, model_kwargs: Dict[str, Any]):
+    if kind == "stt":
+        from .stt import WhisperSTT
+        return WhisperSTT(**model_kwargs)
+    if kind == "tts":
+        from .tts import ChatterboxTTS
+        return ChatterboxTTS(**model_kwargs)
+    raise ValueError(f"Unknown worker kind: {kind}")
+
+
+def _iterate(stream: AsyncGenerator[bytes, None]) -> Iterator[bytes]:
+    """Drive an async generator from a worker thread, one chunk at a time."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
+
+
+def _handle_request(kind: str, model, request: Dict[str, Any]) -> Dict[str, Any]:
+    op = request.get("op")
+
+    if op == "ping":
+        return {
+            "ok": True,
+            "kind": kind,
+            "backend": model._backend,
+            "pid": os.getpid(),
+            "sample_rate": getattr(model, "sample_rate", None),
+        }
+
+    if kind == "stt" and op == "transcribe":
+        audio = take_shared(request["shm"], request["samples"], "float32")
+        return {"ok": True, "text": model._transcribe_sync(audio)}
+
+    if kind == "stt" and op == "transcribe_batched":
+        audio = take_shared(request["shm"], request["samples"], "float32")
+        return {"ok": True, "text": model._transcribe_batched_sync(audio, request["batch_size"])}
+
+    if kind == "tts" and op == "synthesize":
+        audio = model._synthesize_sync(request["text"])
+        # Named by the client, so it can unlink a segment whose reply it never read
+        shm = put_shared(audio.astype(np.float32, copy=False), name=request.get("shm"))
+        shm.close()
+        return {"ok": True, "shm": shm.name, "samples": len(audio), "dtype": "float32"}
+
+    return {"ok": False, "error": f"Unsupported op for {kind} worker: {op}"}
+
+
+def _serve_connection(kind: str, model, conn: Connection, model_lock: threading.Lock):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            # Requests waiting for the model count towards STT's busy routing
+            track = getattr(model, "track_request", None)
+            try:
+                # One inference at a time per worker process: scale with more workers
+                with track() if track else contextlib.nullcontext(), model_lock:
+                    if kind == "tts" and request.get("op") == "synthesize_stream":
+                        # Each chunk goes out as soon as it is synthesized
+                        for chunk in _iterate(model.synthesize_stream(request["text"])):
+                            conn.send({"ok": True, "chunk": chunk})
+                        response = {"ok": True, "done": True}
+                    else:
+                        response = _handle_request(kind, model, request)
+            except (EOFError, OSError):
+                return  # Client went away mid-stream
+            except Exception as e:
+                logger.error(f"{kind} worker error: {e}")
+                response = {"ok": False, "error": str(e)}
+            try:
+                conn.send(response)
+            except (EOFError, OSError):
+                if response.get("shm"):
+                    unlink_shared(response["shm"])  # The client is gone, nobody will
+                return
+
+
+def serve_worker(
+    kind: str,
+    address: str,
+    model_kwargs: Optional[Dict[str, Any]] = None,
+    authkey: Optional[bytes] = None,
+    warmup: bool = False,
+):
+    """Load a model and serve requests on a Unix socket until killed."""
+    authkey = authkey or worker_authkey(os.path.dirname(address))
+    model = _build_model(kind, model_kwargs or {})
+    if warmup:
+        warm_up(f"{kind} worker", model)
+
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    logger.info(f"✅ {kind} worker ready on {address} (pid={os.getpid()})")
+
+    model_lock = threading.Lock()
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f"{kind} worker rejected connection: {e}")
+                continue
+            threading.Thread(
+                target=_serve_connection,
+                args=(kind, model, conn, model_lock),
+                daemon=True,
+            ).start()
+    finally:
+        listener.close()
+
+
+def spawn_workers(
+    kind: str,
+    count: int,
+    worker_dir: Optional[str] = None,
+    model_kwargs: Optional[Dict[str, Any]] = None,
+    authkey: Optional[bytes] = None,
+    daemon: bool = True,
+    warmup: bool = False,
+) -> list:
+    """Start `count` worker processes (spawn context, so no inherited model state)."""
+    worker_dir = prepare_worker_dir(worker_dir)
+    authkey = authkey or worker_authkey(worker_dir)
+
+    ctx = get_context("spawn")
+    processes = []
+    for address in worker_addresses(kind, count, worker_dir):
+        proc = ctx.Process(
+            target=serve_worker,
+            args=(kind, address, model_kwargs, authkey, warmup),
+            name=f"openclaw-{kind}-worker",
+            daemon=daemon,
+        )
+        proc.start()
+        processes.append(proc)
+
+    logger.info(f"Started {count} {kind} worker(s) in {worker_dir}")
+    return processes
+
+
+# Front-end side
+
+class ModelWorkerPool:
+    """Client for a set of model workers of one kind."""
+
+    def __init__(self, addresses: List[str], authkey: Optional[bytes] = None):
+        self.addresses = addresses
+        self.authkey = authkey or worker_authkey(os.path.dirname(addresses[0]))
+        self.info: List[Dict[str, Any]] = []  # Latest ping replies
+        self._idle: Dict[str, List[Connection]] = {a: [] for a in addresses}
+        self._in_flight: Dict[str, int] = {a: 0 for a in addresses}
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+        # Pooled sockets must not be shared with forked children
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        self._lock = threading.Lock()
+        self._idle = {a: [] for a in self.addresses}
+        self._in_flight = {a: 0 for a in self.addresses}
+
+    def _pick_address(self) -> str:
+        # Least in-flight, round-robin among ties
+        with self._lock:
+            offset = next(self._rr)
+            n = len(self.addresses)
+            ordered = [self.addresses[(offset + i) % n] for i in range(n)]
+            address = min(ordered, key=lambda a: self._in_flight[a])
+            self._in_flight[address] += 1
+            return address
+
+    def _checkout(self, address: str) -> Connection:
+        with self._lock:
+            if self._idle[address]:
+                return self._idle[address].pop()
+        return Client(address, family="AF_UNIX", authkey=self.authkey)
+
+    def call_sync(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request to the least busy worker and wait for the reply."""
+        address = self._pick_address()
+        try:
+            conn = self._checkout(address)
+            try:
+                conn.send(request)
+                response = conn.recv()
+            except Exception:
+                conn.close()
+                raise
+            with self._lock:
+                self._idle[address].append(conn)
+        finally:
+            with self._lock:
+                self._in_flight[address] -= 1
+
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "model worker error"))
+        return response
+
+    async def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.call_sync, request)
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Send a streaming request and yield each reply until the worker is done."""
+        loop = asyncio.get_event_loop()
+        address = self._pick_address()
+        conn = None
+        done = False
+        try:
+            conn = await loop.run_in_executor(None, self._checkout, address)
+            conn.send(request)
+            while True:
+                response = await loop.run_in_executor(None, conn.recv)
+                if not response.get("ok"):
+                    done = True  # The worker ended the exchange
+                    raise RuntimeError(response.get("error", "model worker error"))
+                if response.get("done"):
+                    done = True
+                    return
+                yield response
+        finally:
+            if conn is not None:
+                if done:
+                    with self._lock:
+                        self._idle[address].append(conn)
+                else:
+                    conn.close()  # Replies still in flight: don't reuse it
+            with self._lock:
+                self._in_flight[address] -= 1
+
+    def ping_all(self) -> List[Dict[str, Any]]:
+        """Ping every worker once. Raises if any is unreachable."""
+        results = []
+        for address in self.addresses:
+            conn = Client(address, family="AF_UNIX", authkey=self.authkey)
+            with conn:
+                conn.send({"op": "ping"})
+                results.append(conn.recv())
+        self.info = results
+        return results
+
+    def wait_ready(self, timeout: float = 300.0) -> bool:
+        """Block until every worker answers a ping."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                self.ping_all()
+                return True
+            except (OSError, EOFError):
+                time.sleep(0.2)
+        return False
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+                conns.clear()
+
+    @classmethod
+    def connect_or_spawn(
+        cls,
+        kind: str,
+        count: int,
+        worker_dir: Optional[str] = None,
+        model_kwargs: Optional[Dict[str, Any]] = None,
+        authkey: Optional[bytes] = None,
+        timeout: float = 300.0,
+        warmup: bool = False,
+    ) -> "ModelWorkerPool":
+        """
+        Connect to running workers, spawning them if nobody has yet.
+
+        A file lock makes sure that only one front-end process spawns
+        workers when several uvicorn workers start at the same time.
+        """
+        worker_dir = prepare_worker_dir(worker_dir)
+        authkey = authkey or worker_authkey(worker_dir)
+        pool = cls(worker_addresses(kind, count, worker_dir), authkey=authkey)
+
+        with open(os.path.join(worker_dir, f"{kind}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                pool.ping_all()
+                logger.info(f"Connected to {count} running {kind} worker(s)")
+            except (OSError, EOFError):
+                spawn_workers(kind, count, worker_dir, model_kwargs, authkey, warmup=warmup)
+                if not pool.wait_ready(timeout):
+                    raise RuntimeError(f"{kind} workers did not start within {timeout}s")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        return pool
+
+
+class RemoteSTT:
+    """WhisperSTT-compatible proxy that transcribes in model worker processes."""
+
+    def __init__(self, pool: ModelWorkerPool):
+        self.pool = pool
+        self._backend = "remote"
+
+    async def _call(self, audio: np.ndarray, **request) -> str:
+        shm = put_shared(audio.astype(np.float32, copy=False))
+        try:
+            response = await self.pool.call({**request, "shm": shm.name, "samples": len(audio)})
+        finally:
+            release_shared(shm)
+        return response["text"]
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        """Transcribe audio to text."""
+        return await self._call(audio, op="transcribe")
+
+    async def transcribe_batched(self, audio: np.ndarray, batch_size: int = 8) -> str:
+        """Transcribe a long clip with batched inference."""
+        return await self._call(audio, op="transcribe_batched", batch_size=batch_size)
+
+
+class RemoteTTS:
+    """ChatterboxTTS-compatible proxy that synthesizes in model worker processes."""
+
+    def __init__(self, pool: ModelWorkerPool):
+        self.pool = pool
+        self._backend = "remote"
+        # Native output rate of the workers' backend, from the ping at connect time
+        info = pool.info or pool.ping_all()
+        self.sample_rate: int = info[0].get("sample_rate") or 24000
+
+    async def synthesize(self, text: str) -> np.ndarray:
+        """Synthesize speech from text."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._synthesize_sync, text)
+
+    def _synthesize_sync(self, text: str) -> np.ndarray:
+        """
+        The request and the copy out of shared memory run in one thread, so
+        the segment is unlinked even if the awaiting task is cancelled.
+        """
+        name = f"ocv-{secrets.token_hex(8)}"
+        try:
+            response = self.pool.call_sync({"op": "synthesize", "text": text, "shm": name})
+        except Exception:
+            unlink_shared(name)  # The worker may have created it before the exchange broke
+            raise
+        return take_shared(response["shm"], response["samples"], response["dtype"], unlink=True)
+
+    async def synthesize_stream(self, text: str) -> AsyncGenerator[bytes, None]:
+        """Synthesize in a worker and yield the same bytes the local backend would."""
+        stream = self.pool.stream({"op": "synthesize_stream", "text": text})
+        try:
+            async for response in stream:
+                yield response["chunk"]
+        finally:
+            await stream.aclose()  # Release the connection now if we stop early
+
+    async def stream_audio(self, text: str) -> AsyncGenerator[np.ndarray, None]:
+        """Synthesize in a worker and yield float32 audio at `sample_rate`."""
+        yield await self.synthesize(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run OpenClaw Voice model workers")
+    parser.add_argument("--stt", type=int, default=None, help="Number of STT workers")
+    parser.add_argument("--tts", type=int, default=None, help="Number of TTS workers")
+    parser.add_argument("--dir", default=None, help="Socket directory")
+    args = parser.parse_args()
+
+    from .main import settings, model_kwargs
+
+    stt_count = settings.stt_workers if args.stt is None else args.stt
+    tts_count = settings.tts_workers if args.tts is None else args.tts
+    worker_dir = args.dir or settings.model_worker_dir
+    authkey = settings.model_worker_authkey.encode() if settings.model_worker_authkey else None
+
+    processes = []
+    for kind, count in (("stt", stt_count), ("tts", tts_count)):
+        if count > 0:
+            processes += spawn_workers(
+                kind, count, worker_dir, model_kwargs(kind), authkey,
+                daemon=False, warmup=settings.warmup,
+            )
+
+    if not processes:
+        parser.error("No workers requested (use --stt/--tts or OPENCLAW_STT_WORKERS)")
+
+    for proc in processes:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
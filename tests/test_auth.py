@@ -4,11 +4,14 @@ Tests for authentication module.
 
 import pytest
 import os
+import sqlite3
 import sys
+import time
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from src.server.auth import TokenManager, APIKey, PRICING_TIERS
+from src.server.keystore import SQLiteKeyStore
 
 
 class TestTokenManager:
@@ -54,6 +57,17 @@ class TestTokenManager:
         # Should block after limit
         assert tm.check_rate_limit(api_key) is False
     
+    def test_rate_limit_refills(self):
+        """Test the bucket refills continuously, even under steady traffic."""
+        tm = TokenManager()
+        _, api_key = tm.generate_key("test", rate_limit=600)  # 10 per second
+        
+        assert all(tm.check_rate_limit(api_key) for _ in range(600))
+        assert tm.check_rate_limit(api_key) is False
+        time.sleep(0.25)
+        assert tm.check_rate_limit(api_key) is True
+        assert tm.check_rate_limit(api_key, cost=5) is False
+    
     def test_monthly_quota(self):
         """Test monthly quota checking."""
         tm = TokenManager()
@@ -123,6 +137,123 @@ class TestTokenManager:
         assert pro_key.monthly_minutes == 500
 
 
+class CountingStore(SQLiteKeyStore):
+    """SQLite store that counts lookups."""
+    
+    lookups = 0
+    
+    def get_by_hash(self, key_hash):
+        self.lookups += 1
+        return super().get_by_hash(key_hash)
+
+
+class TestSQLiteKeyStore:
+    """Tests for the persistent, shared key store."""
+    
+    def test_keys_survive_restart(self, tmp_path):
+        """Test keys created by one manager validate in a fresh one."""
+        path = str(tmp_path / "keys.db")
+        plaintext, api_key = TokenManager(SQLiteKeyStore(path)).generate_key("app", tier="pro", monthly_minutes=500)
+        
+        restored = TokenManager(SQLiteKeyStore(path)).validate_key(plaintext)
+        assert restored is not None
+        assert (restored.key_id, restored.tier, restored.monthly_minutes) == (api_key.key_id, "pro", 500)
+        assert restored.features == api_key.features
+        
+        with sqlite3.connect(path) as db:
+            assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert plaintext not in str(db.execute("SELECT * FROM api_keys").fetchall())
+    
+    def test_validation_is_cached(self, tmp_path):
+        """Test repeated validation doesn't read the store until the TTL passes."""
+        store = CountingStore(str(tmp_path / "keys.db"))
+        tm = TokenManager(store, cache_ttl=0.1)
+        plaintext, _ = tm.generate_key("app", rate_limit=2)
+        
+        first = tm.validate_key(plaintext)
+        for _ in range(100):
+            assert tm.validate_key(plaintext) is first
+            tm.validate_key("ocv_unknown")
+        assert store.lookups == 1  # The unknown key, once
+        
+        assert tm.check_rate_limit(first) and tm.check_rate_limit(first)
+        time.sleep(0.15)
+        assert tm.validate_key(plaintext) is first  # Refreshed in place...
+        assert store.lookups == 2
+        assert not tm.check_rate_limit(first)  # ...so the counters carry over
+    
+    def test_revocation_and_usage_propagate(self, tmp_path):
+        """Test another worker sees revocations and usage once its cache expires."""
+        path = str(tmp_path / "keys.db")
+        worker_a = TokenManager(SQLiteKeyStore(path), cache_ttl=0.1)
+        worker_b = TokenManager(SQLiteKeyStore(path), cache_ttl=0.1)
+        plaintext, api_key = worker_a.generate_key("app")
+        
+        key_b = worker_b.validate_key(plaintext)
+        worker_a.record_usage(worker_a.validate_key(plaintext), 2.5)
+        worker_b.record_usage(key_b, 1.0)
+        assert worker_a.revoke_key(api_key.key_id)
+        assert worker_a.validate_key(plaintext) is None
+        assert worker_b.validate_key(plaintext) is not None  # Still cached
+        
+        time.sleep(0.15)
+        assert worker_b.validate_key(plaintext) is None
+        assert key_b.minutes_used == 3.5
+        assert not worker_b.revoke_key("missing")
+    
+    def test_rate_limit_shared_between_workers(self, tmp_path):
+        """Test every worker draws from the same token bucket."""
+        path = str(tmp_path / "keys.db")
+        worker_a = TokenManager(SQLiteKeyStore(path))
+        worker_b = TokenManager(SQLiteKeyStore(path))
+        plaintext, _ = worker_a.generate_key("app", rate_limit=5)
+        key_a, key_b = worker_a.validate_key(plaintext), worker_b.validate_key(plaintext)
+        
+        assert all(worker_a.check_rate_limit(key_a) for _ in range(3))
+        assert all(worker_b.check_rate_limit(key_b) for _ in range(2))
+        assert not worker_a.check_rate_limit(key_a)
+        assert not worker_b.check_rate_limit(key_b)
+    
+    def test_workers_never_exceed_capacity_together(self, tmp_path):
+        """Test interleaved workers on one database admit at most the bucket's capacity."""
+        path = str(tmp_path / "keys.db")
+        workers = [TokenManager(SQLiteKeyStore(path)) for _ in range(3)]
+        plaintext, _ = workers[0].generate_key("app", rate_limit=30)
+        keys = [tm.validate_key(plaintext) for tm in workers]
+        
+        admitted = sum(tm.check_rate_limit(key) for _ in range(40) for tm, key in zip(workers, keys))
+        assert 28 <= admitted <= 30  # Leases left unspent are all that's missing
+        
+        # Closing returns unspent leases to the others
+        workers[0].store.close()
+        workers[1].store.close()
+        assert sum(workers[2].check_rate_limit(keys[2]) for _ in range(5)) == 30 - admitted
+    
+    def test_leased_tokens_never_wait_for_the_write_lock(self, tmp_path):
+        """Test leased tokens are spent while another process holds the write lock."""
+        path = str(tmp_path / "keys.db")
+        tm = TokenManager(SQLiteKeyStore(path))
+        plaintext, _ = tm.generate_key("app", rate_limit=100)
+        assert tm.check_rate_limit(tm.validate_key(plaintext))  # Leases 10 tokens
+        tm._cache.clear()
+        
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            start = time.monotonic()
+            for _ in range(9):
+                api_key = tm.validate_key(plaintext)
+                assert api_key is not None and tm.check_rate_limit(api_key)
+            assert time.monotonic() - start < 0.5
+            # A new lease gives up quickly instead of waiting out the lock
+            assert not tm.check_rate_limit(api_key)
+            assert time.monotonic() - start < 1.0
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
+        assert tm.check_rate_limit(api_key)
+
+
 class TestPricingTiers:
     """Test pricing tier configuration."""
     
@@ -0,0 +1,273 @@
+"""
+Tests for the hedged, failover LLM endpoint pool (against a local stub API).
+"""
+
+import pytest
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.server.backend import AIBackend
+from src.server.connections import ConnectionPool
+from src.server.endpoints import CircuitBreaker, Endpoint, EndpointPool
+
+
+def stub_app(counts: Counter):
+    """
+    OpenAI-compatible chat completions under /<behaviour>/v1:
+    /fast, /slow/<ms> (delay before the first token) and /fail (HTTP 500),
+    plus GET <base>/models for keep-alive pings.
+    """
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+
+    def chunk(text):
+        return "data: " + json.dumps({
+            "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+        }) + "\n\n"
+
+    async def respond(name: str, body: dict, delay: float = 0.0):
+        counts[name] += 1
+        reply = f"Hello from {name}."
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return JSONResponse({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            })
+
+        async def events():
+            await asyncio.sleep(delay)
+            for word in reply.split(" "):
+                yield chunk(word + " ")
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/fast/v1/chat/completions")
+    async def fast(body: dict):
+        return await respond("fast", body)
+
+    @app.post("/slow/{ms}/v1/chat/completions")
+    async def slow(ms: int, body: dict):
+        return await respond(f"slow{ms}", body, ms / 1000)
+
+    @app.get("/{base:path}/models")
+    async def models(base: str):
+        counts["models"] += 1
+        return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+    @app.post("/fail/v1/chat/completions")
+    async def fail(body: dict):
+        counts["fail"] += 1
+        return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+
+    return app
+
+
+@pytest.fixture(scope="module")
+def stub_llm():
+    """Run the stub API on a free local port."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    counts = Counter()
+    server = uvicorn.Server(uvicorn.Config(stub_app(counts), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{port}", counts
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def make_pool(base, paths, **kwargs):
+    breaker = kwargs.pop("breaker_failures", 3)
+    endpoints = [
+        Endpoint(f"{base}/{path}/v1", "stub", api_key="sk-stub", name=path,
+                 max_retries=0, breaker=CircuitBreaker(breaker, 30.0))
+        for path in paths
+    ]
+    return EndpointPool(endpoints, **kwargs)
+
+
+async def collect(pool):
+    return "".join([text async for text in pool.stream([{"role": "user", "content": "hi"}])])
+
+
+class TestCircuitBreaker:
+    """Tests for the per-endpoint circuit breaker."""
+
+    def test_opens_and_half_opens(self):
+        """Test N failures open the breaker until the cool-down passes."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.state == "half-open" and breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_half_open_allows_one_trial(self):
+        """Test half-open lets one request through until it reports back."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.allow()
+        assert not breaker.allow() and not breaker.available  # Trial in flight
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow() and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow()  # The unanswered trial expired
+
+
+class TestEndpointPool:
+    """Tests for hedging and failover across endpoints."""
+
+    def test_hedge_delay_percentile(self, stub_llm):
+        """Test the hedge deadline follows recent time-to-first-token."""
+        base, _ = stub_llm
+        pool = make_pool(base, ["fast", "fast"], hedge_delay=2.0, hedge_percentile=0.9)
+        endpoint = pool.endpoints[0]
+        assert pool.hedge_delay(endpoint) == 2.0  # Too few samples yet
+        endpoint.ttft.extend([0.3] * 9 + [1.0] * 11)
+        assert pool.hedge_delay(endpoint) == 1.0
+        assert make_pool(base, ["fast"], hedge_delay=0).hedge_delay(endpoint) is None
+
+    @pytest.mark.asyncio
+    async def test_stream(self, stub_llm):
+        """Test a single healthy endpoint streams its reply."""
+        base, _ = stub_llm
+        pool = make_pool(base, ["fast"])
+        assert (await collect(pool)).strip() == "Hello from fast."
+        assert pool.endpoints[0].wins == 1
+        assert len(pool.endpoints[0].ttft) == 1
+
+    @pytest.mark.asyncio
+    async def test_failover(self, stub_llm):
+        """Test a failing endpoint moves the request to the next one."""
+        base, _ = stub_llm
+        pool = make_pool(base, ["fail", "fast"])
+        assert (await collect(pool)).strip() == "Hello from fast."
+        assert pool.failovers == 1
+        assert pool.endpoints[0].failures == 1
+
+        assert await pool.complete([{"role": "user", "content": "hi"}]) == "Hello from fast."
+
+    @pytest.mark.asyncio
+    async def test_hedge_takes_faster_stream(self, stub_llm):
+        """Test a slow first token triggers a hedge whose stream wins."""
+        base, _ = stub_llm
+        pool = make_pool(base, ["slow/3000", "fast"], hedge_delay=0.2)
+        start = time.monotonic()
+        assert (await collect(pool)).strip() == "Hello from fast."
+        assert time.monotonic() - start < 2.0
+        assert pool.hedges == 1
+        assert pool.endpoints[1].wins == 1
+        assert pool.endpoints[0].failures == 0  # The loser was cancelled, not failed
+        # ...but its wait still counts, as a lower bound
+        assert len(pool.endpoints[0].ttft) == 1 and pool.endpoints[0].ttft[0] >= 0.2
+
+    @pytest.mark.asyncio
+    async def test_breaker_skips_failing_endpoint(self, stub_llm):
+        """Test an endpoint stops receiving requests once its breaker opens."""
+        base, counts = stub_llm
+        pool = make_pool(base, ["fail", "fast"], breaker_failures=2)
+        before = counts["fail"]
+        for _ in range(4):
+            assert (await collect(pool)).strip() == "Hello from fast."
+        assert counts["fail"] - before == 2
+        assert pool.stats()["endpoints"][0]["state"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_all_failing_raises(self, stub_llm):
+        """Test the last error surfaces when every endpoint fails."""
+        base, _ = stub_llm
+        pool = make_pool(base, ["fail", "fail"])
+        with pytest.raises(Exception):
+            await collect(pool)
+
+    @pytest.mark.asyncio
+    async def test_backend_uses_pool(self, stub_llm):
+        """Test AIBackend streams through fallback endpoints."""
+        base, _ = stub_llm
+        backend = AIBackend(
+            url=f"{base}/fail/v1",
+            model="stub",
+            api_key="sk-stub",
+            endpoints=[{"url": f"{base}/fast/v1", "name": "fast"}],
+        )
+        reply = "".join([c async for c in backend.chat_stream("hi")])
+        assert reply.strip() == "Hello from fast."
+        assert backend.conversation_history[-1]["content"] == reply
+
+
+class TestConnectionPool:
+    """Tests for the shared, pre-warmed LLM connection pool."""
+
+    @pytest.mark.asyncio
+    async def test_warm_then_reuse(self, stub_llm):
+        """Test warmed connections are reused by real requests."""
+        base, counts = stub_llm
+        connections = ConnectionPool(warm_connections=2, keepalive_interval=0)
+        connections.add_endpoint(f"{base}/fast/v1")
+        before = counts["models"]
+        await connections.warm()
+        assert counts["models"] - before == 2
+        assert connections.stats()["new_connections"] == 2
+
+        endpoint = Endpoint(f"{base}/fast/v1", "stub", api_key="sk-stub", http_client=connections.client)
+        pool = EndpointPool([endpoint])
+        for _ in range(3):
+            assert (await collect(pool)).strip() == "Hello from fast."
+        stats = connections.stats()
+        assert stats["new_connections"] == 2  # No handshakes on the critical path
+        assert stats["reused_connections"] == 3
+        await connections.close()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_pings_when_idle(self, stub_llm):
+        """Test idle endpoints are pinged periodically."""
+        base, _ = stub_llm
+        connections = ConnectionPool(warm_connections=1, keepalive_interval=0.1)
+        connections.add_endpoint(f"{base}/fast/v1")
+        connections.start()
+        await asyncio.sleep(0.45)
+        assert connections.stats()["pings"] >= 3
+        assert connections.stats()["ping_failures"] == 0
+        await connections.close()
+
+    @pytest.mark.asyncio
+    async def test_backend_shares_one_pool(self, stub_llm):
+        """Test every endpoint of a backend goes through the shared pool."""
+        base, _ = stub_llm
+        backend = AIBackend(
+            url=f"{base}/fail/v1",
+            model="stub",
+            api_key="sk-stub",
+            endpoints=[{"url": f"{base}/fast/v1"}],
+            warm_connections=1,
+        )
+        await backend.connections.warm()
+        assert backend.connections.stats()["new_connections"] == 2  # One per endpoint
+        "".join([c async for c in backend.chat_stream("hi")])
+        stats = backend.connections.stats()
+        assert stats["new_connections"] == 2
+        assert stats["reused_connections"] == 2  # The failed request and the fallback
+        await backend.connections.close()
@@ -5,16 +5,29 @@ Unit tests for OpenClaw Voice modules.
 import pytest
 import numpy as np
 import asyncio
+import json
 import os
 import sys
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.server.stt import WhisperSTT
+from src.server.stt import WhisperSTT, STT_PROFILES, model_memory_mb, resolve_profile
 from src.server.tts import ChatterboxTTS
 from src.server.backend import AIBackend
-from src.server.vad import VoiceActivityDetector
+from src.server.budget import SpeechBudget
+from src.server.cache import ResponseCache, normalize_utterance
+from src.server.context import ContextWindow, estimate_tokens, message_tokens
+from src.server.speculation import Speculator, speculation_stats
+from src.server.transport import SLOW_CLIENT_CLOSE_CODE, SessionSender, dumps
+from src.server.vad import VoiceActivityDetector, DEFAULT_ONNX_PATH
+from src.server.audio import (
+    AudioInput, AudioOutput, OpusEncoder, Resampler, decode_audio, encode_audio, resample,
+    unframe_packets, wav_header,
+)
+from src.server.loader import ModelLoader
+from starlette.websockets import WebSocketDisconnect
+from src.server.warmup import KeepWarm
 
 
 class TestWhisperSTT:
@@ -35,6 +48,11 @@ class TestWhisperSTT:
         result = await stt.transcribe(audio)
         assert isinstance(result, str)
     
+    def test_warmup(self):
+        """Test warm-up runs a dummy transcription."""
+        stt = WhisperSTT(model_name="tiny", device="cpu")
+        stt.warmup(seconds=0.5)
+    
     @pytest.mark.asyncio
     async def test_transcribe_with_noise(self):
         """Test transcription with random noise (should return something)."""
@@ -44,6 +62,265 @@ class TestWhisperSTT:
         result = await stt.transcribe(audio)
         assert isinstance(result, str)
 
+    def test_routes_by_duration_and_load(self):
+        """Test short utterances and busy periods use the smallest model."""
+        stt = WhisperSTT(model_name="large-v3-turbo", device="cpu", models=["tiny"])
+        assert stt.fast_model == "tiny"
+        assert stt.route(1.0, queue_depth=0) == "tiny"
+        assert stt.route(5.0, queue_depth=0) == "large-v3-turbo"
+        assert stt.route(5.0, queue_depth=2) == "tiny"
+
+        stt._transcribe_sync(np.zeros(8000, dtype=np.float32))
+        assert stt.route_counts["tiny"] == 1
+
+    def test_busy_route_counts_tracked_requests(self):
+        """Test requests queued in a model worker count towards busy routing."""
+        stt = WhisperSTT(model_name="large-v3-turbo", device="cpu", models=["tiny"])
+        with stt.track_request():
+            assert stt.route(5.0) == "large-v3-turbo"  # Only itself in flight
+            with stt.track_request(), stt.track_request():
+                assert stt.route(5.0) == "tiny"
+        assert stt._pending == 0
+
+    @pytest.mark.asyncio
+    async def test_batched_requests_are_tracked_and_counted(self):
+        """Test batched transcriptions count towards busy routing and route_counts."""
+        from concurrent.futures import ThreadPoolExecutor
+        stt = WhisperSTT(model_name="base", device="cpu", models=["tiny"])
+        batched_sync = stt._transcribe_batched_sync
+        seen = []
+
+        def batched(audio, batch_size):
+            seen.append(stt._pending)
+            return batched_sync(audio, batch_size)
+
+        stt._transcribe_batched_sync = batched
+        await stt.transcribe_batched(np.zeros(16000 * 30, dtype=np.float32))
+        assert seen == [1] and stt._pending == 0
+
+        # Counted under the lock from many threads at once
+        audio = np.zeros(16000, dtype=np.float32)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: stt._transcribe_sync(audio, "base"), range(400)))
+        assert stt.route_counts["base"] == 401
+
+    def test_cold_load_does_not_hold_lock(self):
+        """Test loading a model doesn't block requests for resident ones."""
+        import threading
+        stt = WhisperSTT(model_name="base", device="cpu", models=["tiny"], memory_budget_mb=10000)
+        stt._models.pop("tiny")
+        loading, finish = threading.Event(), threading.Event()
+        load_one = stt._load_one
+
+        def slow_load(name):
+            loading.set()
+            assert finish.wait(5)
+            return load_one(name)
+
+        stt._load_one = slow_load
+        loader = threading.Thread(target=stt._acquire, args=("tiny", True))
+        loader.start()
+        try:
+            assert loading.wait(5)
+            assert stt._acquire("base", release=True)[0] == "base"  # Not stuck behind tiny
+            assert stt._resident_mb() >= model_memory_mb("tiny")  # Reserved while loading
+        finally:
+            finish.set()
+            loader.join(5)
+        assert "tiny" in stt.loaded_models and not stt._loading
+
+    def test_single_model_never_reroutes(self):
+        """Test the default single-model setup always uses stt_model."""
+        stt = WhisperSTT(model_name="base", device="cpu")
+        assert stt.route(0.5, queue_depth=10) == "base"
+
+    def test_memory_budget_evicts_idle_models(self):
+        """Test extra models are evicted LRU but the primary model stays."""
+        stt = WhisperSTT(
+            model_name="base", device="cpu",
+            models=["tiny", "small"], memory_budget_mb=650,
+        )
+        assert "base" in stt.loaded_models
+        assert "tiny" not in stt.loaded_models  # Evicted to fit small
+        assert stt.evictions == 1
+
+        # Reloading tiny evicts small
+        assert stt._acquire("tiny", release=True)[0] == "tiny"
+        assert stt.loaded_models == ["base", "tiny"]
+        # Nothing fits beside base: fall back to the primary model
+        stt.memory_budget_mb = 200
+        assert stt._acquire("small", release=True)[0] == "base"
+        
+        # ...and only warn about it once per model
+        from loguru import logger
+        warnings = []
+        sink = logger.add(lambda m: warnings.append(m), level="WARNING")
+        try:
+            for _ in range(3):
+                stt._acquire("small", release=True)
+        finally:
+            logger.remove(sink)
+        assert warnings == []
+
+    def test_profiles(self):
+        """Test profiles trade beam search for greedy decoding."""
+        assert STT_PROFILES["latency"].beam_size == 1
+        assert STT_PROFILES["accuracy"].beam_size == 5
+        options = STT_PROFILES["balanced"].decode_options()
+        assert options["temperature"][0] == 0.0
+        assert "cpu_threads" not in options
+
+        profile = resolve_profile("latency", beam_size=2, cpu_threads=None)
+        assert profile.beam_size == 2 and profile.cpu_threads == 0
+        with pytest.raises(ValueError):
+            resolve_profile("nonexistent")
+
+        stt = WhisperSTT(model_name="tiny", device="cpu", profile="accuracy")
+        assert stt.profile == STT_PROFILES["accuracy"]
+        
+        # The default keeps the pre-profile beam search decode
+        from src.server.main import Settings
+        assert resolve_profile(Settings().stt_profile).beam_size == 5
+
+
+class TestAudio:
+    """Tests for audio decoding helpers."""
+    
+    def test_decode_wav_resamples_to_mono_16k(self, tmp_path):
+        """Test stereo 8kHz WAV decodes to 16kHz mono float32."""
+        import wave
+        path = tmp_path / "clip.wav"
+        stereo = np.full((8000, 2), 16384, dtype=np.int16)
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(stereo.tobytes())
+        
+        audio = decode_audio(str(path))
+        assert audio.dtype == np.float32
+        assert len(audio) == 16000
+        assert np.allclose(audio, 0.5)
+    
+    def test_decode_rejects_garbage(self, tmp_path):
+        """Test undecodable input raises ValueError."""
+        path = tmp_path / "notes.txt"
+        path.write_bytes(b"not audio")
+        with pytest.raises(ValueError):
+            decode_audio(str(path))
+    
+    def test_resample_length(self):
+        """Test resampling scales the sample count."""
+        assert len(resample(np.zeros(24000, dtype=np.float32), 24000, 16000)) == 16000
+    
+    def test_streaming_resampler_matches_one_shot(self):
+        """Test chunked resampling is continuous across chunk boundaries."""
+        audio = np.sin(np.arange(24000) / 24000 * 2 * np.pi * 5).astype(np.float32)
+        resampler = Resampler(24000, 16000)
+        out = np.concatenate([resampler.process(c) for c in np.array_split(audio, 7)])
+        assert abs(len(out) - 16000) <= 1
+        assert np.abs(out[:15000] - resample(audio, 24000, 16000)[:15000]).max() < 1e-2
+    
+    def test_encode_and_wav_header(self):
+        """Test PCM encodings and that the WAV header parses."""
+        import io
+        import wave
+        audio = np.array([0.0, 0.5, -1.0, 2.0], dtype=np.float32)
+        assert np.frombuffer(encode_audio(audio, "pcm16"), dtype="<i2").tolist() == [0, 16383, -32767, 32767]
+        assert np.frombuffer(encode_audio(audio, "f32"), dtype="<f4").tolist() == audio.tolist()
+        
+        data = encode_audio(audio, "pcm16")
+        with wave.open(io.BytesIO(wav_header(22050, data_size=len(data)) + data)) as f:
+            assert f.getframerate() == 22050
+            assert f.getnframes() == 4
+    
+    def test_audio_output_stage(self):
+        """Test the session output stage converts and labels audio."""
+        audio = np.zeros(24000, dtype=np.float32)
+        
+        pcm16 = AudioOutput(24000)
+        assert (pcm16.format, pcm16.sample_rate) == ("pcm16", 24000)
+        assert len(pcm16.encode(audio)) == 48000  # Half the bytes of float32
+        
+        f32 = AudioOutput(24000, fmt="f32", sample_rate=16000)
+        assert abs(len(f32.encode(audio)) - 16000 * 4) <= 4
+        
+        with pytest.raises(ValueError):
+            AudioOutput(24000, fmt="mp3")
+        with pytest.raises(ValueError):
+            AudioOutput(24000, sample_rate=1000)
+    
+    def test_opus_encoder(self):
+        """Test Opus emits one packet per full frame and decodes back."""
+        av = pytest.importorskip("av")
+        t = np.arange(24000) / 24000
+        tone = (np.sin(2 * np.pi * 220 * t) * 0.3).astype(np.float32)
+        
+        encoder = OpusEncoder(sample_rate=24000, bitrate=24000, frame_ms=20)
+        packets = encoder.encode(tone[:1000])  # Two full 480-sample frames
+        assert len(packets) == 2
+        packets += encoder.encode(tone[1000:]) + encoder.flush()
+        assert len(packets) == 50
+        
+        decoder = av.CodecContext.create("opus", "r")
+        decoder.sample_rate = 24000
+        decoder.layout = "mono"
+        decoded = sum(f.samples for p in packets for f in decoder.decode(av.Packet(p)))
+        assert decoded > 0
+    
+    def test_opus_output_cuts_bandwidth(self):
+        """Test the opus output stage is an order of magnitude below pcm16."""
+        pytest.importorskip("av")
+        audio = (np.random.default_rng(0).standard_normal(24000) * 0.1).astype(np.float32)
+        
+        opus = AudioOutput(24000, fmt="opus")
+        data = opus.encode(audio) + opus.flush()
+        assert len(unframe_packets(data)) == 50
+        assert len(data) * 10 < len(AudioOutput(24000).encode(audio))
+        
+        # Non-Opus rates are raised to the next one Opus supports
+        assert AudioOutput(24000, fmt="opus", sample_rate=22050).sample_rate == 24000
+    
+    def test_audio_input_pcm(self):
+        """Test int16 and float32 uplink decode to 16kHz float32."""
+        pcm16 = AudioInput("pcm16")
+        audio = pcm16.feed(np.array([0, 16384, -32768], dtype="<i2").tobytes())
+        assert audio.dtype == np.float32
+        assert audio.tolist() == [0.0, 0.5, -1.0]
+        
+        f32 = AudioInput("f32", sample_rate=48000)
+        assert abs(len(f32.feed(np.zeros(4800, dtype="<f4").tobytes())) - 1600) <= 1
+        
+        with pytest.raises(ValueError):
+            AudioInput("mp3")
+    
+    @pytest.mark.parametrize("container", ["webm", "ogg"])
+    def test_audio_input_streams_container(self, container):
+        """Test MediaRecorder-style Opus containers decode as bytes arrive."""
+        import io
+        av = pytest.importorskip("av")
+        
+        buf = io.BytesIO()
+        with av.open(buf, mode="w", format=container) as out:
+            stream = out.add_stream("libopus", rate=48000)
+            stream.layout = "mono"
+            tone = (np.sin(np.arange(96000) / 48000 * 2 * np.pi * 220) * 0.3).astype(np.float32)
+            for i in range(0, len(tone), 960):
+                frame = av.AudioFrame.from_ndarray(tone[i:i + 960].reshape(1, -1), format="flt", layout="mono")
+                frame.sample_rate = 48000
+                frame.pts = i
+                for packet in stream.encode(frame):
+                    out.mux(packet)
+            for packet in stream.encode(None):
+                out.mux(packet)
+        data = buf.getvalue()
+        
+        audio_input = AudioInput(container)
+        decoded = [audio_input.feed(data[i:i + 1000]) for i in range(0, len(data), 1000)]
+        decoded.append(audio_input.finish())
+        total = sum(len(chunk) for chunk in decoded)
+        assert abs(total - 32000) < 1000  # 2 seconds at 16kHz
+
 
 class TestChatterboxTTS:
     """Tests for Text-to-Speech module."""
@@ -62,6 +339,40 @@ class TestChatterboxTTS:
         assert isinstance(result, np.ndarray)
         assert result.dtype == np.float32
         assert len(result) > 0
+    
+    def test_warmup(self):
+        """Test warm-up runs without error."""
+        tts = ChatterboxTTS()
+        tts.warmup()
+    
+    @pytest.mark.asyncio
+    async def test_synthesize_stream_is_int16(self):
+        """Test every backend streams 16-bit PCM at its sample rate."""
+        tts = ChatterboxTTS()
+        data = b"".join([chunk async for chunk in tts.synthesize_stream("Hello world")])
+        audio = await tts.synthesize("Hello world")
+        assert len(data) == len(audio) * 2
+    
+    @pytest.mark.asyncio
+    async def test_phrase_cache(self):
+        """Test repeated short phrases are served from the cache."""
+        tts = ChatterboxTTS(phrase_cache_size=1)
+        first = await tts.synthesize("One moment.")
+        assert await tts.synthesize("One moment.") is first
+        assert tts.cache_hits == 1
+        
+        await tts.synthesize("Something else.")  # Evicts the first phrase
+        await tts.synthesize("One moment.")
+        assert tts.cache_hits == 1
+    
+    @pytest.mark.asyncio
+    async def test_stream_audio(self):
+        """Test streamed chunks are float32 at the native sample rate."""
+        tts = ChatterboxTTS()
+        chunks = [chunk async for chunk in tts.stream_audio("Hello world")]
+        assert tts.sample_rate == 24000
+        assert all(chunk.dtype == np.float32 for chunk in chunks)
+        assert sum(len(chunk) for chunk in chunks) > 0
 
 
 class TestAIBackend:
@@ -106,6 +417,526 @@ class TestAIBackend:
         assert len(result) > 0
 
 
+class TestContextWindow:
+    """Tests for the token-budgeted context window."""
+    
+    @staticmethod
+    def history(turns, words=50):
+        return [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+            for i in range(turns)
+        ]
+    
+    def test_estimate_tokens(self):
+        """Test the local token estimate."""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("hello") >= 1
+        assert 200 <= estimate_tokens("word " * 200) <= 300
+    
+    def test_build_fits_budget(self):
+        """Test only the newest turns that fit are sent."""
+        context = ContextWindow(max_tokens=300)
+        history = self.history(20)
+        messages = context.build("You are helpful.", history)
+        
+        assert messages[0]["role"] == "system"
+        assert messages[-1] is history[-1]
+        assert len(messages) < len(history)
+        assert sum(message_tokens(m) for m in messages) <= 300
+        
+        stats = context.stats()
+        assert stats["turns"] == 1
+        assert stats["last_prompt_tokens"] == sum(message_tokens(m) for m in messages)
+        assert stats["saved_tokens_total"] > 0
+    
+    def test_latest_message_always_sent(self):
+        """Test an over-budget message is still sent."""
+        context = ContextWindow(max_tokens=10)
+        messages = context.build("System.", self.history(1, words=500))
+        assert len(messages) == 2
+    
+    @pytest.mark.asyncio
+    async def test_compaction_summarizes_old_turns(self):
+        """Test old turns are folded into the summary in the background."""
+        calls = []
+        
+        async def summarize(summary, turns):
+            calls.append(len(turns))
+            return "User and assistant talked about words."
+        
+        context = ContextWindow(max_tokens=300, summary_tokens=50, summarize=summarize)
+        history = self.history(12)
+        context.maybe_compact("System.", history)
+        await context._task
+        
+        assert calls and len(history) == 12 - calls[0]
+        assert len(history) >= 2
+        assert context.summary.startswith("User and assistant")
+        messages = context.build("System.", history)
+        assert messages[1]["content"].endswith(context.summary)
+        assert context.stats()["summaries"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_long_system_prompt_no_turn_dropped_unsummarized(self):
+        """Test compaction budgets the system prompt, so build() only leaves out summarized turns."""
+        summarized = []
+        
+        async def summarize(summary, turns):
+            summarized.extend(turns)
+            return "Words were exchanged."
+        
+        system_prompt = "Be helpful and brief. " * 40  # ~200 tokens of a 600 budget
+        context = ContextWindow(max_tokens=600, summary_tokens=50, summarize=summarize)
+        history = []
+        for turn in self.history(30, words=20):
+            history.append(turn)
+            # Everything not yet summarized is still sent
+            assert context.build(system_prompt, history)[-len(history):] == history
+            context.maybe_compact(system_prompt, history)
+            if context._task:
+                await context._task
+        assert summarized
+    
+    @pytest.mark.asyncio
+    async def test_compaction_without_summarizer_drops(self):
+        """Test compaction still bounds history when nothing can summarize."""
+        context = ContextWindow(max_tokens=300)
+        history = self.history(12)
+        await context.compact("System.", history)
+        assert 2 <= len(history) < 12
+        assert context.summary == ""
+    
+    @pytest.mark.asyncio
+    async def test_cleared_history_not_truncated(self):
+        """Test a history cleared mid-summary is left alone."""
+        async def summarize(summary, turns):
+            history.clear()
+            history.extend(TestContextWindow.history(12))
+            return "stale"
+        
+        context = ContextWindow(max_tokens=300, summarize=summarize)
+        history = self.history(12)
+        await context.compact("System.", history)
+        assert len(history) == 12
+        assert context.summary == ""
+    
+    def test_backend_clear_resets_summary(self):
+        """Test clearing the backend forgets the summary too."""
+        backend = AIBackend(context_tokens=500)
+        assert backend.context.max_tokens == 500
+        backend.context.summary = "old"
+        backend.clear_history()
+        assert backend.context.summary == ""
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, streaming a fixed reply."""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+        self.kwargs = {}
+        self.streamed = 0  # Chunks actually pulled from the stream
+    
+    async def create(self, **kwargs):
+        from types import SimpleNamespace
+        self.calls += 1
+        self.kwargs = kwargs
+        
+        async def stream():
+            for text in self.chunks:
+                self.streamed += 1
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        return stream()
+
+
+class TestResponseCache:
+    """Tests for the repeated-utterance response cache."""
+    
+    def test_normalize(self):
+        """Test case, punctuation and spacing are ignored."""
+        assert normalize_utterance("  What time is it?") == normalize_utterance("what time  is it")
+        assert normalize_utterance("Don't stop!") == "don't stop"
+    
+    def test_hit_miss_and_context(self):
+        """Test keys depend on utterance, system prompt and recent context."""
+        cache = ResponseCache(max_entries=4)
+        key = cache.key("Thanks!", "system", [])
+        assert cache.get(key) is None
+        cache.put(key, ["You're ", "welcome."])
+        
+        assert cache.get(cache.key("thanks", "system", [])) == ["You're ", "welcome."]
+        assert cache.get(cache.key("thanks", "other system", [])) is None
+        history = [{"role": "assistant", "content": "Shall I book it?"}]
+        assert cache.get(cache.key("thanks", "system", history)) is None
+        assert cache.stats()["hits"] == 1
+        
+        assert cache.key("word " * 50, "system", []) is None  # Too long to cache
+        assert ResponseCache(max_entries=0).key("thanks", "system", []) is None
+    
+    def test_ttl_and_lru(self):
+        """Test expired and least recently used entries are dropped."""
+        cache = ResponseCache(max_entries=2, ttl=-1)
+        key = cache.key("stop", "s", [])
+        cache.put(key, ["Stopping."])
+        assert cache.get(key) is None
+        
+        cache = ResponseCache(max_entries=2)
+        keys = [cache.key(word, "s", []) for word in ("one", "two", "three")]
+        cache.put(keys[0], ["1"])
+        cache.put(keys[1], ["2"])
+        cache.get(keys[0])
+        cache.put(keys[2], ["3"])
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == ["1"]
+    
+    @pytest.mark.asyncio
+    async def test_backend_replays_cached_chunks(self):
+        """Test a repeated utterance skips the LLM but streams the same chunks."""
+        backend = AIBackend(api_key="sk-test", response_cache=ResponseCache())
+        backend._client.chat.completions = fake = FakeCompletions(["It's ", "noon."])
+        
+        first = [c async for c in backend.chat_stream("What time is it?")]
+        backend.conversation_history.clear()
+        second = [c async for c in backend.chat_stream("what time is it")]
+        assert first == second == ["It's ", "noon."]
+        assert fake.calls == 1
+        assert backend.conversation_history[-1]["content"] == "It's noon."
+        
+        backend.conversation_history.clear()
+        [c async for c in backend.chat_stream("what time is it", use_cache=False)]
+        assert fake.calls == 2
+
+
+class TestSpeculation:
+    """Tests for speculative responses on stable partial transcripts."""
+    
+    @staticmethod
+    def speculator(partials, reply=("Sure, ", "done.")):
+        partials = list(partials)
+        started = []
+        
+        async def transcribe(audio):
+            return partials.pop(0)
+        
+        async def start_stream(text):
+            started.append(text)
+            for chunk in reply:
+                yield chunk
+        
+        return Speculator(transcribe, start_stream, interval=0.5, stable_seconds=0.5), started
+    
+    @staticmethod
+    async def feed(speculator, seconds):
+        buffer = []
+        for _ in range(int(seconds / 0.5)):
+            buffer.append(np.zeros(8000, dtype=np.float32))
+            speculator.update(buffer, 8000)
+            await speculator._task
+    
+    @pytest.mark.asyncio
+    async def test_stable_partial_is_committed(self):
+        """Test a partial unchanged over the stable window is used at the end."""
+        speculator, started = self.speculator(["Turn on", "Turn on the lights.", "turn on the lights"])
+        before = speculation_stats.committed
+        await self.feed(speculator, 1.5)
+        assert started == ["turn on the lights"]
+        
+        speculation = speculator.take("Turn on the lights!")
+        assert speculation is not None
+        assert [c async for c in speculation.stream()] == ["Sure, ", "done."]
+        assert speculation_stats.committed == before + 1
+    
+    @pytest.mark.asyncio
+    async def test_mismatch_is_discarded(self):
+        """Test a speculation that doesn't match the final transcript is wasted."""
+        speculator, started = self.speculator(["Play jazz", "play jazz"])
+        before = speculation_stats.stats()
+        await self.feed(speculator, 1.0)
+        assert started
+        await asyncio.sleep(0)  # Let the speculative stream produce something
+        
+        assert speculator.take("Play jazz in the kitchen") is None
+        after = speculation_stats.stats()
+        assert after["discarded"] == before["discarded"] + 1
+        assert after["wasted_tokens"] > before["wasted_tokens"]
+    
+    @pytest.mark.asyncio
+    async def test_diverging_partial_restarts(self):
+        """Test a speculation is dropped when the user keeps talking."""
+        speculator, started = self.speculator(["Call mom", "call mom", "Call mom tonight", "call mom tonight"])
+        await self.feed(speculator, 2.0)
+        assert started == ["call mom", "call mom tonight"]
+        assert speculator.take("Call mom tonight.") is not None
+    
+    @pytest.mark.asyncio
+    async def test_partials_stop_after_max_seconds(self):
+        """Test long turns aren't re-transcribed over and over."""
+        calls = []
+        
+        async def transcribe(audio):
+            calls.append(len(audio))
+            return f"still talking {len(calls)}"
+        
+        speculator = Speculator(transcribe, None, interval=0.5, max_seconds=2.0)
+        buffer = []
+        for _ in range(20):  # 10 s
+            buffer.append(np.zeros(8000, dtype=np.float32))
+            speculator.update(buffer, 8000)
+            if speculator._task:
+                await speculator._task
+        assert len(calls) == 4 and max(calls) <= 32000
+    
+    @pytest.mark.asyncio
+    async def test_unrecorded_stream_leaves_history(self):
+        """Test speculative backend streams only enter history when recorded."""
+        backend = AIBackend(api_key="sk-test")
+        backend._client.chat.completions = FakeCompletions(["Okay."])
+        reply = "".join([c async for c in backend.chat_stream("hello", record=False)])
+        assert reply == "Okay."
+        assert backend.conversation_history == []
+        assert backend.context.turns == 0  # Not in the prompt metrics until it is used
+        backend.record_turn("hello", reply, measure_prompt=True)
+        assert [m["role"] for m in backend.conversation_history] == ["user", "assistant"]
+        assert backend.context.turns == 1
+
+
+class TestSpeechBudget:
+    """Tests for the spoken-length response budget."""
+    
+    def test_max_tokens(self):
+        """Test max_tokens follows the target duration, with headroom."""
+        assert SpeechBudget(max_seconds=0).max_tokens == 500
+        budget = SpeechBudget(max_seconds=30, wpm=150)
+        assert 75 * 4 / 3 < budget.max_tokens <= 75 * 2  # 75 words
+    
+    def test_cut_at_sentence_boundary(self):
+        """Test text is cut at the first sentence that reaches the budget."""
+        budget = SpeechBudget(max_seconds=2, wpm=150)  # 5 words
+        text = "One two three. Four five six. Seven eight."
+        assert text[:budget.cut(text)] == "One two three. Four five six."
+        assert budget.cut("One two three four five six") is None  # No boundary yet
+        assert budget.cut("Pi is 3.14159 and e is 2.71828 roughly") is None
+        assert SpeechBudget(max_seconds=0).cut(text) is None
+        # Code blocks aren't read out, so they don't count
+        code = "```a b c d e f```. Ok then. Done now."
+        assert code[:budget.cut(code)] == "```a b c d e f```. Ok then."
+    
+    @pytest.mark.asyncio
+    async def test_backend_stops_stream_early(self):
+        """Test the LLM stream is closed once the reply exceeds the budget."""
+        budget = SpeechBudget(max_seconds=2, wpm=150)
+        backend = AIBackend(api_key="sk-test", speech_budget=budget)
+        chunks = ["One two ", "three. Four ", "five six", ". Seven ", "eight. ", "Nine."]
+        backend._client.chat.completions = fake = FakeCompletions(chunks)
+        
+        reply = "".join([c async for c in backend.chat_stream("count")])
+        assert reply == "One two three. Four five six."
+        assert fake.kwargs["max_tokens"] == budget.max_tokens
+        assert fake.streamed == 4  # The rest was never requested
+        assert backend.conversation_history[-1]["content"] == reply
+        stats = budget.stats()
+        assert stats["early_stops"] == 1 and stats["tokens_unused"] > 0
+        
+        backend._client.chat.completions = FakeCompletions(["Sure."])
+        assert "".join([c async for c in backend.chat_stream("ok")]) == "Sure."
+        assert budget.stats()["early_stops"] == 1
+        assert backend.pool.endpoints[0].breaker.failures == 0
+
+
+class FakeWebSocket:
+    """Records text frames sent by a SessionSender; `reading` gates a slow client."""
+    
+    def __init__(self):
+        self.frames = []
+        self.reading = asyncio.Event()
+        self.reading.set()
+        self.close_code = None
+    
+    async def send_text(self, text):
+        await asyncio.sleep(0)  # Yield like a real socket write
+        await self.reading.wait()
+        self.frames.append(json.loads(text))
+    
+    async def close(self, code=1000, reason=None):
+        if self.close_code is not None:  # As Starlette does
+            raise RuntimeError('Cannot call "send" once a close message has been sent.')
+        self.close_code = code
+
+
+async def ws_written(ws, count):
+    """Wait until `count` frames have been written to a FakeWebSocket."""
+    while len(ws.frames) < count:
+        await asyncio.sleep(0)
+
+
+class TestTransport:
+    """Tests for coalesced, ordered WebSocket sends."""
+    
+    def test_dumps(self):
+        """Test messages encode to compact JSON with or without orjson."""
+        assert json.loads(dumps({"type": "response_chunk", "text": "héllo"})) == {
+            "type": "response_chunk", "text": "héllo",
+        }
+    
+    @pytest.mark.asyncio
+    async def test_coalesces_within_window(self):
+        """Test tokens arriving together go out as one response_chunk."""
+        ws = FakeWebSocket()
+        sender = SessionSender(ws, coalesce_ms=20)
+        for token in ["Hel", "lo ", "there."]:
+            await sender.send_chunk(token)
+        assert ws.frames == []
+        await asyncio.sleep(0.05)
+        assert ws.frames == [{"type": "response_chunk", "text": "Hello there."}]
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_byte_threshold_and_order(self):
+        """Test a full buffer flushes at once, and other messages flush text first."""
+        ws = FakeWebSocket()
+        sender = SessionSender(ws, coalesce_ms=1000, coalesce_bytes=8)
+        await sender.send_chunk("12345")
+        await sender.send_chunk("6789")
+        await sender.drain()
+        assert [f["text"] for f in ws.frames] == ["123456789"]
+        
+        await sender.send_chunk("Hi.")
+        await sender.send({"type": "audio_chunk", "data": ""})
+        await sender.send({"type": "response_complete", "text": "123456789Hi."})
+        await sender.drain()
+        assert [f["type"] for f in ws.frames] == [
+            "response_chunk", "response_chunk", "audio_chunk", "response_complete",
+        ]
+        assert ws.frames[1]["text"] == "Hi."
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        """Test coalesce_ms=0 sends every delta as it comes."""
+        ws = FakeWebSocket()
+        sender = SessionSender(ws, coalesce_ms=0)
+        await sender.send_chunk("a")
+        await sender.send_chunk("b")
+        await sender.drain()
+        assert [f["text"] for f in ws.frames] == ["a", "b"]
+        sender.close()
+    
+    @staticmethod
+    def audio(i):
+        return {"type": "audio_chunk", "data": f"{i:04d}" * 25}  # ~130 bytes encoded
+    
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_block(self):
+        """Test sends return while the client isn't reading, up to the bound."""
+        ws = FakeWebSocket()
+        ws.reading.clear()
+        sender = SessionSender(ws, coalesce_ms=0, max_buffered_bytes=10_000)
+        for i in range(5):
+            await asyncio.wait_for(sender.send(self.audio(i)), 0.5)
+        assert sender.stats()["buffered_bytes"] > 0 and ws.frames == []
+        ws.reading.set()
+        await sender.drain()
+        assert [f["data"][:4] for f in ws.frames] == ["0000", "0001", "0002", "0003", "0004"]
+        assert sender.stats()["buffered_bytes"] == 0
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_overflow_drops_stale_audio(self):
+        """Test the drop policy evicts the oldest audio but keeps control messages."""
+        ws = FakeWebSocket()
+        ws.reading.clear()
+        sender = SessionSender(ws, coalesce_ms=0, max_buffered_bytes=400, overflow="drop")
+        await sender.send({"type": "transcript", "text": "hi", "final": True})
+        for i in range(8):
+            await sender.send(self.audio(i))
+        await sender.send({"type": "response_complete", "text": "ok"})
+        assert sender.stats()["buffered_bytes"] <= 400 + 100
+        assert sender.stats()["dropped_frames"] >= 5
+        
+        ws.reading.set()
+        await sender.drain()
+        types = [f["type"] for f in ws.frames]
+        assert types[0] == "transcript" and types[-1] == "response_complete"
+        assert ws.frames[-2]["data"][:4] == "0007"  # The newest audio survives
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_paused_timer_flush_keeps_order(self):
+        """Test text flushed by the timer during a pause still goes out before later messages."""
+        ws = FakeWebSocket()
+        ws.reading.clear()
+        sender = SessionSender(ws, coalesce_ms=10, max_buffered_bytes=300, overflow="pause")
+        await sender.send(self.audio(0))
+        await sender.send(self.audio(1))
+        await sender.send_chunk("x" * 200)
+        await asyncio.sleep(0.05)  # The timer's flush is now paused
+        complete = asyncio.create_task(sender.send({"type": "response_complete", "text": "okay"}))
+        await asyncio.sleep(0)
+        
+        # Room for the small message but not the text after the first frame
+        ws.reading.set()
+        await ws_written(ws, 1)
+        ws.reading.clear()
+        await asyncio.sleep(0.02)
+        ws.reading.set()
+        await complete
+        await sender.drain()
+        assert [f["type"] for f in ws.frames] == ["audio_chunk", "audio_chunk", "response_chunk", "response_complete"]
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_overflow_pauses_then_disconnects(self):
+        """Test the pause policy waits for the client, and gives up on a stalled one."""
+        ws = FakeWebSocket()
+        ws.reading.clear()
+        sender = SessionSender(ws, coalesce_ms=0, max_buffered_bytes=300, overflow="pause", stall_timeout=0.1)
+        await sender.send(self.audio(0))
+        await sender.send(self.audio(1))
+        paused = asyncio.create_task(sender.send(self.audio(2)))
+        await asyncio.sleep(0.05)
+        assert not paused.done()  # Synthesis would be waiting here
+        ws.reading.set()
+        await paused
+        await sender.drain()
+        assert len(ws.frames) == 3 and sender.stats()["pauses"] == 1
+        
+        ws.reading.clear()
+        await sender.send(self.audio(3))
+        await sender.send(self.audio(4))
+        with pytest.raises(WebSocketDisconnect):
+            await sender.send(self.audio(5))
+        assert ws.close_code == SLOW_CLIENT_CLOSE_CODE
+        sender.close()
+    
+    @pytest.mark.asyncio
+    async def test_overflow_disconnects(self):
+        """Test the disconnect policy closes the session once the bound is hit."""
+        ws = FakeWebSocket()
+        ws.reading.clear()
+        sender = SessionSender(ws, coalesce_ms=0, max_buffered_bytes=300, overflow="disconnect")
+        await sender.send(self.audio(0))
+        await sender.send(self.audio(1))
+        with pytest.raises(WebSocketDisconnect):
+            await sender.send(self.audio(2))
+        assert ws.close_code == SLOW_CLIENT_CLOSE_CODE
+        with pytest.raises(WebSocketDisconnect):
+            await sender.send({"type": "pong"})
+        await sender.abort()  # The session's error path doesn't close it twice
+        assert ws.close_code == SLOW_CLIENT_CLOSE_CODE
+        sender.close()
+        
+        ws = FakeWebSocket()
+        sender = SessionSender(ws)
+        await sender.abort()
+        await sender.abort()
+        assert ws.close_code == 1000
+        sender.close()
+        
+        with pytest.raises(ValueError):
+            SessionSender(ws, overflow="block")
+
+
 class TestVAD:
     """Tests for Voice Activity Detection module."""
     
@@ -123,6 +954,11 @@ class TestVAD:
         result = vad.is_speech(silence)
         assert isinstance(result, bool)
     
+    def test_warmup(self):
+        """Test VAD warm-up runs without error."""
+        vad = VoiceActivityDetector()
+        vad.warmup()
+    
     def test_is_speech_noise(self):
         """Test with random noise."""
         vad = VoiceActivityDetector()
@@ -131,6 +967,245 @@ class TestVAD:
         assert isinstance(result, bool)
 
 
+class TestVADEngines:
+    """Tests for the torch-free VAD engines."""
+    
+    @staticmethod
+    def _voiced(seconds: float = 0.5) -> np.ndarray:
+        # Harmonic tone: a crude stand-in for voiced speech
+        t = np.arange(int(16000 * seconds)) / 16000
+        return (sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 10)) * 0.3).astype(np.float32)
+    
+    def test_energy_engine(self):
+        """Test the numpy engine separates silence, white noise and voiced audio."""
+        vad = VoiceActivityDetector(engine="energy")
+        assert vad._backend == "energy"
+        assert vad.is_speech(np.zeros(4096, dtype=np.float32)) is False
+        rng = np.random.default_rng(0)
+        assert vad.is_speech(rng.standard_normal(4096).astype(np.float32)) is False
+        assert vad.is_speech(self._voiced()) is True
+    
+    def test_energy_engine_short_frames(self):
+        """Test 20 ms client frames (320 samples) are still classified."""
+        vad = VoiceActivityDetector(engine="energy")
+        rng = np.random.default_rng(0)
+        voiced = self._voiced()
+        assert all(vad.is_speech(voiced[i:i + 320]) for i in range(0, 3200, 320))
+        assert not any(vad.is_speech(rng.standard_normal(320).astype(np.float32)) for _ in range(50))
+        assert vad.is_speech(np.zeros(320, dtype=np.float32)) is False
+    
+    def test_onnx_missing_model_falls_back(self):
+        """Test a missing ONNX file degrades to the energy engine, not torch."""
+        vad = VoiceActivityDetector(engine="silero-onnx", model_path="/nonexistent.onnx")
+        assert vad._backend == "energy"
+    
+    def test_auto_never_uses_torch_hub(self, monkeypatch):
+        """Test engine=auto without the ONNX file goes to energy, not torch.hub."""
+        monkeypatch.setattr(
+            VoiceActivityDetector, "_load_torch",
+            lambda self: pytest.fail("auto must not load silero-torch"),
+        )
+        vad = VoiceActivityDetector(engine="auto", model_path="/nonexistent.onnx")
+        assert vad._backend == "energy"
+    
+    @pytest.mark.skipif(
+        not DEFAULT_ONNX_PATH.exists(),
+        reason="Silero ONNX model not downloaded (scripts/download_models.py vad)"
+    )
+    def test_onnx_engine(self):
+        """Test Silero via onnxruntime keeps the is_speech API."""
+        pytest.importorskip("onnxruntime")
+        vad = VoiceActivityDetector(engine="silero-onnx")
+        assert vad._backend == "silero-onnx"
+        assert vad.is_speech(np.zeros(4096, dtype=np.float32)) is False
+        assert isinstance(vad.is_speech(self._voiced(), 16000), bool)
+
+
+class TestDevices:
+    """Tests for torch-free device probing."""
+    
+    def test_whisper_device_cpu(self):
+        """Test explicit CPU resolves to an int8-capable compute type."""
+        from src.server.devices import whisper_device
+        device, compute_type = whisper_device("cpu")
+        assert device == "cpu"
+        assert compute_type in ("int8", "int8_float32", "float32", "default")
+    
+    def test_mps_runs_on_cpu(self):
+        """Test MPS requests fall back to CPU for CTranslate2."""
+        from src.server.devices import whisper_device
+        assert whisper_device("mps")[0] == "cpu"
+    
+    def test_probe_does_not_import_torch(self):
+        """Test the auto probe never pulls in torch."""
+        import subprocess
+        code = (
+            "import sys; from src.server.devices import whisper_device; "
+            "whisper_device('auto'); print('torch' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True, text=True,
+            cwd=os.path.join(os.path.dirname(__file__), '..'),
+        )
+        assert result.stdout.strip() == "False"
+    
+    def test_parse_importtime(self):
+        """Test -X importtime output parsing."""
+        from src.server.profiling import parse_importtime
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     numpy.core\n"
+            "import time:       300 |       5000 | numpy\n"
+        )
+        assert parse_importtime(output) == [("numpy.core", 0.00012, 2), ("numpy", 0.005, 0)]
+
+
+class TestModelBundle:
+    """Tests for offline model bundles."""
+    
+    @staticmethod
+    def _make_bundle(root):
+        from src.server.bundle import write_manifest
+        (root / "whisper" / "tiny").mkdir(parents=True)
+        (root / "whisper" / "tiny" / "model.bin").write_bytes(b"weights")
+        (root / "whisper" / "tiny" / "config.json").write_text("{}")
+        (root / "vad").mkdir()
+        (root / "vad" / "silero_vad.onnx").write_bytes(b"onnx")
+        write_manifest(str(root), "test", {
+            "whisper/tiny": "whisper/tiny",
+            "vad": "vad/silero_vad.onnx",
+        })
+    
+    def test_resolves_paths(self, tmp_path):
+        """Test components resolve to local paths."""
+        from src.server.bundle import ModelBundle
+        self._make_bundle(tmp_path)
+        bundle = ModelBundle(str(tmp_path))
+        
+        assert bundle.version == "test"
+        assert bundle.whisper_path("tiny") == str(tmp_path / "whisper" / "tiny")
+        assert bundle.whisper_path("large-v3") is None
+        assert bundle.vad_path() == str(tmp_path / "vad" / "silero_vad.onnx")
+        assert bundle.verify() == []
+    
+    def test_detects_tampering(self, tmp_path):
+        """Test verify catches changed and missing files."""
+        from src.server.bundle import ModelBundle
+        self._make_bundle(tmp_path)
+        (tmp_path / "whisper" / "tiny" / "model.bin").write_bytes(b"WEIGHTS")
+        (tmp_path / "vad" / "silero_vad.onnx").unlink()
+        
+        bundle = ModelBundle(str(tmp_path))
+        assert bundle.verify(checksums=False) == ["vad: missing silero_vad.onnx"]
+        assert len(bundle.verify(checksums=True)) == 2
+    
+    def test_download_checked_against_upstream(self, tmp_path):
+        """Test downloads must match the hashes the Hub lists for the commit."""
+        import hashlib
+        from types import SimpleNamespace
+        from src.server.bundle import verify_hf_download
+        (tmp_path / "model.bin").write_bytes(b"weights")
+        (tmp_path / "config.json").write_text("{}")
+        siblings = [
+            SimpleNamespace(rfilename="model.bin", blob_id=None,
+                            lfs={"sha256": hashlib.sha256(b"weights").hexdigest()}),
+            SimpleNamespace(rfilename="config.json", blob_id=hashlib.sha1(b"blob 2\0{}").hexdigest(), lfs=None),
+            SimpleNamespace(rfilename="README.md", blob_id="0" * 40, lfs=None),  # Not downloaded
+        ]
+        assert verify_hf_download("org/model", "a" * 40, str(tmp_path), siblings) == 2
+        
+        (tmp_path / "model.bin").write_bytes(b"tampered")
+        with pytest.raises(ValueError):
+            verify_hf_download("org/model", "a" * 40, str(tmp_path), siblings)
+    
+    def test_manifest_records_sources(self, tmp_path):
+        """Test upstream revisions are kept so a bundle can be rebuilt the same."""
+        from src.server.bundle import ModelBundle, write_manifest
+        (tmp_path / "whisper" / "tiny").mkdir(parents=True)
+        (tmp_path / "whisper" / "tiny" / "model.bin").write_bytes(b"weights")
+        write_manifest(str(tmp_path), "test", {"whisper/tiny": "whisper/tiny"}, sources={
+            "whisper/tiny": {"repo": "Systran/faster-whisper-tiny", "revision": "abc123"},
+        })
+        assert ModelBundle(str(tmp_path)).revisions() == {"whisper/tiny": "abc123"}
+
+
+class TestModelLoader:
+    """Tests for concurrent component loading."""
+    
+    def test_loads_concurrently(self):
+        """Test eager components load in parallel, not in sequence."""
+        import time
+        loader = ModelLoader()
+        for name in ("a", "b", "c"):
+            loader.register(name, lambda: time.sleep(0.3) or name)
+        
+        started = time.monotonic()
+        loader.start()
+        assert loader.wait_sync(timeout=5)
+        assert time.monotonic() - started < 0.8
+        assert loader.is_ready()
+    
+    @pytest.mark.asyncio
+    async def test_lazy_loads_on_first_wait(self):
+        """Test lazy components stay pending until something needs them."""
+        loader = ModelLoader()
+        loaded = []
+        loader.register("tts", lambda: loaded.append("tts") or "model", lazy=True)
+        loader.start()
+        
+        assert loader.status()["tts"]["state"] == "pending"
+        assert loader.is_ready()  # Lazy components don't block readiness
+        
+        assert await loader.wait(["tts"], timeout=5)
+        assert loaded == ["tts"]
+        assert loader.get("tts") == "model"
+    
+    @pytest.mark.asyncio
+    async def test_failed_component(self):
+        """Test a failing factory is reported, not raised."""
+        loader = ModelLoader()
+        
+        def broken():
+            raise RuntimeError("no weights")
+        
+        loader.register("stt", broken)
+        loader.start()
+        
+        assert await loader.wait(["stt"], timeout=5) is False
+        status = loader.status()["stt"]
+        assert status["state"] == "failed"
+        assert "no weights" in status["error"]
+
+
+class TestKeepWarm:
+    """Tests for periodic keep-warm."""
+    
+    class _Model:
+        def __init__(self):
+            self.warmups = 0
+        
+        def warmup(self):
+            self.warmups += 1
+    
+    @pytest.mark.asyncio
+    async def test_warms_only_when_idle(self):
+        """Test keep-warm skips busy instances and warms idle ones."""
+        model = self._Model()
+        loader = ModelLoader()
+        loader.register("stt", lambda: model)
+        loader.wait_sync()
+        
+        keep_warm = KeepWarm(loader, ["stt"], interval=60)
+        keep_warm.touch()
+        assert await keep_warm.warm_idle() is False
+        assert model.warmups == 0
+        
+        keep_warm.last_activity -= 61
+        assert await keep_warm.warm_idle() is True
+        assert model.warmups == 1
+
+
 class TestIntegration:
     """Integration tests for the full pipeline."""
     
@@ -22,6 +22,20 @@ def is_port_in_use(port: int) -> bool:
         return s.connect_ex(('127.0.0.1', port)) == 0
 
 
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    """Silent 16-bit mono WAV file."""
+    import io
+    import wave
+    
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(np.zeros(int(sample_rate * seconds), dtype=np.int16).tobytes())
+    return buf.getvalue()
+
+
 @pytest.fixture(scope="module")
 def server():
     """Start the server for testing."""
@@ -35,6 +49,7 @@ def server():
     env = os.environ.copy()
     env['OPENCLAW_PORT'] = str(port)
     env['OPENCLAW_STT_MODEL'] = 'tiny'  # Use tiny for fast tests
+    env['OPENCLAW_TRANSCRIBE_MAX_UPLOAD_MB'] = '1'
     
     proc = subprocess.Popen(
         [sys.executable, '-m', 'uvicorn', 'src.server.main:app', 
@@ -75,6 +90,165 @@ class TestServerHTTP:
         assert response.status_code == 200
         assert "OpenClaw Voice" in response.text
         assert "voice-button" in response.text
+    
+    def test_ready(self, server):
+        """Test readiness reports every component."""
+        import httpx
+        
+        ws_url, http_url = server
+        for _ in range(30):
+            response = httpx.get(f"{http_url}/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(1)
+        
+        assert response.status_code == 200
+        body = response.json()
+        assert body["ready"] is True
+        assert set(body["components"]) >= {"stt", "tts", "vad", "backend"}
+    
+    def test_metrics(self, server):
+        """Test context metrics are exposed."""
+        import httpx
+        
+        ws_url, http_url = server
+        response = httpx.get(f"{http_url}/api/metrics")
+        assert response.status_code == 200
+        context = response.json()["context"]
+        assert {"last_prompt_tokens", "saved_tokens_total"} <= set(context)
+    
+    def test_transcribe_files(self, server):
+        """Test batch transcription streams one NDJSON line per clip."""
+        import httpx
+        
+        ws_url, http_url = server
+        files = [
+            ("files", ("a.wav", make_wav(1.0), "audio/wav")),
+            ("files", ("b.wav", make_wav(2.5), "audio/wav")),
+            ("files", ("notes.txt", b"not audio", "text/plain")),
+        ]
+        response = httpx.post(f"{http_url}/api/transcribe", files=files, timeout=60)
+        
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["filename"] for line in lines] == ["a.wav", "b.wav", "notes.txt"]
+        assert lines[1]["duration"] == 2.5
+        assert isinstance(lines[0]["text"], str)
+        assert "error" in lines[2]
+    
+    def test_transcribe_raw_body(self, server):
+        """Test a single clip sent as the request body."""
+        import httpx
+        
+        ws_url, http_url = server
+        response = httpx.post(
+            f"{http_url}/api/transcribe?filename=voicemail.wav",
+            content=make_wav(1.0),
+            headers={"Content-Type": "audio/wav"},
+            timeout=60,
+        )
+        assert response.status_code == 200
+        line = json.loads(response.text)
+        assert line["filename"] == "voicemail.wav"
+        assert line["duration"] == 1.0
+        
+        response = httpx.post(f"{http_url}/api/transcribe", content=b"", timeout=10)
+        assert response.status_code == 400
+    
+    def test_transcribe_chunked_upload_limit(self, server):
+        """Test an oversized multipart upload without a Content-Length is refused."""
+        import httpx
+        
+        ws_url, http_url = server
+        boundary = "limit-test"
+        
+        def body():  # A generator, so httpx sends it chunked
+            yield (
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; "
+                f"filename=\"big.wav\"\r\nContent-Type: audio/wav\r\n\r\n"
+            ).encode()
+            for _ in range(32):
+                yield bytes(64 * 1024)  # 2MB, over the 1MB limit
+            yield f"\r\n--{boundary}--\r\n".encode()
+        
+        response = httpx.post(
+            f"{http_url}/api/transcribe",
+            content=body(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            timeout=30,
+        )
+        assert response.status_code == 413
+    
+    def test_tts_wav(self, server):
+        """Test /api/tts streams a playable WAV."""
+        import httpx
+        import io
+        import wave
+        
+        ws_url, http_url = server
+        response = httpx.post(f"{http_url}/api/tts", json={"text": "Hello there."}, timeout=60)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/wav"
+        with wave.open(io.BytesIO(response.content)) as f:
+            assert f.getframerate() == int(response.headers["x-sample-rate"])
+            assert f.getsampwidth() == 2
+    
+    def test_tts_batch_pcm16_resampled(self, server):
+        """Test a batch comes back as one raw stream at the requested rate."""
+        import httpx
+        
+        ws_url, http_url = server
+        body = {"texts": ["One.", "Two."], "format": "pcm16", "sample_rate": 16000, "pause_ms": 0}
+        response = httpx.post(f"{http_url}/api/tts", json=body, timeout=60)
+        assert response.status_code == 200
+        assert response.headers["x-sample-rate"] == "16000"
+        # Mock TTS: 0.5s per text at 24kHz -> ~1s at 16kHz
+        assert abs(len(response.content) // 2 - 16000) <= 2
+        
+        response = httpx.post(f"{http_url}/api/tts", json={"text": "Hi", "format": "mp3"}, timeout=10)
+        assert response.status_code == 400
+
+
+class TestUploadLimit:
+    """Test the streamed upload limit without a running server."""
+    
+    @pytest.mark.asyncio
+    async def test_oversized_multipart_closes_spooled_parts(self, monkeypatch):
+        """Test parts spooled before the limit is hit are closed, and it's still a 413."""
+        import tempfile
+        import starlette.formparsers
+        from starlette.requests import Request
+        from src.server import main
+        
+        spooled = []
+        
+        class Recording(tempfile.SpooledTemporaryFile):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                spooled.append(self)
+        
+        monkeypatch.setattr(starlette.formparsers, "SpooledTemporaryFile", Recording)
+        monkeypatch.setattr(main.settings, "transcribe_max_upload_mb", 1)
+        
+        boundary = "limit-test"
+        part = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; "
+            f"filename=\"clip.wav\"\r\nContent-Type: audio/wav\r\n\r\n"
+        ).encode()
+        chunks = [part, make_wav(1.0), b"\r\n" + part] + [bytes(64 * 1024)] * 32
+        
+        async def receive():
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        
+        request = Request({
+            "type": "http",
+            "method": "POST",
+            "headers": [(b"content-type", f"multipart/form-data; boundary={boundary}".encode())],
+        }, receive)
+        with pytest.raises(ValueError, match="exceeds 1MB"):
+            await main._receive_clips(request)
+        assert len(spooled) == 2  # The complete clip and the oversized one
+        assert all(f.closed for f in spooled)
 
 
 class TestServerWebSocket:
@@ -118,6 +292,60 @@ class TestServerWebSocket:
             response = json.loads(await ws.recv())
             assert response["type"] == "listening_stopped"
     
+    @pytest.mark.asyncio
+    async def test_config_output_format(self, server):
+        """Test negotiating the output audio format."""
+        import websockets
+        
+        ws_url, _ = server
+        async with websockets.connect(ws_url) as ws:
+            await ws.send(json.dumps({"type": "config", "output_format": "f32", "output_sample_rate": 16000}))
+            response = json.loads(await ws.recv())
+            assert response == {
+                "type": "config", "output_format": "f32", "output_sample_rate": 16000,
+                "input_format": "f32", "input_sample_rate": 16000,
+            }
+            
+            try:
+                import av  # noqa: F401
+                await ws.send(json.dumps({"type": "config", "output_format": "opus"}))
+                response = json.loads(await ws.recv())
+                assert response["output_format"] == "opus"
+            except ImportError:
+                pass
+            
+            await ws.send(json.dumps({"type": "config", "output_format": "mp3"}))
+            response = json.loads(await ws.recv())
+            assert response["type"] == "error"
+    
+    @pytest.mark.asyncio
+    async def test_pcm16_binary_uplink(self, server):
+        """Test int16 audio sent as binary frames reaches STT."""
+        import websockets
+        
+        ws_url, _ = server
+        async with websockets.connect(ws_url) as ws:
+            await ws.send(json.dumps({"type": "config", "input_format": "pcm16"}))
+            response = json.loads(await ws.recv())
+            assert response["input_format"] == "pcm16"
+            assert response["output_format"] == "pcm16"  # Untouched
+            
+            await ws.send(json.dumps({"type": "start_listening"}))
+            await ws.recv()  # listening_started
+            await ws.send(np.zeros(16000, dtype=np.int16).tobytes())
+            await ws.send(json.dumps({"type": "stop_listening"}))
+            
+            messages = []
+            for _ in range(5):
+                try:
+                    response = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+                except asyncio.TimeoutError:
+                    break
+                messages.append(response["type"])
+                if response["type"] in ("transcript", "listening_stopped"):
+                    break
+            assert "transcript" in messages
+    
     @pytest.mark.asyncio
     async def test_audio_flow(self, server):
         """Test sending audio and getting response."""
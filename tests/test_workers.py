@@ -0,0 +1,168 @@
+"""
+Tests for process-isolated model workers.
+"""
+
+import pytest
+import numpy as np
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.server.workers import (
+    ModelWorkerPool,
+    RemoteSTT,
+    RemoteTTS,
+    prepare_worker_dir,
+    put_shared,
+    release_shared,
+    take_shared,
+    unlink_shared,
+    worker_addresses,
+    worker_authkey,
+)
+
+
+class TestSharedMemory:
+    """Tests for shared memory audio transfer."""
+
+    def test_round_trip(self):
+        """Test audio survives a trip through shared memory."""
+        audio = np.random.randn(16000).astype(np.float32)
+        shm = put_shared(audio)
+        try:
+            result = take_shared(shm.name, len(audio), "float32")
+        finally:
+            release_shared(shm)
+        np.testing.assert_array_equal(result, audio)
+
+    def test_unread_reply_is_unlinked(self):
+        """Test a worker unlinks the synthesized audio when the reply can't be sent."""
+        import threading
+        from multiprocessing.shared_memory import SharedMemory
+        from src.server.workers import _serve_connection
+
+        class Model:
+            def _synthesize_sync(self, text):
+                return np.ones(2400, dtype=np.float32)
+
+        class BrokenConn:
+            requests = [{"op": "synthesize", "text": "Hello", "shm": "ocv-test-unread"}]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def recv(self):
+                if not self.requests:
+                    raise EOFError
+                return self.requests.pop()
+
+            def send(self, response):
+                raise BrokenPipeError
+
+        _serve_connection("tts", Model(), BrokenConn(), threading.Lock())
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name="ocv-test-unread")
+        unlink_shared("ocv-test-unread")  # Already gone: a no-op
+
+
+@pytest.fixture(scope="module")
+def worker_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+class TestModelWorkers:
+    """Tests for the worker pool (mock or real models)."""
+
+    @pytest.mark.asyncio
+    async def test_remote_stt(self, worker_dir):
+        """Test transcription in a spawned STT worker."""
+        pool = ModelWorkerPool.connect_or_spawn(
+            "stt", 1, worker_dir=worker_dir,
+            model_kwargs={"model_name": "tiny", "device": "cpu"},
+            timeout=120,
+        )
+        stt = RemoteSTT(pool)
+        result = await stt.transcribe(np.zeros(16000, dtype=np.float32))
+        assert isinstance(result, str)
+        pool.close()
+
+    @pytest.mark.asyncio
+    async def test_remote_tts(self, worker_dir):
+        """Test synthesis in a spawned TTS worker."""
+        pool = ModelWorkerPool.connect_or_spawn("tts", 1, worker_dir=worker_dir, timeout=120)
+        tts = RemoteTTS(pool)
+        audio = await tts.synthesize("Hello world")
+        assert isinstance(audio, np.ndarray)
+        assert audio.dtype == np.float32
+        assert len(audio) > 0
+
+        assert tts.sample_rate == pool.info[0]["sample_rate"]
+        chunks = [chunk async for chunk in tts.synthesize_stream("Hello. How are you today?")]
+        assert chunks and all(len(chunk) > 0 for chunk in chunks)
+
+        # Abandoning a stream halfway doesn't leave replies on a pooled connection
+        stream = tts.synthesize_stream("Hello. How are you today?")
+        await stream.__anext__()
+        await stream.aclose()
+        assert len(await tts.synthesize("Hello")) > 0
+
+        # A reply lost on the client side doesn't leak the worker's segment
+        from multiprocessing.shared_memory import SharedMemory
+        call_sync, names = pool.call_sync, []
+
+        def lost_reply(request):
+            names.append(request["shm"])
+            call_sync(request)
+            raise TimeoutError
+
+        pool.call_sync = lost_reply
+        with pytest.raises(TimeoutError):
+            await tts.synthesize("Hello")
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=names[0])
+        pool.close()
+
+    def test_reuses_running_workers(self, worker_dir):
+        """Test a second front-end connects instead of spawning."""
+        pool = ModelWorkerPool.connect_or_spawn("tts", 1, worker_dir=worker_dir, timeout=120)
+        pids = {r["pid"] for r in pool.ping_all()}
+        again = ModelWorkerPool.connect_or_spawn("tts", 1, worker_dir=worker_dir, timeout=120)
+        assert {r["pid"] for r in again.ping_all()} == pids
+
+    def test_rejects_wrong_authkey(self, worker_dir):
+        """Test workers only talk to clients holding the shared key."""
+        from multiprocessing import AuthenticationError
+        ModelWorkerPool.connect_or_spawn("tts", 1, worker_dir=worker_dir, timeout=120)
+        intruder = ModelWorkerPool(worker_addresses("tts", 1, worker_dir), authkey=b"guess")
+        with pytest.raises(AuthenticationError):
+            intruder.ping_all()
+
+
+class TestWorkerDir:
+    """Tests for the socket directory checks."""
+
+    def test_generates_private_authkey(self, tmp_path):
+        """Test a random key is created once, readable only by the owner."""
+        worker_dir = str(tmp_path / "sockets")
+        key = worker_authkey(worker_dir)
+        assert len(key) == 32 and worker_authkey(worker_dir) == key
+        assert os.stat(worker_dir).st_mode & 0o777 == 0o700
+        assert os.stat(os.path.join(worker_dir, "authkey")).st_mode & 0o777 == 0o600
+
+    def test_rejects_shared_directory(self, tmp_path):
+        """Test an existing directory others can access is refused."""
+        worker_dir = tmp_path / "sockets"
+        worker_dir.mkdir(mode=0o755)
+        worker_dir.chmod(0o755)
+        with pytest.raises(PermissionError):
+            prepare_worker_dir(str(worker_dir))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])